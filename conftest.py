@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+# The backend imports itself as `api.*` (gunicorn runs from src/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+CSV_HEADER = "UTC,Open,High,Low,Close,Volume\n"
+
+
+def write_csv(folder, name, start, bars, freq="15min", price=2000.0):
+    """A Dukascopy-style export of `bars` rising bars from `start`; returns its path."""
+    import pandas as pd
+
+    os.makedirs(folder, exist_ok=True)
+    path  = os.path.join(folder, name)
+    times = pd.date_range(start, periods=bars, freq=freq, tz="UTC")
+    with open(path, "w") as f:
+        f.write(CSV_HEADER)
+        for i, t in enumerate(times):
+            o = price + i * 0.125
+            f.write(f"{t.strftime('%d.%m.%Y %H:%M:%S.000')} UTC,"
+                    f"{o:.3f},{o + 1.5:.3f},{o - 1.25:.3f},{o + 0.5:.3f},{0.25 + i % 7}\n")
+    return path
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """backtest_engine pointed at an empty data folder, with its caches cleared."""
+    from api import backtest_engine
+
+    monkeypatch.setattr(backtest_engine, "DATA_DIR", str(tmp_path / "data"))
+    monkeypatch.setattr(backtest_engine, "CACHE_DIR", str(tmp_path / "data" / ".cache"))
+    backtest_engine.clear_frame_cache()
+    backtest_engine.clear_result_cache()
+    yield backtest_engine
+    backtest_engine.clear_frame_cache()
+    backtest_engine.clear_result_cache()
+
+
+@pytest.fixture(scope="session")
+def history():
+    """The M15 exports shipped in src/api/data, in backtesting.py's layout."""
+    from api import backtest_engine
+
+    df = backtest_engine.load_csv("M15", start_date=None, use_cache=False)
+    if df is None:
+        pytest.skip("no M15 exports in src/api/data")
+    return backtest_engine._prep_for_bt(df)
@@ -11,14 +11,39 @@ Expected folder structure (drop Dukascopy files as-is, no renaming):
   src/api/data/1HourData/   → H1 monthly exports (XAU-USD_Hour_*_UTC.csv)
   src/api/data/15MinuteData → M15 daily exports  (optional, H1 used if missing)
   src/api/data/1DayData/    → D1 yearly exports  (optional)
+
+Parsed CSVs are cached per source file under src/api/data/.cache/<TF>/ as
+.npy record arrays. The manifest keys each entry on file size + mtime, so only
+new or changed exports are re-parsed; the rest are memory-mapped back in. The
+merged history is kept as an append-only series.bin next to them, so a new
+daily export costs one file parse (see ingest_new_files / `flask ingest-data`).
+
+On top of that, get_frame() keeps one full-history frame per timeframe in a
+process-wide LRU (bounded by FRAME_CACHE_MAX_MB) and serves start_date
+requests as slices of it, so backtests and the optimizer share a single load.
 """
 
 import os
 import glob
+import json
 import logging
+import hashlib
+import io
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 
+try:
+    import fcntl
+except ImportError:   # Windows dev boxes — series writes are then unlocked
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
 _HERE    = os.path.dirname(os.path.abspath(__file__))
@@ -32,6 +57,22 @@ _TF_DIRS = {
     "D1":  ("1DayData",     "*.csv"),
 }
 
+CACHE_DIR = os.path.join(DATA_DIR, ".cache")
+
+_OHLCV       = ("open", "high", "low", "close", "volume")
+_CACHE_DTYPE = np.dtype([("ts", "<i8")] + [(c, "<f8") for c in _OHLCV])
+_MANIFEST    = "manifest.json"
+
+# Cold-load parallelism: CSV_LOAD_MODE is "thread" (I/O-bound) or "process" (parse-bound)
+LOAD_WORKERS = int(os.getenv("CSV_LOAD_WORKERS", str(min(8, os.cpu_count() or 1))))
+LOAD_MODE    = os.getenv("CSV_LOAD_MODE", "thread")
+
+FRAME_CACHE_MAX_BYTES = int(float(os.getenv("FRAME_CACHE_MAX_MB", "512")) * 1024 * 1024)
+
+# V4 Ghost runs on the vectorized simulator (same trades, ~50-100x faster);
+# BACKTEST_FAST_PATH=0 forces the backtesting.py event loop.
+FAST_PATH = os.getenv("BACKTEST_FAST_PATH", "1") == "1"
+
 _STRATEGY_NAMES = {
     "low":    "V4 Ghost Protocol — Conservative",
     "medium": "V4 Ghost Protocol — Balanced",
@@ -48,13 +89,125 @@ def _find_csvs(timeframe: str):
     return sorted(glob.glob(os.path.join(folder, pattern)))
 
 
+# ─── Dukascopy timestamp parser ───────────────────────────────────────────────
+# Exports always start each row with "dd.mm.YYYY HH:MM:SS.fff UTC". Rather than
+# regex-stripping an object column and running to_datetime twice, slice the
+# first 23 bytes of every line straight out of the file buffer and do the
+# calendar arithmetic on int64 arrays.
+
+_TS_WIDTH = 23                                  # "dd.mm.YYYY HH:MM:SS.fff"
+_TS_SEPS  = {2: b".", 5: b".", 10: b" ", 13: b":", 16: b":"}
+_TS_DIGIT_COLS = [0, 1, 3, 4, 6, 7, 8, 9, 11, 12, 14, 15, 17, 18]
+
+
+def _days_from_civil(y: np.ndarray, m: np.ndarray, d: np.ndarray) -> np.ndarray:
+    """Days since 1970-01-01 for proleptic Gregorian dates (H. Hinnant's algorithm)."""
+    y   = y - (m <= 2)
+    era = y // 400
+    yoe = y - era * 400
+    doy = (153 * ((m + 9) % 12) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _parse_dukascopy_times(buf: bytes) -> "tuple[np.ndarray, np.ndarray] | None":
+    """
+    Parse the leading timestamp of every data row in a raw Dukascopy CSV.
+    Returns (epoch_ns int64, valid bool) aligned with the rows pandas reads,
+    or None if the buffer does not follow the fixed-width layout.
+    """
+    arr = np.frombuffer(buf, dtype=np.uint8)
+    nl  = np.flatnonzero(arr == ord("\n"))
+    starts = nl + 1
+    starts = starts[starts < len(arr)]
+    if len(starts) == 0:
+        return None
+    # Skip blank lines, exactly like read_csv(skip_blank_lines=True)
+    first  = arr[starts]
+    starts = starts[(first != ord("\n")) & (first != ord("\r"))]
+    if len(starts) == 0:
+        return None
+
+    padded = np.concatenate([arr, np.zeros(_TS_WIDTH, dtype=np.uint8)])
+    mat    = padded[starts[:, None] + np.arange(_TS_WIDTH)]
+
+    ok = np.ones(len(starts), dtype=bool)
+    for pos, ch in _TS_SEPS.items():
+        ok &= mat[:, pos] == ch[0]
+    if not ok.any():
+        return None
+
+    digits = mat.astype(np.int64) - ord("0")
+    ok &= ((digits[:, _TS_DIGIT_COLS] >= 0) & (digits[:, _TS_DIGIT_COLS] <= 9)).all(axis=1)
+
+    # Milliseconds are optional: "HH:MM:SS UTC" is accepted with ms = 0
+    has_ms = (mat[:, 19] == ord(".")) & ((digits[:, 20:23] >= 0) & (digits[:, 20:23] <= 9)).all(axis=1)
+    ok &= has_ms | (mat[:, 19] == ord(" ")) | (mat[:, 19] == ord(",")) | (mat[:, 19] == 0)
+
+    def num(a, b):
+        out = np.zeros(len(digits), dtype=np.int64)
+        for i in range(a, b):
+            out = out * 10 + digits[:, i]
+        return out
+
+    day, month, year = num(0, 2), num(3, 5), num(6, 10)
+    hour, minute, sec = num(11, 13), num(14, 16), num(17, 19)
+    ms = np.where(has_ms, num(20, 23), 0)
+
+    ok &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+    ok &= (hour < 24) & (minute < 60) & (sec < 60)
+
+    days = _days_from_civil(year, month, day)
+    ns   = ((days * 86_400 + hour * 3_600 + minute * 60 + sec) * 1_000 + ms) * 1_000_000
+    return np.where(ok, ns, 0), ok
+
+
+def _parse_fast(buf: bytes):
+    """Fixed-width fast path. Returns None when the file needs the generic parser."""
+    header = buf[:buf.find(b"\n")].decode(errors="replace")
+    names  = [c.strip().lower() for c in header.split(",")]
+    if not names or not ("utc" in names[0] or "time" in names[0]):
+        return None
+
+    times = _parse_dukascopy_times(buf)
+    if times is None:
+        return None
+    ns, ok = times
+
+    df = pd.read_csv(io.BytesIO(buf), usecols=range(1, len(names)))
+    if len(df) != len(ns):
+        return None
+    df.columns = names[1:]
+
+    if not ok.all():
+        df, ns = df[ok], ns[ok]
+    df.index = pd.DatetimeIndex(ns.astype("datetime64[ns]"), name="datetime").tz_localize("UTC")
+    return df
+
+
 def _parse_single_csv(path: str):
     try:
-        df = pd.read_csv(path, parse_dates=False)
+        with open(path, "rb") as f:
+            buf = f.read()
+        df = _parse_fast(buf)
+        if df is None:
+            df = _parse_generic(buf)
     except Exception as e:
         logger.warning("Could not read %s: %s", path, e)
         return None
+    if df is None:
+        return None
+
+    for col in ["open", "high", "low", "close", "volume"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    df = df.dropna(subset=["open", "high", "low", "close"])
+    return df if not df.empty else None
 
+
+def _parse_generic(buf: bytes):
+    """Fallback for exports that don't follow the Dukascopy fixed-width layout."""
+    df = pd.read_csv(io.BytesIO(buf), parse_dates=False)
     df.columns = [c.strip().lower() for c in df.columns]
 
     if "utc" not in df.columns:
@@ -73,33 +226,587 @@ def _parse_single_csv(path: str):
 
     df["datetime"] = parsed
     df = df.dropna(subset=["datetime"])
-    df = df.set_index("datetime").drop(columns=["utc"], errors="ignore")
+    return df.set_index("datetime").drop(columns=["utc"], errors="ignore")
 
-    for col in ["open", "high", "low", "close", "volume"]:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-    df = df.dropna(subset=["open", "high", "low", "close"])
-    return df if not df.empty else None
+
+# ─── Parsed-CSV disk cache ────────────────────────────────────────────────────
+
+def _cache_dir(timeframe: str) -> str:
+    return os.path.join(CACHE_DIR, timeframe.upper())
+
+
+def _file_key(path: str) -> dict:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _load_manifest(timeframe: str) -> dict:
+    try:
+        with open(os.path.join(_cache_dir(timeframe), _MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _file_mode() -> int:
+    """0o666 minus the process umask — what open() would have created."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+_FILE_MODE = _file_mode()
+
+
+def _atomic_write(path: str, write) -> None:
+    """
+    Write via a temp file + rename so concurrent workers never see a partial
+    file. mkstemp creates 0600 files; they get the usual umask-based mode so a
+    scheduler or CLI process running as another user can read the cache too.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.chmod(tmp, _FILE_MODE)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _save_manifest(timeframe: str, manifest: dict) -> None:
+    path = os.path.join(_cache_dir(timeframe), _MANIFEST)
+    _atomic_write(path, lambda f: f.write(json.dumps(manifest, indent=1).encode()))
+
+
+def _frame_to_records(df: pd.DataFrame) -> np.ndarray:
+    rec = np.empty(len(df), dtype=_CACHE_DTYPE)
+    rec["ts"] = df.index.as_unit("ns").asi8
+    for col in _OHLCV:
+        rec[col] = df[col].to_numpy(dtype="f8") if col in df.columns else 0.0
+    return rec
+
+
+def _records_to_frame(rec: np.ndarray) -> pd.DataFrame:
+    index = pd.DatetimeIndex(pd.to_datetime(rec["ts"], unit="ns", utc=True), name="datetime")
+    return pd.DataFrame({col: np.asarray(rec[col]) for col in _OHLCV}, index=index)
+
+
+def _load_frames_cached(timeframe: str, paths: list, workers: int | None = None,
+                        mode: str | None = None, prune: bool = True) -> list:
+    """
+    Return one parsed frame per path, reading unchanged files from the .npy cache
+    and (re)parsing only files whose size/mtime differ from the manifest.
+    prune=False keeps manifest entries for files not in `paths` (partial loads).
+    """
+    folder = _cache_dir(timeframe)
+    os.makedirs(folder, exist_ok=True)
+    manifest = _load_manifest(timeframe)
+    dirty    = False
+    frames   = [None] * len(paths)
+    misses   = []
+
+    for i, path in enumerate(paths):
+        name  = os.path.basename(path)
+        npy   = os.path.join(folder, os.path.splitext(name)[0] + ".npy")
+        key   = _file_key(path)
+        entry = manifest.get(name)
+
+        if entry and entry.get("size") == key["size"] and entry.get("mtime_ns") == key["mtime_ns"]:
+            if entry.get("rows", 0) == 0:
+                continue
+            try:
+                frames[i] = _records_to_frame(np.load(npy, mmap_mode="r"))
+                continue
+            except (OSError, ValueError) as e:
+                logger.warning("Cache entry %s unreadable (%s) — re-parsing", npy, e)
+        misses.append((i, name, npy, key))
+
+    parsed = _parse_many([paths[i] for i, *_ in misses], workers, mode)
+    for (i, name, npy, key), df in zip(misses, parsed):
+        rows = 0 if df is None else len(df)
+        if df is not None:
+            rec = _frame_to_records(df)
+            _atomic_write(npy, lambda f: np.save(f, rec))
+            frames[i] = _records_to_frame(rec)
+        elif os.path.exists(npy):
+            os.remove(npy)
+        manifest[name] = {**key, "rows": rows}
+        dirty = True
+
+    # Drop entries for source files that have been removed from the data folder
+    names = {os.path.basename(p) for p in paths}
+    for stale in [n for n in manifest if prune and n not in names]:
+        manifest.pop(stale)
+        npy = os.path.join(folder, os.path.splitext(stale)[0] + ".npy")
+        if os.path.exists(npy):
+            os.remove(npy)
+        dirty = True
+
+    if dirty:
+        _save_manifest(timeframe, manifest)
+    logger.info("%s cache: %d parsed, %d from cache", timeframe, len(misses), len(paths) - len(misses))
+    return frames
+
+
+# ─── Parallel parsing + merge ─────────────────────────────────────────────────
+
+def _parse_many(paths: list, workers: int | None = None, mode: str | None = None) -> list:
+    """
+    Parse `paths` with _parse_single_csv, preserving order.
+    mode="thread" suits I/O-bound loads (read_csv releases the GIL while
+    tokenizing); mode="process" scales the parse itself across cores.
+    """
+    workers = LOAD_WORKERS if workers is None else workers
+    mode    = (mode or LOAD_MODE).lower()
+    if workers <= 1 or len(paths) < 2:
+        return [_parse_single_csv(p) for p in paths]
+
+    workers = min(workers, len(paths))
+    try:
+        if mode == "process":
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                return list(ex.map(_parse_single_csv, paths,
+                                   chunksize=max(1, len(paths) // (workers * 4))))
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            return list(ex.map(_parse_single_csv, paths))
+    except (OSError, BrokenExecutor) as e:
+        logger.warning("Parallel CSV load failed (%s) — parsing serially", e)
+        return [_parse_single_csv(p) for p in paths]
+
+
+def _merge_sorted(frames: list) -> pd.DataFrame:
+    """
+    Merge per-file frames whose indexes are each already sorted.
+    Dukascopy exports don't overlap, so ordering the runs by their first
+    timestamp and concatenating is enough; overlapping runs fall back to a
+    stable merge of the runs (timsort merges the presorted runs in O(n log k)).
+    """
+    runs = []
+    for f in frames:
+        if not f.index.is_monotonic_increasing:
+            f = f.sort_index(kind="stable")
+        runs.append(f)
+    runs.sort(key=lambda f: f.index[0])
+
+    combined = pd.concat(runs)
+    if not combined.index.is_monotonic_increasing:
+        order    = np.argsort(combined.index.asi8, kind="stable")
+        combined = combined.iloc[order]
+    return combined
+
+
+def _combine(frames: list) -> pd.DataFrame | None:
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return None
+    combined = _merge_sorted(frames)
+    return combined[~combined.index.duplicated(keep="first")]
+
+
+# ─── Canonical series (append-only) ──────────────────────────────────────────
+# series.bin holds the merged, deduplicated history of a timeframe as raw
+# _CACHE_DTYPE records; series.json lists the source files (size + mtime) it
+# was built from and how many records are valid. New exports that only extend
+# the history are appended in place; anything else triggers a rebuild from the
+# per-file cache.
+
+_SERIES_BIN  = "series.bin"
+_SERIES_META = "series.json"
+
+
+@contextmanager
+def _series_lock(timeframe: str):
+    """Serialise series writers across gunicorn workers (no-op without fcntl)."""
+    path = os.path.join(_cache_dir(timeframe), "series.lock")
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _load_series_meta(timeframe: str) -> dict | None:
+    try:
+        with open(os.path.join(_cache_dir(timeframe), _SERIES_META)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_series_meta(timeframe: str, meta: dict) -> None:
+    path = os.path.join(_cache_dir(timeframe), _SERIES_META)
+    _atomic_write(path, lambda f: f.write(json.dumps(meta, indent=1).encode()))
+
+
+def _read_series(timeframe: str, meta: dict) -> np.ndarray:
+    rows = meta.get("rows", 0)
+    if rows == 0:
+        return np.empty(0, dtype=_CACHE_DTYPE)
+    return np.memmap(os.path.join(_cache_dir(timeframe), _SERIES_BIN),
+                     dtype=_CACHE_DTYPE, mode="r", shape=(rows,))
+
+
+def _rebuild_series(timeframe: str, paths: list, keys: dict, workers, mode) -> dict:
+    combined = _combine(_load_frames_cached(timeframe, paths, workers, mode))
+    rec = _frame_to_records(combined) if combined is not None else np.empty(0, dtype=_CACHE_DTYPE)
+    _atomic_write(os.path.join(_cache_dir(timeframe), _SERIES_BIN), lambda f: f.write(rec.tobytes()))
+    meta = {
+        "files":   keys,
+        "rows":    len(rec),
+        "last_ts": int(rec["ts"][-1]) if len(rec) else None,
+    }
+    _save_series_meta(timeframe, meta)
+    return meta
 
 
-def load_csv(timeframe: str, start_date: str = "2020-01-01"):
-    """Load ALL CSVs for the given timeframe, concatenate, deduplicate, and return."""
+def _append_series(timeframe: str, meta: dict, new_paths: list, keys: dict, workers, mode):
+    """
+    Append the rows of `new_paths` to the series. Returns (meta, rows_added), or
+    None if the new files don't purely extend the history (caller rebuilds).
+    """
+    new = _combine(_load_frames_cached(timeframe, new_paths, workers, mode, prune=False))
+    if new is None:
+        meta = {**meta, "files": keys}
+        _save_series_meta(timeframe, meta)
+        return meta, 0
+
+    new_ts = new.index.asi8
+    if not new.index.is_monotonic_increasing:
+        return None
+
+    # Drop duplicates at the seam only: rows at or before the current last bar
+    # must already be in the series, otherwise this is a backfill, not an append.
+    last_ts = meta.get("last_ts")
+    if last_ts is not None:
+        seam = new_ts <= last_ts
+        if seam.any():
+            old_ts = _read_series(timeframe, meta)["ts"]
+            pos    = np.searchsorted(old_ts, new_ts[seam])
+            pos    = np.minimum(pos, len(old_ts) - 1)
+            if not (old_ts[pos] == new_ts[seam]).all():
+                return None
+            new = new[~seam]
+
+    rec  = _frame_to_records(new)
+    path = os.path.join(_cache_dir(timeframe), _SERIES_BIN)
+    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+        f.truncate(meta.get("rows", 0) * _CACHE_DTYPE.itemsize)   # discard any torn append
+        f.seek(0, os.SEEK_END)
+        f.write(rec.tobytes())
+
+    meta = {
+        "files":   keys,
+        "rows":    meta.get("rows", 0) + len(rec),
+        "last_ts": int(rec["ts"][-1]) if len(rec) else last_ts,
+    }
+    _save_series_meta(timeframe, meta)
+    return meta, len(rec)
+
+
+def _sync_series(timeframe: str, paths: list, workers=None, mode=None) -> tuple[dict, dict]:
+    """Bring series.bin in line with the data folder. Returns (meta, report)."""
+    os.makedirs(_cache_dir(timeframe), exist_ok=True)
+    keys = {os.path.basename(p): _file_key(p) for p in paths}
+
+    with _series_lock(timeframe):
+        meta   = _load_series_meta(timeframe)
+        report = {"timeframe": timeframe, "mode": "noop", "files": 0, "rows_added": 0}
+
+        if meta is not None and meta.get("files") == keys:
+            return meta, {**report, "rows": meta.get("rows", 0)}
+
+        known = (meta or {}).get("files", {})
+        added = [p for p in paths if os.path.basename(p) not in known]
+        appendable = (
+            meta is not None
+            and all(keys.get(n) == k for n, k in known.items())   # nothing changed or removed
+        )
+
+        result = _append_series(timeframe, meta, added, keys, workers, mode) if appendable else None
+        if result is not None:
+            meta, rows_added = result
+            report.update(mode="append", files=len(added), rows_added=rows_added)
+        else:
+            rows_before = (meta or {}).get("rows", 0)
+            meta = _rebuild_series(timeframe, paths, keys, workers, mode)
+            report.update(mode="rebuild", files=len(paths),
+                          rows_added=meta["rows"] - rows_before)
+
+    logger.info("%s series %s: +%d rows from %d file(s)",
+                timeframe, report["mode"], report["rows_added"], report["files"])
+    return meta, {**report, "rows": meta.get("rows", 0)}
+
+
+def ingest_new_files(timeframe: str, workers: int | None = None, mode: str | None = None) -> dict:
+    """
+    Append newly dropped exports for `timeframe` to the cached canonical series.
+    Only the new files are parsed; rewritten, removed or back-dated files force
+    a rebuild from the per-file cache. The in-process frame cache picks up the
+    change on its next fingerprint check.
+    """
+    tf    = timeframe.upper()
+    paths = _find_csvs(tf)
+    if not paths:
+        return {"timeframe": tf, "mode": "noop", "files": 0, "rows_added": 0, "rows": 0}
+    _, report = _sync_series(tf, paths, workers, mode)
+    return report
+
+
+def load_csv(timeframe: str, start_date: str | None = "2020-01-01", use_cache: bool = True,
+             workers: int | None = None, mode: str | None = None):
+    """
+    Load ALL CSVs for the given timeframe, concatenate, deduplicate, and return.
+    start_date=None returns the full history. Prefer get_frame() in request paths.
+    workers / mode override CSV_LOAD_WORKERS / CSV_LOAD_MODE for cold parses.
+    """
     paths = _find_csvs(timeframe)
     if not paths:
         return None
 
     logger.info("Loading %d file(s) for %s", len(paths), timeframe)
-    frames = [_parse_single_csv(p) for p in paths]
-    frames = [f for f in frames if f is not None]
+    combined = None
+    if use_cache:
+        try:
+            meta, _  = _sync_series(timeframe.upper(), paths, workers, mode)
+            rec      = _read_series(timeframe.upper(), meta)
+            combined = _records_to_frame(rec) if len(rec) else None
+        except OSError as e:
+            # Read-only filesystem or similar — fall back to parsing every file
+            logger.warning("CSV cache unavailable for %s (%s) — parsing directly", timeframe, e)
+            use_cache = False
+    if not use_cache:
+        combined = _combine(_parse_many(paths, workers, mode))
+
+    if combined is not None and start_date is not None:
+        combined = _slice_from(combined, start_date)
+    return combined if combined is not None and not combined.empty else None
+
+
+def _slice_from(df: pd.DataFrame, start_date: str) -> pd.DataFrame | None:
+    """Rows at or after start_date, as a positional slice of the sorted index."""
+    pos = df.index.searchsorted(pd.Timestamp(start_date, tz="UTC"), side="left")
+    out = df.iloc[pos:]
+    return out if not out.empty else None
+
+
+# ─── Compact resident OHLCV ───────────────────────────────────────────────────
+
+PRICE_SCALE = 1000   # Dukascopy quotes XAU/USD to 3 decimals → exact int32 ticks
+_BT_COLS    = ("Open", "High", "Low", "Close", "Volume")
+
+
+class CompactOHLCV:
+    """
+    Resident form of a loaded history: the UTC DatetimeIndex (int64 ns), OHLC
+    as int32 ticks of 1/PRICE_SCALE and float32 volume — 28 bytes per bar
+    instead of 48. Ticks (not float32 prices) keep the round trip exact, so
+    backtests on a materialised frame match the CSV bit for bit.
+    """
+    __slots__ = ("index", "ticks", "volume", "_block", "_block_lock")
+
+    def __init__(self, index: pd.DatetimeIndex, ticks: np.ndarray, volume: np.ndarray):
+        self.index  = index      # (n,)   datetime64[ns, UTC], named "datetime"
+        self.ticks  = ticks      # (4, n) int32 — open, high, low, close
+        self.volume = volume     # (n,)   float32
+        self._block = None       # weakref to the float64 block while any frame uses it
+        self._block_lock = threading.Lock()
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "CompactOHLCV | None":
+        """None if the frame can't be represented exactly (sub-minute bars, >3 decimals)."""
+        index = df.index.as_unit("ns")
+        if (index.asi8 % 60_000_000_000).any():
+            return None
+        scaled = df[list(_OHLCV[:4])].to_numpy(dtype="f8").T * PRICE_SCALE
+        ticks  = np.rint(scaled)
+        if len(ticks) and (np.abs(ticks - scaled).max() > 1e-6 or np.abs(ticks).max() >= 2**31):
+            return None
+        volume = df["volume"].to_numpy(dtype="f4") if "volume" in df.columns else np.zeros(len(df), "f4")
+        index  = pd.DatetimeIndex(index.tz_convert("UTC") if index.tz else index.tz_localize("UTC"),
+                                  name="datetime")
+        return cls(index, ticks.astype(np.int32), volume)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def nbytes(self) -> int:
+        """Resident size: the compact arrays, plus the float64 block while a frame keeps it alive."""
+        return self.index.nbytes + self.ticks.nbytes + self.volume.nbytes + self.block_nbytes
+
+    @property
+    def block_nbytes(self) -> int:
+        block = self._block() if self._block is not None else None
+        return 0 if block is None else block.nbytes
+
+    def position(self, start_date: str | None) -> int:
+        """First bar at or after start_date."""
+        if start_date is None:
+            return 0
+        return int(self.index.searchsorted(pd.Timestamp(start_date, tz="UTC"), side="left"))
+
+    def _materialise(self) -> np.ndarray:
+        """
+        The float64 (5, n) block, built once and shared by every frame handed
+        out while any of them is alive. Held only through a weakref, so an idle
+        process keeps just the compact arrays; read-only, so no caller can
+        change prices under another request.
+        """
+        with self._block_lock:
+            block = self._block() if self._block is not None else None
+            if block is None:
+                block = np.empty((5, len(self)), dtype="f8")
+                np.divide(self.ticks, PRICE_SCALE, out=block[:4])
+                block[4] = self.volume
+                block.flags.writeable = False
+                self._block = weakref.ref(block)
+            return block
+
+    def to_frame(self, bt: bool = False, start: int = 0) -> pd.DataFrame:
+        """
+        Frame of bars [start, n) — lowercase columns, or the Open/High/Low/Close/
+        Volume layout backtesting.py expects when bt=True. Every frame is a
+        view of one shared, read-only block and of the resident index, so
+        concurrent requests and both layouts cost a single float64 copy of the
+        history per process.
+        """
+        return pd.DataFrame(self._materialise()[:, start:].T, index=self.index[start:],
+                            columns=list(_BT_COLS if bt else _OHLCV), copy=False)
+
+
+# ─── In-process frame cache ───────────────────────────────────────────────────
+
+class _CachedFrame:
+    """
+    One LRU entry. Frames that fit CompactOHLCV are held compact and served as
+    views of one shared materialisation (see CompactOHLCV.to_frame); anything
+    else is kept as a DataFrame with a small memo of start_date slices.
+    nbytes is live: a compact entry also counts its materialised block while
+    any frame served from it is still in use.
+    """
+    __slots__ = ("data", "fingerprint", "slices", "lock", "_frame_nbytes")
+
+    def __init__(self, df, fingerprint):
+        compact          = CompactOHLCV.from_frame(df) if df is not None else None
+        self.data        = compact if compact is not None else df
+        self.fingerprint = fingerprint
+        self.slices      = {}   # start_date → view of a DataFrame entry
+        self.lock        = threading.Lock()
+        self._frame_nbytes = 0 if compact is not None or df is None else int(df.memory_usage(index=True).sum())
+
+    @property
+    def nbytes(self) -> int:
+        if isinstance(self.data, CompactOHLCV):
+            return self.data.nbytes
+        return self._frame_nbytes
+
+    def frame(self, start_date: str | None, bt: bool = False):
+        if self.data is None:
+            return None
+        if isinstance(self.data, CompactOHLCV):
+            start = self.data.position(start_date)
+            return self.data.to_frame(bt, start) if start < len(self.data) else None
+        if start_date is None:
+            df = self.data
+        else:
+            with self.lock:
+                if start_date not in self.slices:
+                    if len(self.slices) >= _MAX_SLICES:
+                        self.slices.pop(next(iter(self.slices)))
+                    self.slices[start_date] = _slice_from(self.data, start_date)
+                df = self.slices[start_date]
+        return _prep_for_bt(df) if bt and df is not None else df
+
+
+_frames: "OrderedDict[str, _CachedFrame]" = OrderedDict()
+_frames_lock = threading.Lock()
+_load_locks: dict[str, threading.Lock] = {}
+_MAX_SLICES  = 16   # start_date comes from the query string — keep the memo bounded
+
+
+def data_fingerprint(timeframe: str) -> str:
+    """
+    Cheap identity of a timeframe folder: name, size and mtime of every CSV.
+    Changes whenever a file is added, removed or rewritten.
+    """
+    h = hashlib.sha1(timeframe.upper().encode())
+    for path in _find_csvs(timeframe):
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        h.update(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()
+
+
+def _evict_frames() -> None:
+    """
+    Drop least-recently-used frames until the cache fits FRAME_CACHE_MAX_BYTES.
+    Live materialised blocks count against the budget, but evicting their
+    entry only frees them once the frames using them are gone.
+    """
+    total = sum(e.nbytes for e in _frames.values())
+    while total > FRAME_CACHE_MAX_BYTES and len(_frames) > 1:
+        tf, entry = _frames.popitem(last=False)
+        total -= entry.nbytes
+        logger.info("Frame cache: evicted %s (%.1f MB)", tf, entry.nbytes / 1e6)
 
-    if not frames:
-        return None
 
-    combined = pd.concat(frames).sort_index()
-    combined = combined[~combined.index.duplicated(keep="first")]
-    cutoff   = pd.Timestamp(start_date, tz="UTC")
-    combined = combined[combined.index >= cutoff]
-    return combined if not combined.empty else None
+def _cached_frame(key: str, fingerprint: str, loader, start_date: str | None, bt: bool = False):
+    """LRU lookup shared by get_frame(); `loader()` builds the full-history frame on a miss."""
+    with _frames_lock:
+        entry = _frames.get(key)
+        if entry is None or entry.fingerprint != fingerprint:
+            lock = _load_locks.setdefault(key, threading.Lock())
+        else:
+            lock = None
+
+    if lock is not None:
+        # One loader per key — concurrent requests wait and reuse its result
+        with lock:
+            with _frames_lock:
+                entry = _frames.get(key)
+            if entry is None or entry.fingerprint != fingerprint:
+                entry = _CachedFrame(loader(), fingerprint)
+                with _frames_lock:
+                    _frames[key] = entry
+                    _evict_frames()
+
+    with _frames_lock:
+        if key in _frames:
+            _frames.move_to_end(key)
+    frame = entry.frame(start_date, bt)
+    with _frames_lock:
+        _evict_frames()     # the frame may have materialised a block
+    return frame
+
+
+def get_frame(timeframe: str, start_date: str | None = "2020-01-01", derived: bool = False,
+              bt: bool = False):
+    """
+    Cached equivalent of load_csv(). The full history for `timeframe` is loaded
+    once per process, held as CompactOHLCV, and reused until its data folder
+    fingerprint changes; start_date requests are materialised from a slice of
+    it. bt=True returns backtesting.py's capitalised column layout directly.
+
+    derived=True (or a timeframe with no vendor folder, e.g. H4) serves the bars
+    from the M1 resampling pyramid instead of the timeframe's own exports.
+    """
+    tf = timeframe.upper()
+    if derived or tf not in _TF_DIRS:
+        return _derived_frame(tf, start_date, bt)
+    return _cached_frame(tf, data_fingerprint(tf), lambda: load_csv(tf, start_date=None), start_date, bt)
+
+
+def clear_frame_cache() -> None:
+    with _frames_lock:
+        _frames.clear()
 
 
 def _resample(df: pd.DataFrame, rule: str) -> pd.DataFrame:
@@ -108,12 +815,46 @@ def _resample(df: pd.DataFrame, rule: str) -> pd.DataFrame:
     ).dropna()
 
 
-def _best_df(start_date: str):
-    """Return the best available DataFrame: M15 if present, else H1."""
-    m15 = load_csv("M15", start_date)
+# ─── M1 resampling pyramid ────────────────────────────────────────────────────
+# Every level is resampled from the level directly below it (OHLCV aggregation
+# is associative), so each build is O(n) in the finer level and all timeframes
+# share M1 as their single source of truth. Levels are cached in the same LRU
+# as vendor frames under "<TF>@M1" and rebuilt when the M1 folder changes.
+
+_PYRAMID = (
+    ("M1",  None),
+    ("M5",  "5min"),
+    ("M15", "15min"),
+    ("H1",  "1h"),
+    ("H4",  "4h"),
+    ("D1",  "1D"),
+)
+_PYRAMID_RULES = dict(_PYRAMID)
+_PYRAMID_PARENT = {tf: _PYRAMID[i - 1][0] for i, (tf, _) in enumerate(_PYRAMID) if i}
+
+
+def _derived_frame(timeframe: str, start_date: str | None, bt: bool = False):
+    if timeframe not in _PYRAMID_RULES:
+        raise ValueError(f"Unknown timeframe '{timeframe}'. Use: {', '.join(_PYRAMID_RULES)}")
+    if timeframe == "M1":
+        return get_frame("M1", start_date, bt=bt)
+
+    def build():
+        parent = _derived_frame(_PYRAMID_PARENT[timeframe], None)
+        if parent is None:
+            return None
+        out = _resample(parent, _PYRAMID_RULES[timeframe])
+        return out if not out.empty else None
+
+    return _cached_frame(f"{timeframe}@M1", data_fingerprint("M1"), build, start_date, bt)
+
+
+def _best_df(start_date: str, bt: bool = False):
+    """Return the best available DataFrame: M15 if present, else H1. bt=True → Open/High/... columns."""
+    m15 = get_frame("M15", start_date, bt=bt)
     if m15 is not None and len(m15) > 500:
         return m15, "M15"
-    h1 = load_csv("H1", start_date)
+    h1 = get_frame("H1", start_date, bt=bt)
     if h1 is not None and not h1.empty:
         return h1, "H1"
     return None, None
@@ -121,6 +862,8 @@ def _best_df(start_date: str):
 
 def _prep_for_bt(df: pd.DataFrame) -> pd.DataFrame:
     rename = {c: c.capitalize() for c in df.columns if c in ("open", "high", "low", "close", "volume")}
+    if not rename:
+        return df   # already in backtesting.py layout (get_frame(..., bt=True))
     out = df.rename(columns=rename)
     # backtesting.py requires tz-naive or tz-aware index — keep as-is
     return out
@@ -171,10 +914,157 @@ def _format_stats(stats, level: str, initial_cash: float, timeframe: str) -> dic
     }
 
 
+class BacktestCancelled(Exception):
+    """Raised from a progress callback to abort a running backtest."""
+
+
+def _with_progress(StratClass, progress, total: int, every: int = 256):
+    """Subclass StratClass so next() reports (bars_done, total) to `progress` every `every` bars."""
+    class Tracked(StratClass):
+        def next(self):
+            n = len(self.data)
+            if n % every == 0:
+                progress(n, total)
+            super().next()
+
+    Tracked.__name__ = StratClass.__name__
+    return Tracked
+
+
+# ─── Backtest result cache ────────────────────────────────────────────────────
+# Keyed on everything a run depends on: level, cash, start date, strategy class
+# and params, plus the fingerprint of the data folders _best_df can pick from.
+# In-memory LRU with TTL; RESULT_CACHE_DISK=1 also persists JSON under
+# .cache/results/ so every gunicorn worker shares the same hits.
+
+RESULT_CACHE_TTL  = int(os.getenv("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_MAX  = int(os.getenv("RESULT_CACHE_MAX", "64"))
+RESULT_CACHE_DISK = os.getenv("RESULT_CACHE_DISK", "1") == "1"
+RESULT_DISK_MAX   = int(os.getenv("RESULT_CACHE_DISK_MAX", "256"))   # files kept in .cache/results/
+MAX_BALANCE       = 1e9
+
+_results: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+_results_lock = threading.Lock()
+
+
+def normalize_run_args(initial_cash, start_date) -> tuple[float, str]:
+    """
+    (cash rounded to cents, start as YYYY-MM-DD) — both come from the query
+    string, so equivalent spellings must share one cache entry and nonsense
+    must not create one. Raises ValueError.
+    """
+    cash = float(initial_cash)
+    if not (0 < cash <= MAX_BALANCE):       # also rejects NaN
+        raise ValueError(f"balance must be between 0 and {MAX_BALANCE:,.0f}")
+    try:
+        start = pd.Timestamp(start_date)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid start date '{start_date}'. Use YYYY-MM-DD") from None
+    if start is pd.NaT:
+        raise ValueError(f"Invalid start date '{start_date}'. Use YYYY-MM-DD")
+    return round(cash, 2), start.strftime("%Y-%m-%d")
+
+
+def _result_key(level: str, initial_cash: float, start_date: str, strategy: str, params: dict) -> str:
+    payload = json.dumps({
+        "level":    level,
+        "cash":     float(initial_cash),
+        "start":    start_date,
+        "strategy": strategy,
+        "params":   params,
+        "data":     [data_fingerprint(tf) for tf in ("M15", "H1")],
+    }, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _result_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, "results", key + ".json")
+
+
+def _result_cache_get(key: str) -> dict | None:
+    now = time.time()
+    with _results_lock:
+        hit = _results.get(key)
+        if hit is not None:
+            if now - hit[0] <= RESULT_CACHE_TTL:
+                _results.move_to_end(key)
+                return hit[1]
+            _results.pop(key)
+
+    if not RESULT_CACHE_DISK:
+        return None
+    path = _result_path(key)
+    try:
+        if now - os.path.getmtime(path) > RESULT_CACHE_TTL:
+            return None
+        with open(path) as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+    with _results_lock:
+        _results[key] = (os.path.getmtime(path), result)
+        while len(_results) > RESULT_CACHE_MAX:
+            _results.popitem(last=False)
+    return result
+
+
+def _prune_result_dir() -> None:
+    """Apply the TTL and RESULT_DISK_MAX (newest kept) to the on-disk mirror."""
+    folder = os.path.dirname(_result_path("x"))
+    try:
+        names = [n for n in os.listdir(folder) if n.endswith(".json")]
+    except OSError:
+        return
+    now, entries = time.time(), []
+    for name in names:
+        path = os.path.join(folder, name)
+        try:
+            mtime = os.path.getmtime(path)
+            if now - mtime > RESULT_CACHE_TTL:
+                os.remove(path)
+            else:
+                entries.append((mtime, path))
+        except OSError:
+            pass
+    entries.sort(reverse=True)
+    for _, path in entries[RESULT_DISK_MAX:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _result_cache_put(key: str, result: dict) -> None:
+    with _results_lock:
+        _results[key] = (time.time(), result)
+        _results.move_to_end(key)
+        while len(_results) > RESULT_CACHE_MAX:
+            _results.popitem(last=False)
+
+    if RESULT_CACHE_DISK:
+        try:
+            os.makedirs(os.path.dirname(_result_path(key)), exist_ok=True)
+            _atomic_write(_result_path(key), lambda f: f.write(json.dumps(result).encode()))
+        except OSError as e:
+            logger.warning("Could not persist backtest result %s: %s", key, e)
+        _prune_result_dir()
+
+
+def clear_result_cache() -> None:
+    with _results_lock:
+        _results.clear()
+
+
 def execute_backtest_by_level(level: str, initial_cash: float = 100_000.0,
-                               start_date: str = "2020-01-01") -> dict:
+                               start_date: str = "2020-01-01", use_cache: bool = True,
+                               progress=None) -> dict:
+    """
+    Run the level's strategy over the best available history.
+    progress(bars_done, total) is called periodically during the run; raising
+    BacktestCancelled from it aborts the backtest (the exception propagates).
+    """
     from backtesting import Backtest
-    from api.strategies.v4_ghost import V4GhostStrategy
+    from api.strategies.v4_ghost import V4GhostStrategy, v4_ghost_fast_stats
 
     # Low / Medium: V4 Ghost (PDH/PDL sweep, proven profitable)
     # High:         Golden Breakout (Fibonacci 61.8% + RSI on H1 — works from 2020)
@@ -187,21 +1077,40 @@ def execute_backtest_by_level(level: str, initial_cash: float = 100_000.0,
     if level not in strategy_map:
         return {"status": "error", "error": f"Unknown level '{level}'. Use: low, medium, high"}
 
+    try:
+        initial_cash, start_date = normalize_run_args(initial_cash, start_date)
+    except ValueError as e:
+        return {"status": "error", "error": str(e), "risk_level": level}
+
+    StratClass, run_params = strategy_map[level]
+    key = _result_key(level, initial_cash, start_date, StratClass.__name__, run_params)
+    if use_cache:
+        cached = _result_cache_get(key)
+        if cached is not None:
+            return cached
+
     try:
         # All levels use M15 → H1 fallback
-        df, tf = _best_df(start_date)
-        if df is None:
+        bt_df, tf = _best_df(start_date, bt=True)
+        if bt_df is None:
             return {"status": "error", "error": "No CSV data found. Upload Dukascopy files to src/api/data/1HourData/"}
 
-        bt_df  = _prep_for_bt(df)
-        StratClass, run_params = strategy_map[level]
-
-        bt    = Backtest(bt_df, StratClass, cash=initial_cash, commission=0.0002,
-                         exclusive_orders=True, margin=1/50, finalize_trades=True)
-        stats = bt.run(**run_params)
+        if FAST_PATH and StratClass is V4GhostStrategy:
+            stats = v4_ghost_fast_stats(bt_df, cash=initial_cash, commission=0.0002, margin=1/50,
+                                        finalize_trades=True, progress=progress, **run_params)
+        else:
+            if progress is not None:
+                StratClass = _with_progress(StratClass, progress, len(bt_df))
+            bt    = Backtest(bt_df, StratClass, cash=initial_cash, commission=0.0002,
+                             exclusive_orders=True, margin=1/50, finalize_trades=True)
+            stats = bt.run(**run_params)
 
-        return _format_stats(stats, level, initial_cash, tf)
+        result = _format_stats(stats, level, initial_cash, tf)
+        _result_cache_put(key, result)
+        return result
 
+    except BacktestCancelled:
+        raise
     except Exception as e:
         logger.exception("Backtest error for level=%s", level)
         return {"status": "error", "error": str(e), "risk_level": level}
@@ -0,0 +1,336 @@
+"""
+Candle store — shared OHLCV history behind /market/candles.
+
+Chart requests used to be proxied one-for-one to MetaAPI historical-market-data.
+Closed bars never change, so they are now kept in a SQLite store every worker
+shares (data/.cache/candles.db), keyed by (symbol, timeframe). Per key the
+store records which time ranges it holds completely ("coverage" intervals,
+merged as they touch), and a request only goes upstream for what is missing:
+  - the head: bars closed since the last sync plus the still-forming bar, at
+    most once per CANDLE_FORMING_TTL seconds per worker;
+  - the tail: older bars when a request reaches past the covered range, or
+    one chunk for a historical window nothing covers yet.
+The forming bar is kept in memory only and never persisted.
+
+When MetaAPI cannot be used (no wallet, no token, budget refused, network
+error) the request is served from whatever the store holds; if that is empty
+too, XAUUSD falls back to the local Dukascopy exports in data/ (the same series
+backtest_engine.get_frame serves).
+
+Usage (from market_controller.py):
+    get_candles(account, "XAUUSD", "1h", limit=200)
+        → {"candles": [{"time", "open", "high", "low", "close", "volume"}, ...],
+           "source": "metaapi" | "store" | "dukascopy" | "none", ...}
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from api import metaapi_client as metaapi
+
+logger = logging.getLogger(__name__)
+
+_HERE      = os.path.dirname(os.path.abspath(__file__))
+CANDLE_DB  = os.path.join(_HERE, "data", ".cache", "candles.db")
+
+FORMING_TTL = float(os.getenv("CANDLE_FORMING_TTL", "10"))   # seconds between head syncs
+MAX_FETCH   = 1000                                          # MetaAPI per-request candle cap
+
+# chart timeframe → (bar length in seconds, local Dukascopy timeframe or None)
+TIMEFRAMES = {
+    "1m":  (60,         "M1"),
+    "5m":  (300,        "M5"),
+    "15m": (900,        "M15"),
+    "30m": (1800,       None),
+    "1h":  (3600,       "H1"),
+    "4h":  (14400,      "H4"),
+    "1d":  (86400,      "D1"),
+    "1w":  (7 * 86400,  None),
+    "1mn": (31 * 86400, None),   # upper bound — only used to decide if a bar has closed
+}
+LOCAL_SYMBOLS = {"XAUUSD"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS candles (
+    symbol    TEXT    NOT NULL,
+    timeframe TEXT    NOT NULL,
+    ts        INTEGER NOT NULL,
+    open      REAL, high REAL, low REAL, close REAL, volume REAL,
+    PRIMARY KEY (symbol, timeframe, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    symbol    TEXT    NOT NULL,
+    timeframe TEXT    NOT NULL,
+    lo        INTEGER NOT NULL,
+    hi        INTEGER NOT NULL,
+    complete  INTEGER NOT NULL DEFAULT 0,   -- 1: upstream has nothing older than lo
+    PRIMARY KEY (symbol, timeframe, lo)
+);
+"""
+
+_forming: dict[tuple, tuple] = {}       # (symbol, tf) → forming bar from the last head sync
+_synced:  dict[tuple, float] = {}       # (symbol, tf) → time of the last head sync
+_key_locks: dict[tuple, threading.Lock] = {}
+_state_lock = threading.Lock()
+_conn_local = threading.local()         # one connection per thread, reused across requests
+_conn_ready = set()                     # DB paths whose schema this process has created
+
+
+class UpstreamError(Exception):
+    """MetaAPI answered, but not with candles."""
+
+
+# ─── Storage ──────────────────────────────────────────────────────────────────
+
+def _connect() -> sqlite3.Connection:
+    """This thread's connection to CANDLE_DB; the schema is set up once per process."""
+    key  = (os.getpid(), CANDLE_DB)
+    conn = getattr(_conn_local, "conn", None)
+    if conn is not None and _conn_local.key == key:
+        return conn
+    os.makedirs(os.path.dirname(CANDLE_DB), exist_ok=True)
+    conn = sqlite3.connect(CANDLE_DB, timeout=10)
+    if CANDLE_DB not in _conn_ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _conn_ready.add(CANDLE_DB)
+    _conn_local.conn, _conn_local.key = conn, key
+    return conn
+
+
+def _drop_conn() -> None:
+    """Forget this thread's connection after an error; the next call reconnects."""
+    conn, _conn_local.conn = getattr(_conn_local, "conn", None), None
+    _conn_ready.discard(CANDLE_DB)
+    if conn is not None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+def _key_lock(key: tuple) -> threading.Lock:
+    with _state_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def _head(conn, key: tuple):
+    """The most recent coverage interval (lo, hi, complete), or None."""
+    return conn.execute(
+        "SELECT lo, hi, complete FROM coverage WHERE symbol = ? AND timeframe = ? ORDER BY hi DESC LIMIT 1",
+        key,
+    ).fetchone()
+
+
+def _covering(conn, key: tuple, ts: float):
+    """The coverage interval whose bars include the one open at `ts`, or None."""
+    return conn.execute(
+        "SELECT lo, hi, complete FROM coverage WHERE symbol = ? AND timeframe = ? AND lo <= ? AND hi + ? > ?",
+        (*key, int(ts), TIMEFRAMES[key[1]][0], int(ts)),
+    ).fetchone()
+
+
+def _cover(conn, key: tuple, lo: int, hi: int, complete: bool = False) -> None:
+    """Record [lo, hi] as complete, merging every interval it overlaps or touches."""
+    bar   = TIMEFRAMES[key[1]][0]
+    where = "symbol = ? AND timeframe = ? AND lo <= ? AND hi >= ?"
+    args  = (*key, hi + bar, lo - bar)
+    for r_lo, r_hi, r_complete in conn.execute(f"SELECT lo, hi, complete FROM coverage WHERE {where}", args).fetchall():
+        if r_lo < lo:
+            lo, complete = r_lo, bool(r_complete)
+        elif r_lo == lo:
+            complete = complete or bool(r_complete)
+        hi = max(hi, r_hi)
+    conn.execute(f"DELETE FROM coverage WHERE {where}", args)
+    conn.execute(
+        "INSERT INTO coverage (symbol, timeframe, lo, hi, complete) VALUES (?, ?, ?, ?, ?)",
+        (*key, lo, hi, int(complete)),
+    )
+
+
+def _store(conn, key: tuple, bars: list) -> None:
+    conn.executemany(
+        "INSERT OR REPLACE INTO candles (symbol, timeframe, ts, open, high, low, close, volume) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(*key, *bar) for bar in bars],
+    )
+
+
+def _read(conn, key: tuple, end_ts: float, limit: int) -> list:
+    rows = conn.execute(
+        "SELECT ts, open, high, low, close, volume FROM candles "
+        "WHERE symbol = ? AND timeframe = ? AND ts <= ? ORDER BY ts DESC LIMIT ?",
+        (*key, int(end_ts), limit),
+    ).fetchall()
+    return rows[::-1]
+
+
+# ─── Upstream ─────────────────────────────────────────────────────────────────
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _parse_time(value: str) -> int:
+    return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+
+
+def _fetch(account, key: tuple, start_ts: float, n: int) -> list:
+    """Up to `n` bars at or before start_ts, ascending, as (ts, o, h, l, c, v) tuples."""
+    symbol, tf = key
+    url  = metaapi.account_url(account, f"/historical-market-data/symbols/{symbol}/timeframes/{tf}/candles")
+    resp = metaapi.get(url, params={"startTime": _iso(start_ts), "limit": max(1, min(n, MAX_FETCH))})
+    if not resp.ok:
+        try:
+            message = resp.json().get("message", resp.text[:200])
+        except Exception:
+            message = resp.text[:200]
+        raise UpstreamError(message or f"HTTP {resp.status_code}")
+
+    bars = {}
+    for c in resp.json():
+        if c.get("open") is None or not c.get("time"):
+            continue
+        ts = _parse_time(c["time"])
+        bars[ts] = (ts, c.get("open"), c.get("high"), c.get("low"), c.get("close"), c.get("tickVolume", 0))
+    return [bars[ts] for ts in sorted(bars)]
+
+
+def _sync_head(conn, account, key: tuple, now: float, want: int) -> None:
+    """Pull bars closed since the stored range ends, plus the forming bar."""
+    if now - _synced.get(key, 0.0) < FORMING_TTL:
+        return
+    bar  = TIMEFRAMES[key[1]][0]
+    head = _head(conn, key)
+    # ask for everything since head.hi (+1 for overlap); the market's closed
+    # hours mean that usually reaches further back, which is what we want.
+    # An empty store asks for one extra bar, since the forming one is not kept.
+    n = want + 1 if head is None else int((now - head[1]) // bar) + 2
+    batch = _fetch(account, key, now, min(max(n, 2), MAX_FETCH))
+
+    forming = None
+    if batch and batch[-1][0] + bar > now:
+        forming = batch.pop()
+    if batch:
+        _store(conn, key, batch)
+        _cover(conn, key, batch[0][0], batch[-1][0])
+        conn.commit()
+    _forming[key] = forming
+    _synced[key]  = now
+
+
+def _sync_tail(conn, account, key: tuple, end_ts: float, limit: int, live: bool) -> None:
+    """Make sure `limit` closed bars at or before end_ts are stored."""
+    bar = TIMEFRAMES[key[1]][0]
+    cov = _head(conn, key) if live else _covering(conn, key, end_ts)
+    if cov is None:
+        # a window nothing covers yet — fetch it as one chunk (closed bars only)
+        now   = time.time()
+        batch = [b for b in _fetch(account, key, end_ts, limit) if b[0] + bar <= now]
+        if batch:
+            _store(conn, key, batch)
+            _cover(conn, key, batch[0][0], batch[-1][0], len(batch) < limit)
+            conn.commit()
+        return
+
+    lo, hi, complete = cov
+    have = conn.execute(
+        "SELECT COUNT(*) FROM candles WHERE symbol = ? AND timeframe = ? AND ts BETWEEN ? AND ?",
+        (*key, lo, int(min(end_ts, hi))),
+    ).fetchone()[0]
+    if have >= limit or complete:
+        return
+    need  = limit - have + 1                    # +1: the bar at `lo` comes back as overlap
+    batch = _fetch(account, key, lo, need)
+    older = [b for b in batch if b[0] < lo]
+    if older:
+        _store(conn, key, older)
+    _cover(conn, key, older[0][0] if older else lo, hi, len(batch) < need)
+    conn.commit()
+
+
+# ─── Local fallback ───────────────────────────────────────────────────────────
+
+def _local_bars(key: tuple, end_ts: float, limit: int) -> list:
+    symbol, tf = key
+    local_tf = TIMEFRAMES[tf][1]
+    if symbol not in LOCAL_SYMBOLS or local_tf is None:
+        return []
+    try:
+        from api.backtest_engine import get_frame
+
+        df = get_frame(local_tf, start_date=None)
+    except Exception as e:
+        logger.warning("Local %s candles unavailable: %s", local_tf, e)
+        return []
+    if df is None or df.empty:
+        return []
+    ts  = df.index.asi8 // 1_000_000_000
+    end = int(ts.searchsorted(int(end_ts), side="right"))
+    window = df.iloc[max(0, end - limit):end]
+    return list(zip(
+        (ts[max(0, end - limit):end]).tolist(),
+        window["open"].tolist(), window["high"].tolist(), window["low"].tolist(),
+        window["close"].tolist(), window["volume"].tolist(),
+    ))
+
+
+# ─── Public API ───────────────────────────────────────────────────────────────
+
+def _serialize(bar) -> dict:
+    ts, o, h, l, c, v = bar
+    return {"time": _iso(ts), "open": o, "high": h, "low": l, "close": c, "volume": v}
+
+
+def get_candles(account, symbol: str, timeframe: str, limit: int = 100, start_time: str | None = None) -> dict:
+    """
+    The `limit` most recent bars at or before start_time (default: now),
+    oldest first — the same window MetaAPI's candles endpoint returns.
+    `account` may be None; the request is then served without MetaAPI.
+    """
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"timeframe inválido. Permitidos: {', '.join(sorted(TIMEFRAMES))}")
+    key    = (symbol, timeframe)
+    now    = time.time()
+    end_ts = now if start_time is None else _parse_time(start_time)
+    live   = end_ts >= now - TIMEFRAMES[timeframe][0]
+    limit  = max(1, limit)
+
+    error, source = None, "store"
+    try:
+        conn = _connect()
+        if account is not None and metaapi.has_token():
+            with _key_lock(key):
+                try:
+                    if live:
+                        _sync_head(conn, account, key, now, limit)
+                    _sync_tail(conn, account, key, min(end_ts, now), limit, live)
+                    source = "metaapi"
+                except (metaapi.BudgetExceeded, UpstreamError) as e:
+                    error = str(e)
+                except Exception as e:
+                    conn.rollback()     # the connection outlives this request
+                    logger.warning("Candle sync %s %s failed: %s", symbol, timeframe, e)
+                    error = f"Error de red: {e}"
+        bars = _read(conn, key, end_ts, limit)
+    except sqlite3.Error:
+        _drop_conn()
+        raise
+
+    forming = _forming.get(key) if live else None
+    if forming is not None and forming[0] <= end_ts and (not bars or forming[0] > bars[-1][0]):
+        bars = (bars + [forming])[-limit:]
+
+    if not bars and source != "metaapi":
+        bars = _local_bars(key, end_ts, limit)
+        source = "dukascopy" if bars else "none"
+
+    result = {"candles": [_serialize(b) for b in bars], "source": source}
+    if error:
+        result["description"] = error
+        result["stale"] = True
+    return result
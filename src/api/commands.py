@@ -1,8 +1,27 @@
 
+import json
+import os
+import subprocess
+import sys
 import click
 from datetime import date
 from api.models import db, User, Strategy
 
+# Cold-start guard for `flask startup-benchmark`: importing the app must stay
+# under this many milliseconds and must not drag in the analytics stack, which
+# the backtest / optimizer / live endpoints import on first use.
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+HEAVY_MODULES     = ("pandas", "numpy", "backtesting", "yfinance", "ta", "numba")
+
+_SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_TIME_IMPORT = (
+    "import json, sys, time\n"
+    "t = time.perf_counter()\n"
+    "import app\n"
+    "ms = (time.perf_counter() - t) * 1000\n"
+    "print(json.dumps({'ms': ms, 'loaded': [m for m in %r if m in sys.modules]}))\n"
+)
+
 def setup_commands(app):
 
     @app.cli.command("insert-test-users") # name of our command
@@ -20,6 +39,57 @@ def setup_commands(app):
 
         print("All test users created")
 
+    @app.cli.command("ingest-data")
+    @click.argument("timeframe", required=False)
+    def ingest_data(timeframe):
+        """Append newly dropped Dukascopy CSVs to the cached backtest series."""
+        from api.backtest_engine import ingest_new_files, _TF_DIRS
+
+        timeframes = [timeframe.upper()] if timeframe else list(_TF_DIRS)
+        for tf in timeframes:
+            if tf not in _TF_DIRS:
+                print(f"  [skip] Unknown timeframe '{tf}'. Use: {', '.join(_TF_DIRS)}")
+                continue
+            r = ingest_new_files(tf)
+            print(f"  [{r['mode']}] {tf}: +{r['rows_added']} rows from {r['files']} file(s), {r['rows']} total")
+
+    @app.cli.command("startup-benchmark")
+    @click.option("--runs", default=5, show_default=True, help="Cold imports to time (best one is kept).")
+    @click.option("--budget", default=STARTUP_BUDGET_MS, show_default=True, help="Max import time in ms.")
+    def startup_benchmark(runs, budget):
+        """Time a cold `import app` in fresh interpreters and fail if it is over budget."""
+        timings, loaded = [], set()
+        for _ in range(max(runs, 1)):
+            out = subprocess.run(
+                [sys.executable, "-c", _TIME_IMPORT % (HEAVY_MODULES,)],
+                cwd=_SRC_DIR, capture_output=True, text=True, check=True,
+            )
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            timings.append(result["ms"])
+            loaded.update(result["loaded"])
+
+        best = min(timings)
+        print(f"  import app: best {best:.0f} ms, median {sorted(timings)[len(timings) // 2]:.0f} ms "
+              f"over {len(timings)} run(s) — budget {budget:.0f} ms")
+        failed = False
+        if loaded:
+            print(f"  [fail] heavy modules loaded at startup: {', '.join(sorted(loaded))}")
+            failed = True
+        if best > budget:
+            print(f"  [fail] cold start is {best - budget:.0f} ms over budget")
+            failed = True
+        if failed:
+            sys.exit(1)
+        print("  [ok] cold start within budget")
+
+    @app.cli.command("run-scheduler")
+    def run_scheduler_command():
+        """Run the bot-signal scheduler in the foreground (pair with SCHEDULER_MODE=off on web)."""
+        from api.scheduler import run_scheduler
+
+        print("  Scheduler running — Ctrl+C to stop")
+        run_scheduler(app)
+
     @app.cli.command("insert-test-data")
     def insert_test_data():
         pass
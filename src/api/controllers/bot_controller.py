@@ -158,21 +158,19 @@ def stop_bot():
 @jwt_required()
 def debug_metaapi():
     """Returns the raw MetaAPI trade endpoint response for debugging."""
-    import requests as req, os
+    from api import metaapi_client as metaapi
     user_id = int(get_jwt_identity())
     account = MetaApiAccount.query.filter_by(user_id=user_id, status="connected").first()
     if not account:
         return jsonify({"error": "No connected account"}), 200
 
-    token = os.getenv("META_API_TOKEN", os.getenv("METAAPI_TOKEN", ""))
-    base  = f"https://mt-client-api-v1.{account.region}.agiliumtrade.ai"
-    url   = f"{base}/users/current/accounts/{account.account_id}/trade"
+    url   = metaapi.account_url(account, "/trade")
     body  = {"actionType": "ORDER_TYPE_BUY", "symbol": "XAUUSD", "volume": 0.01}
     try:
-        r = req.post(url, json=body, headers={"auth-token": token, "Content-Type": "application/json"}, timeout=10)
+        r = metaapi.post(url, json=body)
         return jsonify({"status": r.status_code, "body": r.text, "url": url,
                         "account_id": account.account_id, "region": account.region,
-                        "token_set": bool(token)}), 200
+                        "token_set": bool(metaapi.token())}), 200
     except Exception as e:
         return jsonify({"error": str(e), "url": url}), 200
 
@@ -291,9 +289,16 @@ def run_signal():
     risk_level = active_us.strategy.risk_level
 
     # Get equity from MetaAPI account-information
+    from api import metaapi_client as metaapi
     from api.controllers.dashboard_controller import _fetch_wallet_balance
     bal    = _fetch_wallet_balance(account)
-    equity = bal.get("equity") or bal.get("balance") or 10_000.0
+    equity = bal.get("equity") or bal.get("balance")
+    if not equity:
+        # refused by the call budget or failed — a recent balance is fine, a guess is not
+        last   = metaapi.last_balance(account, metaapi.BALANCE_STALE)
+        equity = last and (last[1].get("equity") or last[1].get("balance"))
+    if not equity:
+        return jsonify({"status": "ERROR", "msg": "Account balance unavailable — try again later"}), 503
 
     from api.trade_engine import evaluate_signal, place_order
     signal = evaluate_signal(account, risk_level, equity)
@@ -1,45 +1,22 @@
-import requests as req
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from flask import Blueprint, jsonify, abort, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from api.models.wallet import MetaApiAccount
 from api.models.trade import Trade
 from api.models.db import db
-from api.controllers.wallet_controller import (
-    _metaapi_headers,
-    _check_token,
-    METAAPI_CLIENT_BASE,
-)
+from api import metaapi_client as metaapi
 
 dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
 
 
-def _fetch_wallet_balance(account):
+def _fetch_wallet_balance(account, stale_ok=False):
     empty = {"balance": None, "equity": None, "currency": None, "margin": None, "free_margin": None}
 
     if account.status != "connected" or not account.region:
         return empty
 
-    try:
-        base = METAAPI_CLIENT_BASE.format(region=account.region)
-        resp = req.get(
-            f"{base}/users/current/accounts/{account.account_id}/account-information",
-            headers=_metaapi_headers(),
-            timeout=10,
-        )
-        if resp.ok:
-            data = resp.json()
-            return {
-                "balance": data.get("balance"),
-                "equity": data.get("equity"),
-                "currency": data.get("currency", "USD"),
-                "margin": data.get("margin"),
-                "free_margin": data.get("freeMargin"),
-            }
-    except Exception:
-        pass
-
-    return empty
+    # cached per account for a few seconds — see metaapi_client.account_balance
+    return metaapi.account_balance(account, stale_ok=stale_ok) or empty
 
 
 @dashboard_bp.route('/summary', methods=['GET'])
@@ -48,12 +25,12 @@ def get_summary():
     user_id = int(get_jwt_identity())
     accounts = MetaApiAccount.query.filter_by(user_id=user_id).all()
 
-    has_token = _check_token()
+    has_token = metaapi.has_token()
     empty_balance = {"balance": None, "equity": None, "currency": None, "margin": None, "free_margin": None}
 
     if has_token and accounts:
         with ThreadPoolExecutor(max_workers=min(len(accounts), 5)) as executor:
-            futures = {executor.submit(_fetch_wallet_balance, acc): acc for acc in accounts}
+            futures = {executor.submit(_fetch_wallet_balance, acc, True): acc for acc in accounts}
             balances = {acc.id: empty_balance for acc in accounts}
             for future in as_completed(futures):
                 acc = futures[future]
@@ -1,21 +1,11 @@
-import os
-from datetime import datetime, timezone
-
-import requests as req
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from api import candle_store, price_stream, metaapi_client as metaapi
 from api.models.wallet import MetaApiAccount
 
 market_bp = Blueprint("market", __name__, url_prefix="/market")
 
-METAAPI_CLIENT_BASE = "https://mt-client-api-v1.{region}.agiliumtrade.ai"
-
-VALID_TIMEFRAMES = {"1m", "5m", "15m", "30m", "1h", "4h", "1d", "1w", "1mn"}
-
-
-def _metaapi_headers():
-    token = os.getenv("METAAPI_TOKEN", "")
-    return {"auth-token": token, "Content-Type": "application/json"}
+VALID_TIMEFRAMES = set(candle_store.TIMEFRAMES)
 
 
 def _find_connected_account(user_id):
@@ -28,7 +18,7 @@ def _find_connected_account(user_id):
 @jwt_required()
 def get_candles():
     """
-    Retorna candles históricas OHLCV para un símbolo dado vía MetaApi.
+    Retorna candles históricas OHLCV para un símbolo dado (candle store + MetaApi).
 
     Query params:
       - symbol   (str)  : símbolo del instrumento, default 'XAUUSD'
@@ -41,113 +31,88 @@ def get_candles():
     symbol = request.args.get("symbol", "XAUUSD").strip().upper()
     timeframe = request.args.get("timeframe", "1h").strip().lower()
     limit = min(int(request.args.get("limit", 100)), 1000)
-    start_time = request.args.get("startTime", datetime.now(timezone.utc).isoformat())
+    start_time = request.args.get("startTime")
 
     if timeframe not in VALID_TIMEFRAMES:
         return jsonify({"description": f"timeframe inválido. Permitidos: {', '.join(sorted(VALID_TIMEFRAMES))}"}), 400
 
-    token = os.getenv("METAAPI_TOKEN", "")
-    if not token or token == "your_metaapi_token_here":
-        return jsonify({"description": "METAAPI_TOKEN no configurado"}), 503
-
-    account = _find_connected_account(user_id)
-    if not account:
-        return jsonify({
-            "description": "No hay wallets conectadas. Conecta una wallet MT para ver datos de mercado en tiempo real.",
-            "candles": [],
-        }), 200
-
+    # Closed bars come from the shared candle store; MetaAPI is only asked for
+    # what it does not hold yet. Without a wallet/token the store (or the local
+    # Dukascopy history) still answers.
+    account = _find_connected_account(user_id) if metaapi.has_token() else None
     try:
-        base = METAAPI_CLIENT_BASE.format(region=account.region)
-        url = (
-            f"{base}/users/current/accounts/{account.account_id}"
-            f"/historical-market-data/symbols/{symbol}"
-            f"/timeframes/{timeframe}/candles"
-        )
-        resp = req.get(
-            url,
-            params={"startTime": start_time, "limit": limit},
-            headers=_metaapi_headers(),
-            timeout=15,
+        result = candle_store.get_candles(account, symbol, timeframe, limit=limit, start_time=start_time)
+    except ValueError as exc:
+        return jsonify({"description": f"startTime inválido: {exc}", "candles": []}), 400
+
+    if account is None and "description" not in result:
+        result["description"] = (
+            "METAAPI_TOKEN no configurado" if not metaapi.has_token() else
+            "No hay wallets conectadas. Conecta una wallet MT para ver datos de mercado en tiempo real."
         )
-
-        if not resp.ok:
-            error_msg = "Error de MetaApi"
-            try:
-                error_msg = resp.json().get("message", resp.text[:200])
-            except Exception:
-                error_msg = resp.text[:200]
-            return jsonify({"description": error_msg, "candles": []}), 200
-
-        raw_candles = resp.json()
-
-        candles = [
-            {
-                "time": c.get("time"),
-                "open": c.get("open"),
-                "high": c.get("high"),
-                "low": c.get("low"),
-                "close": c.get("close"),
-                "volume": c.get("tickVolume", 0),
-            }
-            for c in raw_candles
-            if c.get("open") is not None
-        ]
-
-        # MetaApi devuelve en orden cronológico inverso → lo invertimos
-        candles.sort(key=lambda c: c["time"])
-
-        return jsonify({"candles": candles, "symbol": symbol, "timeframe": timeframe}), 200
-
-    except req.exceptions.Timeout:
-        return jsonify({"description": "Timeout al conectar con MetaApi", "candles": []}), 200
-    except req.exceptions.RequestException as exc:
-        return jsonify({"description": f"Error de red: {str(exc)}", "candles": []}), 200
+    return jsonify({**result, "symbol": symbol, "timeframe": timeframe}), 200
 
 
 @market_bp.route("/price", methods=["GET"])
 @jwt_required()
 def get_price():
     """
-    Returns current XAUUSD bid/ask from MetaAPI.  1 API call.
+    Returns current XAUUSD bid/ask from MetaAPI.  0–1 API calls.
     Query param: symbol (default XAUUSD)
+
+    The symbol's fresh streamed quote is served when there is one; otherwise
+    concurrent pollers in this worker share one upstream call. Dashboards poll
+    this while /price/stream is full. Prefer /price/stream for live views.
     """
     user_id = int(get_jwt_identity())
     symbol  = request.args.get("symbol", "XAUUSD").strip().upper()
 
-    token = os.getenv("METAAPI_TOKEN", "")
-    if not token or token == "your_metaapi_token_here":
+    if not metaapi.has_token():
         return jsonify({"error": "METAAPI_TOKEN not set"}), 503
 
     account = _find_connected_account(user_id)
     if not account:
         return jsonify({"error": "No connected wallet"}), 200
 
-    try:
-        base = METAAPI_CLIENT_BASE.format(region=account.region)
-        url  = f"{base}/users/current/accounts/{account.account_id}/symbols/{symbol}/current-price"
-        resp = req.get(url, headers=_metaapi_headers(), timeout=10)
-        if resp.ok:
-            data = resp.json()
-            return jsonify({
-                "symbol": symbol,
-                "bid":    data.get("bid"),
-                "ask":    data.get("ask"),
-                "time":   data.get("time"),
-            }), 200
-        # Fallback: get price from latest candle
-        candle_url = (
-            f"{base}/users/current/accounts/{account.account_id}"
-            f"/historical-market-data/symbols/{symbol}/timeframes/1m/candles"
-        )
-        cr = req.get(candle_url, headers=_metaapi_headers(),
-                     params={"startTime": datetime.now(timezone.utc).isoformat(), "limit": 1},
-                     timeout=10)
-        if cr.ok:
-            candles = cr.json()
-            if candles:
-                price = candles[0].get("close") or candles[0].get("open")
-                return jsonify({"symbol": symbol, "bid": price, "ask": price, "time": candles[0].get("time")}), 200
-        return jsonify({"error": resp.text[:200]}), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 200
+    return jsonify(price_stream.quote(account, symbol)), 200
+
+
+@market_bp.route("/price/stream-token", methods=["POST"])
+@jwt_required()
+def price_stream_token():
+    """
+    Short-lived token for opening /price/stream. EventSource cannot send the
+    Authorization header, and the access token must not end up in URLs / logs.
+    """
+    user_id = int(get_jwt_identity())
+    return jsonify({"token": price_stream.issue_token(user_id), "expires_in": price_stream.TOKEN_TTL}), 200
+
+
+@market_bp.route("/price/stream", methods=["GET"])
+def stream_price():
+    """
+    Server-Sent Events feed of bid/ask (`event: price`) for one symbol.
+    Query params: symbol (default XAUUSD), token (from POST /price/stream-token)
+
+    All clients of a symbol share one upstream poller; see api/price_stream.py.
+    When this worker has no stream slot left the client gets one `event: full`
+    telling it to poll /price instead.
+    """
+    user_id = price_stream.token_user(request.args.get("token"))
+    if user_id is None:
+        return jsonify({"error": "Invalid or expired stream token"}), 401
+    symbol = request.args.get("symbol", "XAUUSD").strip().upper()
+
+    if not metaapi.has_token():
+        return jsonify({"error": "METAAPI_TOKEN not set"}), 503
+
+    account = _find_connected_account(user_id)
+    if not account:
+        return jsonify({"error": "No connected wallet"}), 404
+
+    body = price_stream.stream(symbol, account) or price_stream.refused()
+    return Response(
+        body,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,26 +1,12 @@
-import os
 import requests as req
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from api import metaapi_client as metaapi
 from api.models import db
 from api.models.wallet import MetaApiAccount
 
 wallet_bp = Blueprint('wallet', __name__, url_prefix='/wallets')
 
-METAAPI_BASE_URL = "https://mt-provisioning-api-v1.agiliumtrade.agiliumtrade.ai"
-METAAPI_PROVISIONING_URL = f"{METAAPI_BASE_URL}/users/current/accounts"
-METAAPI_CLIENT_BASE = "https://mt-client-api-v1.{region}.agiliumtrade.ai"
-
-
-def _metaapi_headers():
-    token = os.getenv("META_API_TOKEN", os.getenv("METAAPI_TOKEN", ""))
-    return {"auth-token": token, "Content-Type": "application/json"}
-
-
-def _check_token():
-    token = os.getenv("META_API_TOKEN", os.getenv("METAAPI_TOKEN", ""))
-    return token and token != "your_metaapi_token_here"
-
 
 @wallet_bp.route('/servers', methods=['GET'])
 @jwt_required()
@@ -37,15 +23,13 @@ def search_servers():
     if not query:
         return jsonify({"servers": {}}), 200
 
-    if not _check_token():
+    if not metaapi.has_token():
         return jsonify({"servers": {}}), 200
 
     try:
-        resp = req.get(
-            f"{METAAPI_BASE_URL}/known-mt-servers/{version}/search",
+        resp = metaapi.get(
+            f"{metaapi.PROVISIONING_BASE}/known-mt-servers/{version}/search",
             params={"query": query},
-            headers={"auth-token": os.getenv("METAAPI_TOKEN", "")},
-            timeout=10,
         )
         if resp.ok:
             return jsonify({"servers": resp.json()}), 200
@@ -62,10 +46,8 @@ def _sync_account_status(account):
     Returns True if the status was updated.
     """
     try:
-        resp = req.get(
-            f"{METAAPI_PROVISIONING_URL}/{account.account_id}",
-            headers=_metaapi_headers(),
-            timeout=10,
+        resp = metaapi.get(
+            f"{metaapi.PROVISIONING_URL}/{account.account_id}",
         )
         if not resp.ok:
             return False
@@ -100,7 +82,7 @@ def get_wallets():
     user_id = int(get_jwt_identity())
     accounts = MetaApiAccount.query.filter_by(user_id=user_id).all()
 
-    if _check_token():
+    if metaapi.has_token():
         for account in accounts:
             if account.status == "draft" or not account.region:
                 _sync_account_status(account)
@@ -126,7 +108,7 @@ def add_wallet():
     if platform not in ("mt4", "mt5"):
         return jsonify({"description": "platform debe ser mt4 o mt5"}), 400
 
-    if not _check_token():
+    if not metaapi.has_token():
         return jsonify({"description": "METAAPI_TOKEN no configurado en el servidor"}), 503
 
     # Create account in DRAFT state — no credentials, returns instantly
@@ -139,11 +121,9 @@ def add_wallet():
     }
 
     try:
-        resp = req.post(
-            METAAPI_PROVISIONING_URL,
+        resp = metaapi.post(
+            metaapi.PROVISIONING_URL,
             json=payload,
-            headers=_metaapi_headers(),
-            timeout=15,
         )
     except req.exceptions.RequestException as e:
         return jsonify({"description": f"Error al conectar con MetaApi: {str(e)}"}), 502
@@ -164,10 +144,8 @@ def add_wallet():
     # Request a configuration link for the user to enter MT credentials securely
     config_link = ""
     try:
-        link_resp = req.put(
-            f"{METAAPI_PROVISIONING_URL}/{meta_account_id}/configuration-link",
-            headers=_metaapi_headers(),
-            timeout=15,
+        link_resp = metaapi.put(
+            f"{metaapi.PROVISIONING_URL}/{meta_account_id}/configuration-link",
         )
         if link_resp.ok:
             config_link = link_resp.json().get("configurationLink", "")
@@ -203,7 +181,7 @@ def sync_wallet(wallet_id):
     if not account:
         return jsonify({"description": "Wallet no encontrada"}), 404
 
-    if not _check_token():
+    if not metaapi.has_token():
         return jsonify({"description": "METAAPI_TOKEN no configurado en el servidor"}), 503
 
     _sync_account_status(account)
@@ -219,14 +197,12 @@ def get_config_link(wallet_id):
     if not account:
         return jsonify({"description": "Wallet no encontrada"}), 404
 
-    if not _check_token():
+    if not metaapi.has_token():
         return jsonify({"description": "METAAPI_TOKEN no configurado en el servidor"}), 503
 
     try:
-        link_resp = req.put(
-            f"{METAAPI_PROVISIONING_URL}/{account.account_id}/configuration-link",
-            headers=_metaapi_headers(),
-            timeout=15,
+        link_resp = metaapi.put(
+            f"{metaapi.PROVISIONING_URL}/{account.account_id}/configuration-link",
         )
         if not link_resp.ok:
             return jsonify({"description": "MetaApi no pudo generar el enlace"}), 502
@@ -251,32 +227,13 @@ def get_wallet_balance(wallet_id):
         return jsonify(empty), 200
 
     # Populate region for wallets created before region support was added
-    if not account.region and _check_token():
+    if not account.region and metaapi.has_token():
         _sync_account_status(account)
 
     if not account.region:
         return jsonify(empty), 200
 
-    try:
-        base = METAAPI_CLIENT_BASE.format(region=account.region)
-        resp = req.get(
-            f"{base}/users/current/accounts/{account.account_id}/account-information",
-            headers=_metaapi_headers(),
-            timeout=10,
-        )
-        if resp.ok:
-            d = resp.json()
-            return jsonify({
-                "balance": d.get("balance"),
-                "equity": d.get("equity"),
-                "currency": d.get("currency", "USD"),
-                "margin": d.get("margin"),
-                "free_margin": d.get("freeMargin"),
-            }), 200
-    except Exception:
-        pass
-
-    return jsonify(empty), 200
+    return jsonify(metaapi.account_balance(account, stale_ok=True) or empty), 200
 
 
 @wallet_bp.route('/<int:wallet_id>', methods=['DELETE'])
@@ -290,10 +247,8 @@ def delete_wallet(wallet_id):
 
     # Remove from MetaApi (best effort)
     try:
-        req.delete(
-            f"{METAAPI_PROVISIONING_URL}/{account.account_id}",
-            headers=_metaapi_headers(),
-            timeout=15,
+        metaapi.delete(
+            f"{metaapi.PROVISIONING_URL}/{account.account_id}",
         )
     except Exception:
         pass
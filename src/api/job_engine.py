@@ -0,0 +1,334 @@
+"""
+Asynchronous backtest jobs — keeps CPU-bound simulations out of the web worker.
+
+Jobs run execute_backtest_by_level in a small process pool (JOB_WORKERS),
+started from a forkserver like the optimizer's, so a simulation never holds
+the GIL of a process that is serving requests. The job's JSON record under
+data/.cache/jobs/ is the source of truth: the pool process writes its status,
+progress and heartbeat there, so any gunicorn worker can answer a status poll
+and finished results survive a worker restart.
+
+Identical requests (same level / balance / start) share one job across all
+workers: the first one creates inflight-<hash> with O_EXCL and everyone else
+joins the job it names. A queued or running job whose owning web worker has
+exited, or whose heartbeat is older than JOB_STALE_AFTER, is marked failed the
+next time anyone looks at it, and its slot is freed.
+
+Usage (from routes.py):
+    submit_backtest_job("low", balance=10_000, start_date="2026-01-01")
+        → {"job_id": "...", "status": "queued", ...}
+    get_job(job_id)     → {"status": "running", "progress": 0.42, ...}
+    cancel_job(job_id)  → {"status": "cancelled", ...}
+
+Status values: queued → running → done | error | cancelled
+"""
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+_HERE    = os.path.dirname(os.path.abspath(__file__))
+JOBS_DIR = os.path.join(_HERE, "data", ".cache", "jobs")
+
+JOB_WORKERS     = int(os.getenv("BACKTEST_JOB_WORKERS", "2"))
+JOB_RETENTION   = int(os.getenv("BACKTEST_JOB_RETENTION", str(24 * 3600)))   # seconds
+JOB_STALE_AFTER = int(os.getenv("BACKTEST_JOB_STALE_AFTER", "600"))          # seconds without a heartbeat
+LEVELS          = ("low", "medium", "high")
+
+_TERMINAL   = ("done", "error", "cancelled")
+_JOB_ID     = re.compile(r"[0-9a-f]{32}")
+_HEARTBEAT  = 1.0    # seconds between progress / heartbeat writes
+_MP_CONTEXT = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_futures: dict = {}                 # job_id → Future, for jobs this process submitted
+_jobs_lock = threading.Lock()
+_executor  = None
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _jobs_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=JOB_WORKERS,
+                                            mp_context=multiprocessing.get_context(_MP_CONTEXT),
+                                            initializer=_init_worker, initargs=(JOBS_DIR,))
+        return _executor
+
+
+def _init_worker(jobs_dir: str) -> None:
+    """Pool process: use the parent's job directory, not a fresh import's default."""
+    global JOBS_DIR
+    JOBS_DIR = jobs_dir
+
+
+# ─── Persistence ──────────────────────────────────────────────────────────────
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, job_id + ".json")
+
+
+def _cancel_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, job_id + ".cancel")
+
+
+def _key_path(key: tuple) -> str:
+    digest = hashlib.sha1(json.dumps(key).encode()).hexdigest()
+    return os.path.join(JOBS_DIR, f"inflight-{digest}")
+
+
+def _persist(job: dict) -> None:
+    try:
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=JOBS_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(job, f)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, _job_path(job["job_id"]))
+    except OSError as e:
+        logger.warning("Could not persist job %s: %s", job.get("job_id"), e)
+
+
+def _load(job_id: str) -> dict | None:
+    try:
+        with open(_job_path(job_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _prune() -> None:
+    """Forget finished jobs older than JOB_RETENTION, on disk and in this process."""
+    cutoff = time.time() - JOB_RETENTION
+    with _jobs_lock:
+        for job_id in [j for j, fut in _futures.items() if fut.done()]:
+            _futures.pop(job_id, None)
+    if not os.path.isdir(JOBS_DIR):
+        return
+    for name in os.listdir(JOBS_DIR):
+        path = os.path.join(JOBS_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+# ─── Job lifecycle ────────────────────────────────────────────────────────────
+
+def _pid_alive(pid) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except PermissionError:
+        return True
+    except (OSError, ValueError):
+        return False
+    return True
+
+
+def _finish(job_id: str, status: str, **fields) -> dict | None:
+    """Move a job to a terminal status (once) and free its dedupe slot."""
+    job = _load(job_id)
+    if job is None:
+        return None
+    if job["status"] in _TERMINAL:
+        return job
+    job.update(status=status, finished_at=_now(), finished_ts=time.time(), **fields)
+    _persist(job)
+    _remove(_cancel_path(job_id))
+    _remove(_key_path(tuple(job["key"])))
+    return job
+
+
+def _reap(job: dict) -> dict:
+    """Fail a queued/running job whose owner is gone or whose heartbeat went quiet."""
+    if job["status"] in _TERMINAL:
+        return job
+    quiet = time.time() - job.get("heartbeat", 0)
+    if not _pid_alive(job.get("owner_pid")):
+        reason = "Worker exited before the job finished"
+    elif job["status"] == "running" and quiet > JOB_STALE_AFTER:
+        reason = f"No progress for {quiet:.0f}s — job abandoned"
+    else:
+        return job
+    logger.warning("Backtest job %s: %s", job["job_id"], reason)
+    return _finish(job["job_id"], "error", error=reason) or job
+
+
+def _run_job(job: dict) -> dict:
+    """
+    Pool process: run one backtest, keeping its record's status, progress and
+    heartbeat current. Returns the terminal fields for the owner to record.
+    """
+    from api.backtest_engine import execute_backtest_by_level, BacktestCancelled
+
+    job_id = job["job_id"]
+    if os.path.exists(_cancel_path(job_id)):
+        return {"status": "cancelled"}
+
+    job.update(status="running", started_at=_now(), heartbeat=time.time(), worker_pid=os.getpid())
+    _persist(job)
+    last_flush = [time.time()]
+
+    def progress(done, total):
+        # DELETE may land on any web worker — it leaves a marker file
+        if os.path.exists(_cancel_path(job_id)):
+            raise BacktestCancelled()
+        now = time.time()
+        if now - last_flush[0] < _HEARTBEAT:
+            return
+        last_flush[0] = now
+        job.update(progress=round(done / max(total, 1), 3), heartbeat=now)
+        _persist(job)
+
+    try:
+        result = execute_backtest_by_level(
+            job["level"], initial_cash=job["balance"], start_date=job["start_date"],
+            progress=progress,
+        )
+    except BacktestCancelled:
+        return {"status": "cancelled"}
+    except Exception as e:
+        logger.exception("Backtest job %s failed", job_id)
+        return {"status": "error", "error": str(e)}
+    if result.get("status") == "ok":
+        return {"status": "done", "progress": 1.0, "result": result}
+    return {"status": "error", "error": result.get("error"), "result": result}
+
+
+def _on_done(job_id: str, future) -> None:
+    """Owner side: record what the pool process returned."""
+    try:
+        outcome = dict(future.result())
+    except Exception as e:     # cancelled before it started, or the pool broke
+        outcome = {"status": "cancelled"} if future.cancelled() else {"status": "error", "error": str(e)}
+    _finish(job_id, outcome.pop("status"), **outcome)
+
+
+def _public(job: dict) -> dict:
+    return {k: v for k, v in job.items() if k not in ("key", "finished_ts", "heartbeat", "owner_pid", "worker_pid")}
+
+
+# ─── Public API ───────────────────────────────────────────────────────────────
+
+def submit_backtest_job(level: str, balance: float = 10_000.0, start_date: str = "2026-01-01") -> dict:
+    """Queue a backtest (or join the identical one already queued/running in any worker)."""
+    from api.backtest_engine import normalize_run_args
+
+    if level not in LEVELS:
+        return {"status": "error", "error": f"Unknown level '{level}'. Use: low, medium, high"}
+    balance, start_date = normalize_run_args(balance, start_date)
+
+    _prune()
+    key    = (level, balance, start_date)
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id":      job_id,
+        "key":         list(key),
+        "level":       level,
+        "balance":     balance,
+        "start_date":  start_date,
+        "status":      "queued",
+        "progress":    0.0,
+        "created_at":  _now(),
+        "started_at":  None,
+        "finished_at": None,
+        "error":       None,
+        "result":      None,
+        "owner_pid":   os.getpid(),
+        "heartbeat":   time.time(),
+    }
+    # The record exists before the slot names it, so a reader of the slot
+    # always finds a job — a missing one means it is gone for good.
+    _persist(job)
+    for _ in range(20):
+        try:
+            fd = os.open(_key_path(key), os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            try:
+                with open(_key_path(key)) as f:
+                    owner = f.read().strip()
+            except OSError:
+                continue                              # freed meanwhile — try again
+            if not owner:
+                time.sleep(0.05)                      # its creator is still writing it
+                continue
+            existing = _load(owner)
+            if existing is not None and _reap(existing)["status"] not in _TERMINAL:
+                _remove(_job_path(job_id))
+                return {**_public(existing), "deduplicated": True}
+            _remove(_key_path(key))                   # leftover of a finished / dead job
+            continue
+        with os.fdopen(fd, "w") as f:
+            f.write(job_id)
+        break
+    else:
+        _remove(_job_path(job_id))
+        return {"status": "error", "error": "Could not queue the job, try again"}
+
+    try:
+        future = _get_executor().submit(_run_job, dict(job))
+    except Exception as e:
+        logger.exception("Could not start backtest job %s", job_id)
+        return _public(_finish(job_id, "error", error=str(e)) or job)
+    with _jobs_lock:
+        _futures[job_id] = future
+    future.add_done_callback(lambda fut: _on_done(job_id, fut))
+    return _public(job)
+
+
+def get_job(job_id: str) -> dict | None:
+    if not _JOB_ID.fullmatch(job_id or ""):
+        return None
+    job = _load(job_id)
+    return _public(_reap(job)) if job else None
+
+
+def cancel_job(job_id: str) -> dict | None:
+    """
+    Cancel a queued or running job. A job still waiting in this worker's pool
+    is dropped immediately; otherwise a marker file is left that the pool
+    process checks at its next progress step, whichever worker owns it.
+    """
+    if not _JOB_ID.fullmatch(job_id or ""):
+        return None
+    job = _load(job_id)
+    if job is None:
+        return None
+    job = _reap(job)
+    if job["status"] in _TERMINAL:
+        return _public(job)
+
+    with _jobs_lock:
+        future = _futures.get(job_id)
+    if future is not None and future.cancel():
+        return _public(_finish(job_id, "cancelled") or job)
+    try:
+        with open(_cancel_path(job_id), "w"):
+            pass
+    except OSError as e:
+        logger.warning("Could not flag job %s for cancellation: %s", job_id, e)
+    return {**_public(job), "cancel_requested": True}
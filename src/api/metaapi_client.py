@@ -0,0 +1,496 @@
+"""
+MetaAPI HTTP client — one pooled, keep-alive connection set for every caller.
+
+Controllers, the trade engine and the scheduler all talk to the same two kinds
+of host: the provisioning API and the per-region client API
+(mt-client-api-v1.{region}.agiliumtrade.ai). Each host gets one
+requests.Session whose connection pool is reused across requests and threads,
+so the TLS handshake (100–300 ms) is paid once per worker instead of once per
+call.
+
+Every call goes through request(), which
+  - adds the auth headers,
+  - picks a timeout and a priority for the endpoint (ENDPOINTS),
+  - charges the shared daily call budget (see "Call budget" below),
+  - retries 429 / 5xx / dropped connections with jittered exponential backoff.
+    Non-idempotent calls (POST — i.e. order placement) are only retried on
+    429, which MetaAPI returns before doing any work, so an order can never be
+    sent twice.
+
+Usage:
+    from api import metaapi_client as metaapi
+    resp = metaapi.get(metaapi.account_url(account, "/account-information"))
+    resp = metaapi.post(metaapi.account_url(account, "/trade"), json=body)
+
+Responses and requests exceptions are returned / raised unchanged; a call
+refused by the budget raises BudgetExceeded (a RequestException).
+
+account_balance() adds a per-account TTL cache on top of account-information,
+shared by the dashboard, the wallet endpoints, /bot/signal and the scheduler.
+"""
+
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+PROVISIONING_BASE = "https://mt-provisioning-api-v1.agiliumtrade.agiliumtrade.ai"
+PROVISIONING_URL  = f"{PROVISIONING_BASE}/users/current/accounts"
+CLIENT_BASE       = "https://mt-client-api-v1.{region}.agiliumtrade.ai"
+
+POOL_SIZE       = int(os.getenv("METAAPI_POOL_SIZE", "10"))      # keep-alive connections per host
+MAX_RETRIES     = int(os.getenv("METAAPI_MAX_RETRIES", "3"))
+BACKOFF_BASE    = float(os.getenv("METAAPI_BACKOFF_BASE", "0.5"))  # seconds, doubled per attempt
+BACKOFF_MAX     = 8.0
+CONNECT_TIMEOUT = 3.05
+
+# Call priorities — when the budget runs low, lower-priority calls are refused first
+ORDER, ACCOUNT, MARKET = "order", "account", "market"
+
+# (path fragment, read timeout in seconds, priority) — first match wins
+ENDPOINTS = (
+    ("/trade",                   10, ORDER),
+    ("/current-price",            5, MARKET),
+    ("/account-information",     10, ACCOUNT),
+    ("/positions",               10, ACCOUNT),
+    ("/history-deals/",          15, ACCOUNT),
+    ("/historical-market-data/", 15, MARKET),
+    ("/configuration-link",      15, ACCOUNT),
+    ("/known-mt-servers/",       10, ACCOUNT),
+)
+DEFAULT_TIMEOUT  = 15
+DEFAULT_PRIORITY = ACCOUNT
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+_IDEMPOTENT   = {"GET", "PUT", "DELETE", "HEAD", "OPTIONS"}
+
+_sessions: dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+# ─── Auth ─────────────────────────────────────────────────────────────────────
+
+def token() -> str:
+    return os.getenv("META_API_TOKEN", os.getenv("METAAPI_TOKEN", ""))
+
+
+def has_token() -> bool:
+    t = token()
+    return bool(t) and t != "your_metaapi_token_here"
+
+
+def headers() -> dict:
+    return {"auth-token": token(), "Content-Type": "application/json"}
+
+
+# ─── URLs ─────────────────────────────────────────────────────────────────────
+
+def client_base(region: str) -> str:
+    return CLIENT_BASE.format(region=region)
+
+
+def account_url(account, path: str = "") -> str:
+    """Client-API URL for a MetaApiAccount, e.g. account_url(acc, "/positions")."""
+    return f"{client_base(account.region)}/users/current/accounts/{account.account_id}{path}"
+
+
+def _endpoint(url: str) -> tuple:
+    path = urlsplit(url).path
+    for fragment, read, priority in ENDPOINTS:
+        if fragment in path:
+            return read, priority
+    return DEFAULT_TIMEOUT, DEFAULT_PRIORITY
+
+
+def endpoint_timeout(url: str) -> tuple:
+    return CONNECT_TIMEOUT, _endpoint(url)[0]
+
+
+# ─── Sessions ─────────────────────────────────────────────────────────────────
+
+def _session(url: str) -> requests.Session:
+    host = urlsplit(url).netloc
+    with _sessions_lock:
+        s = _sessions.get(host)
+        if s is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _sessions[host] = s
+        return s
+
+
+def _backoff(attempt: int, resp=None) -> float:
+    retry_after = resp.headers.get("Retry-After") if resp is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    # "full jitter": spread concurrent retries instead of synchronizing them
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+# ─── Call budget ──────────────────────────────────────────────────────────────
+# MetaAPI allows DAILY_LIMIT calls per UTC day across the whole app, so the
+# accounting lives in a small SQLite file every worker shares. Each HTTP
+# attempt (retries included) spends one call and one token from a bucket that
+# refills at DAILY_LIMIT/day up to BUDGET_BURST, which spreads usage over the
+# day instead of letting one busy hour drain it.
+#
+# Priorities degrade in order as the day's budget fills up:
+#   market  (candles, prices)      refused above 70 % of the day or with < 25 % of the bucket
+#   account (balances, positions)  refused above 90 % of the day or with an empty bucket
+#   order   (trade)                only refused at the hard daily limit
+# A refused GET falls back to the last good response for the same URL when
+# one is cached in this process; otherwise BudgetExceeded is raised. Candle
+# requests are never cached: they are keyed on a startTime that moves with
+# every call, and candle_store already keeps the bars they return.
+
+DAILY_LIMIT  = int(os.getenv("METAAPI_DAILY_LIMIT", "2000"))
+BUDGET_BURST = float(os.getenv("METAAPI_BUDGET_BURST", "120"))
+BUDGET_DB    = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", ".cache", "metaapi_budget.db")
+
+_DAY_SHARE      = {ORDER: 1.0, ACCOUNT: 0.9, MARKET: 0.7}
+_BUCKET_RESERVE = {ORDER: None, ACCOUNT: 1.0, MARKET: 0.25 * BUDGET_BURST + 1.0}
+_FALLBACK_MAX   = 256
+
+_BUDGET_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    day      TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    calls    INTEGER NOT NULL DEFAULT 0,
+    denied   INTEGER NOT NULL DEFAULT 0,
+    degraded INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, priority)
+);
+CREATE TABLE IF NOT EXISTS bucket (
+    id      INTEGER PRIMARY KEY CHECK (id = 1),
+    tokens  REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+_fallback: "OrderedDict[tuple, requests.Response]" = OrderedDict()
+_fallback_lock = threading.Lock()
+_budget_broken = False
+_budget_local  = threading.local()      # one connection per thread, reused across calls
+_budget_ready  = set()                  # DB paths whose schema this process has created
+
+
+class BudgetExceeded(requests.RequestException):
+    """The daily MetaAPI call budget has no room left for a call of this priority."""
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def _connect_budget() -> sqlite3.Connection:
+    """This thread's connection to BUDGET_DB; the schema is created once per process."""
+    key  = (os.getpid(), BUDGET_DB)
+    conn = getattr(_budget_local, "conn", None)
+    if conn is not None and _budget_local.key == key:
+        return conn
+    os.makedirs(os.path.dirname(BUDGET_DB), exist_ok=True)
+    conn = sqlite3.connect(BUDGET_DB, timeout=10, isolation_level=None)
+    if BUDGET_DB not in _budget_ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_BUDGET_SCHEMA)
+        _budget_ready.add(BUDGET_DB)
+    _budget_local.conn, _budget_local.key = conn, key
+    return conn
+
+
+def _drop_budget_conn() -> None:
+    """Forget this thread's connection after an error; the next call reconnects."""
+    conn, _budget_local.conn = getattr(_budget_local, "conn", None), None
+    _budget_ready.discard(BUDGET_DB)
+    if conn is not None:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+def _bump(conn, day: str, priority: str, column: str) -> None:
+    conn.execute(
+        f"INSERT INTO usage (day, priority, {column}) VALUES (?, ?, 1) "
+        f"ON CONFLICT (day, priority) DO UPDATE SET {column} = {column} + 1",
+        (day, priority),
+    )
+
+
+def _spend(priority: str) -> bool:
+    """Charge one call to the shared budget; False if `priority` may not spend now."""
+    global _budget_broken
+    day, now = _today(), time.time()
+    try:
+        conn = _connect_budget()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            used = conn.execute("SELECT COALESCE(SUM(calls), 0) FROM usage WHERE day = ?", (day,)).fetchone()[0]
+            row  = conn.execute("SELECT tokens, updated FROM bucket WHERE id = 1").fetchone()
+            tokens = BUDGET_BURST if row is None else min(
+                BUDGET_BURST, row[0] + (now - row[1]) * DAILY_LIMIT / 86400)
+
+            reserve = _BUCKET_RESERVE[priority]
+            allowed = used < DAILY_LIMIT * _DAY_SHARE[priority] and (reserve is None or tokens >= reserve)
+            if allowed:
+                tokens -= 1
+                _bump(conn, day, priority, "calls")
+            else:
+                _bump(conn, day, priority, "denied")
+            conn.execute("INSERT OR REPLACE INTO bucket (id, tokens, updated) VALUES (1, ?, ?)",
+                         (max(tokens, 0.0), now))
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        _budget_broken = False
+        return allowed
+    except (sqlite3.Error, OSError) as e:
+        _drop_budget_conn()
+        # accounting must never take MetaAPI down with it — fail open, loudly once
+        if not _budget_broken:
+            logger.error("MetaAPI budget store unavailable (%s) — calls are not being metered", e)
+        _budget_broken = True
+        return True
+
+
+def _note_degraded(priority: str) -> None:
+    try:
+        _bump(_connect_budget(), _today(), priority, "degraded")
+    except (sqlite3.Error, OSError):
+        _drop_budget_conn()
+
+
+def _fallback_key(url: str, kwargs: dict) -> tuple | None:
+    """Cache key for a GET's fallback response; None for requests that are not cached."""
+    if "/historical-market-data/" in url:
+        return None
+    params = kwargs.get("params") or {}
+    return url, tuple(sorted(params.items() if isinstance(params, dict) else params))
+
+
+def _remember(key: tuple | None, resp: requests.Response) -> None:
+    if key is None:
+        return
+    with _fallback_lock:
+        _fallback[key] = resp
+        _fallback.move_to_end(key)
+        while len(_fallback) > _FALLBACK_MAX:
+            _fallback.popitem(last=False)
+
+
+def _degrade(key: tuple | None, priority: str, method: str, url: str):
+    """The cached response for a refused GET, or raise BudgetExceeded."""
+    with _fallback_lock:
+        cached = _fallback.get(key) if method == "GET" and key is not None else None
+    if cached is None:
+        raise BudgetExceeded(f"MetaAPI daily budget exhausted for {priority} calls ({urlsplit(url).path})")
+    _note_degraded(priority)
+    logger.info("MetaAPI budget low — serving cached %s for %s", urlsplit(url).path, priority)
+    return cached
+
+
+def budget_usage() -> dict:
+    """Today's MetaAPI usage across all workers, for dashboards / alerting."""
+    day = _today()
+    try:
+        conn   = _connect_budget()
+        rows   = conn.execute(
+            "SELECT priority, calls, denied, degraded FROM usage WHERE day = ?", (day,)
+        ).fetchall()
+        bucket = conn.execute("SELECT tokens, updated FROM bucket WHERE id = 1").fetchone()
+    except (sqlite3.Error, OSError) as e:
+        _drop_budget_conn()
+        return {"status": "error", "error": str(e)}
+
+    by_priority = {p: {"calls": 0, "denied": 0, "degraded": 0} for p in (ORDER, ACCOUNT, MARKET)}
+    for priority, calls, denied, degraded in rows:
+        by_priority[priority] = {"calls": calls, "denied": denied, "degraded": degraded}
+    used   = sum(v["calls"] for v in by_priority.values())
+    tokens = BUDGET_BURST if bucket is None else min(
+        BUDGET_BURST, bucket[0] + (time.time() - bucket[1]) * DAILY_LIMIT / 86400)
+    return {
+        "day":         day,
+        "limit":       DAILY_LIMIT,
+        "used":        used,
+        "remaining":   max(DAILY_LIMIT - used, 0),
+        "used_pct":    round(100 * used / DAILY_LIMIT, 1) if DAILY_LIMIT else None,
+        "bucket":      {"tokens": round(tokens, 1), "capacity": BUDGET_BURST},
+        "by_priority": by_priority,
+        "throttled":   [p for p in (MARKET, ACCOUNT, ORDER) if used >= DAILY_LIMIT * _DAY_SHARE[p]],
+    }
+
+
+def budget_room(priority: str) -> int | None:
+    """Calls left today before `priority` is refused, or None if the budget store is unreadable."""
+    usage = budget_usage()
+    if "used" not in usage:
+        return None
+    return max(int(DAILY_LIMIT * _DAY_SHARE[priority]) - usage["used"], 0)
+
+
+# ─── Requests ─────────────────────────────────────────────────────────────────
+
+def request(method: str, url: str, *, timeout=None, retries: int | None = None,
+            priority: str | None = None, **kwargs) -> requests.Response:
+    """
+    Send one MetaAPI request on the pooled session for its host, retrying
+    transient failures. Raises requests exceptions like requests.request(),
+    or BudgetExceeded when the call budget refuses it with nothing cached.
+    """
+    method  = method.upper()
+    retries = MAX_RETRIES if retries is None else retries
+    read_timeout, default_priority = _endpoint(url)
+    timeout  = timeout if timeout is not None else (CONNECT_TIMEOUT, read_timeout)
+    priority = priority or default_priority
+    kwargs["headers"] = {**headers(), **(kwargs.get("headers") or {})}
+    idempotent = method in _IDEMPOTENT
+    session = _session(url)
+    key = _fallback_key(url, kwargs)
+
+    attempt, resp = 0, None
+    while True:
+        if not _spend(priority):
+            if resp is not None:        # out of budget mid-retry — hand back what we got
+                return resp
+            return _degrade(key, priority, method, url)
+        try:
+            resp = session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if not idempotent or attempt >= retries:
+                raise
+            delay = _backoff(attempt)
+            logger.warning("MetaAPI %s %s failed (%s) — retry %d in %.2fs",
+                           method, urlsplit(url).path, e.__class__.__name__, attempt + 1, delay)
+        else:
+            if resp.ok and method == "GET":
+                _remember(key, resp)
+            retryable = resp.status_code == 429 or (idempotent and resp.status_code in _RETRY_STATUS)
+            if not retryable or attempt >= retries:
+                return resp
+            delay = _backoff(attempt, resp)
+            logger.warning("MetaAPI %s %s → %d — retry %d in %.2fs",
+                           method, urlsplit(url).path, resp.status_code, attempt + 1, delay)
+        attempt += 1
+        time.sleep(delay)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def put(url: str, **kwargs) -> requests.Response:
+    return request("PUT", url, **kwargs)
+
+
+def delete(url: str, **kwargs) -> requests.Response:
+    return request("DELETE", url, **kwargs)
+
+
+# ─── Account-information cache ────────────────────────────────────────────────
+# Balances are read by the dashboard poll, the wallet endpoints, /bot/signal
+# and the scheduler. Within BALANCE_TTL seconds they all get the same answer;
+# concurrent misses for one account share a single in-flight request. Callers
+# that prefer speed over freshness (stale_ok=True — the dashboard) get an
+# entry up to BALANCE_STALE seconds old immediately while it is refreshed in
+# the background. Failures are not cached.
+
+BALANCE_TTL   = float(os.getenv("METAAPI_BALANCE_TTL", "15"))     # seconds an answer counts as fresh
+BALANCE_STALE = float(os.getenv("METAAPI_BALANCE_STALE", "300"))  # max age served while revalidating
+
+_balances: dict[tuple, tuple] = {}          # (region, account_id) → (fetched_at, balance dict)
+_balance_flights: dict[tuple, Future] = {}
+_balance_lock = threading.Lock()
+
+
+def _balance_key(account) -> tuple:
+    return account.region, account.account_id
+
+
+def _load_balance(key: tuple, url: str, future: Future) -> None:
+    """Fetch one account-information and resolve everyone waiting on it."""
+    data = None
+    try:
+        resp = get(url)
+        if resp.ok:
+            raw  = resp.json()
+            data = {
+                "balance":     raw.get("balance"),
+                "equity":      raw.get("equity"),
+                "currency":    raw.get("currency", "USD"),
+                "margin":      raw.get("margin"),
+                "free_margin": raw.get("freeMargin"),
+            }
+    except Exception as e:
+        logger.debug("account-information %s failed: %s", key[1], e)
+    with _balance_lock:
+        if data is not None:
+            _balances[key] = (time.time(), data)
+        _balance_flights.pop(key, None)
+    future.set_result(data)
+
+
+def account_balance(account, stale_ok: bool = False) -> dict | None:
+    """
+    {"balance", "equity", "currency", "margin", "free_margin"} for a connected
+    MetaApiAccount, or None if MetaAPI could not be reached.
+    """
+    key, url = _balance_key(account), account_url(account, "/account-information")
+    with _balance_lock:
+        cached = _balances.get(key)
+        age    = time.time() - cached[0] if cached else None
+        if cached and age < BALANCE_TTL:
+            return cached[1]
+        future = _balance_flights.get(key)
+        leader = future is None
+        if leader:
+            future = _balance_flights[key] = Future()
+
+    if cached and stale_ok and age < BALANCE_STALE:
+        if leader:
+            threading.Thread(target=_load_balance, args=(key, url, future),
+                             name="balance-refresh", daemon=True).start()
+        return cached[1]
+
+    if leader:
+        _load_balance(key, url, future)
+    data = future.result()
+    if data is None and stale_ok and cached:
+        return cached[1]            # stale-if-error: an old balance beats a blank card
+    return data
+
+
+def last_balance(account, max_age: float) -> tuple | None:
+    """(age in seconds, balance dict) of the last good lookup in this process, if younger than max_age."""
+    with _balance_lock:
+        cached = _balances.get(_balance_key(account))
+    if cached is None or time.time() - cached[0] > max_age:
+        return None
+    return time.time() - cached[0], cached[1]
+
+
+def invalidate_balance(account) -> None:
+    """Drop the cached balance (e.g. after an order changed margin)."""
+    with _balance_lock:
+        _balances.pop(_balance_key(account), None)
@@ -1,17 +1,37 @@
 """
-Replaces the manual grid-search loop with backtesting.py's built-in optimizer.
-Runs each strategy's parameter space in the background and saves ranked results.
+Grid-searches each risk level's strategy parameters in the background and
+saves the best combination per level.
+
+All three levels' combinations go onto one process pool (OPTIMIZER_WORKERS,
+default: every core). The history is shared with the workers through a
+read-only memmap, V4 Ghost trials use the vectorized simulator, and progress
+is counted per evaluated combination.
+
+The search strategy is pluggable (see SEARCHES): the fixed grid, random
+sampling, TPE, or successive halving over short recent windows first.
+Walk-forward mode optimizes rolling train windows and reports the stitched
+out-of-sample equity of each fold's winner on the window that follows.
 
 Usage (from routes.py):
-    run_optimization_async(balance=100_000, start_date="2020-01-01")
-    get_status()    → {"running": bool, "progress": "X/3", ...}
+    run_optimization_async(balance=100_000, start_date="2020-01-01", search="halving")
+    run_walk_forward_async(balance=100_000, start_date="2020-01-01", folds=5, train=3)
+    get_status()    → {"running": bool, "progress": "X/N", "evaluated": X, "total": N, ...}
     get_results()   → saved JSON from last run
 """
 
+import hashlib
+import itertools
 import json
 import logging
+import multiprocessing
 import os
+import random
+import sqlite3
+import tempfile
 import threading
+import time
+from contextlib import closing
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, as_completed
 from datetime import datetime
 
 import numpy as np
@@ -20,22 +40,134 @@ logger = logging.getLogger(__name__)
 
 _HERE        = os.path.dirname(os.path.abspath(__file__))
 RESULTS_FILE = os.path.join(_HERE, "data", "optimizer_results.json")
+TRIALS_DB    = os.path.join(_HERE, "data", "optimizer_trials.db")
+
+try:
+    import fcntl
+except ImportError:   # Windows dev boxes — single-flight then only holds per process
+    fcntl = None
+
+# ─── Run registry ─────────────────────────────────────────────────────────────
+# One optimization at a time across every gunicorn worker. The run holds an
+# exclusive flock on RUN_LOCK for its whole lifetime (released by the kernel
+# even if the worker dies), and mirrors _state into STATE_FILE so any worker
+# can answer /optimize/status. A state file that says "running" while the pid
+# it names is gone belongs to a run that died mid-way.
+
+STATE_DIR  = os.path.join(_HERE, "data", ".cache", "optimizer")
+STATE_FILE = os.path.join(STATE_DIR, "state.json")
+RUN_LOCK   = os.path.join(STATE_DIR, "run.lock")
+_FLUSH_EVERY = 1.0   # seconds between progress writes
 
 _state = {
     "running":    False,
-    "progress":   "0/3",
+    "mode":       None,
+    "search":     None,
+    "progress":   "0/0",     # evaluated/total parameter combinations
+    "evaluated":  0,
+    "total":      0,
+    "started_at": None,
     "last_run":   None,
     "error":      None,
+    "pid":        None,
 }
 _state_lock = threading.Lock()
+_run_fd     = None           # lock file held by this process's running optimization
+_last_flush = [0.0]
+
+
+def _write_state(snapshot: dict) -> None:
+    try:
+        os.makedirs(STATE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=STATE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, STATE_FILE)
+    except OSError as e:
+        logger.warning("Could not persist optimizer state: %s", e)
+
+
+def _set_state(flush: bool = True, **fields) -> None:
+    """Update _state; persist now if flush, else at most every _FLUSH_EVERY seconds."""
+    with _state_lock:
+        _state.update(fields)
+        now = time.time()
+        if not flush and now - _last_flush[0] < _FLUSH_EVERY:
+            return
+        _last_flush[0] = now
+        snapshot = dict(_state)
+    _write_state(snapshot)
+
+
+def _acquire_run():
+    """Non-blocking: the lock file object if no optimization runs anywhere, else None."""
+    global _run_fd
+    with _state_lock:
+        if _run_fd is not None:
+            return None
+        os.makedirs(STATE_DIR, exist_ok=True)
+        f = open(RUN_LOCK, "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return None
+        _run_fd = f
+        return f
+
+
+def _release_run() -> None:
+    global _run_fd
+    with _state_lock:
+        f, _run_fd = _run_fd, None
+    if f is not None:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+
+def _owner_alive(pid) -> bool:
+    """
+    Whether the process recorded in STATE_FILE still exists. Status polls
+    must not touch RUN_LOCK: even a brief probe lock would make a concurrent
+    _acquire_run in another worker fail and reject a real start.
+    """
+    if not pid:
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except PermissionError:
+        return True          # alive, owned by another user
+    except (OSError, ValueError):
+        return False
+    return True
 
 
 def get_status() -> dict:
     with _state_lock:
-        return dict(_state)
+        if _run_fd is not None:
+            return dict(_state)
+    try:
+        with open(STATE_FILE) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        with _state_lock:
+            return dict(_state)
+    if state.get("running") and not _owner_alive(state.get("pid")):
+        state.update(running=False, error=state.get("error") or "Interrupted — worker exited mid-run")
+    return state
 
 
-def get_results() -> dict:
+def get_results(top: int | None = None, metric: str = "final_equity", level: str | None = None,
+                fingerprint: str | None = None) -> dict:
+    """
+    Saved JSON from the last run, or — with `top` — the best `top` full-history
+    trials by `metric` straight from the trial store (default: the data the
+    last run used).
+    """
+    if top is not None:
+        return _top_trials(top, metric, level, fingerprint)
     if not os.path.exists(RESULTS_FILE):
         return {"status": "no_results", "message": "Run /api/optimize first"}
     try:
@@ -55,152 +187,908 @@ def _safe(val, default=0.0):
         return default
 
 
-def _format_opt(stats, strategy_name, level, best_params):
+_METRICS = {
+    "return_pct":       "Return [%]",
+    "win_rate":         "Win Rate [%]",
+    "profit_factor":    "Profit Factor",
+    "max_drawdown_pct": "Max. Drawdown [%]",
+    "sharpe_ratio":     "Sharpe Ratio",
+    "trades_count":     "# Trades",
+    "final_equity":     "Equity Final [$]",
+}
+
+
+def _format_opt(metrics, strategy_name, level, best_params):
     return {
         "strategy":         strategy_name,
         "risk_level":       level,
         "best_params":      best_params,
-        "return_pct":       _safe(stats.get("Return [%]")),
-        "win_rate":         _safe(stats.get("Win Rate [%]")),
-        "profit_factor":    _safe(stats.get("Profit Factor")),
-        "max_drawdown_pct": abs(_safe(stats.get("Max. Drawdown [%]"))),
-        "sharpe_ratio":     _safe(stats.get("Sharpe Ratio")),
-        "trades_count":     int(_safe(stats.get("# Trades"))),
-        "final_equity":     _safe(stats.get("Equity Final [$]")),
+        "return_pct":       metrics["return_pct"],
+        "win_rate":         metrics["win_rate"],
+        "profit_factor":    metrics["profit_factor"],
+        "max_drawdown_pct": abs(metrics["max_drawdown_pct"]),
+        "sharpe_ratio":     metrics["sharpe_ratio"],
+        "trades_count":     int(metrics["trades_count"]),
+        "final_equity":     metrics["final_equity"],
     }
 
 
-def _run_optimize(balance, start_date):
-    from backtesting import Backtest
-    from api.backtest_engine import _best_df, _prep_for_bt
-    from api.strategies.v4_ghost import V4GhostStrategy
-    from api.strategies.golden_breakout import GoldenBreakout
+# ─── Search space ─────────────────────────────────────────────────────────────
+# "grid" is the fixed per-level grid the optimizer has always used. The
+# adaptive modes draw from the wider "space" instead; every mode spends about
+# MAX_TRIES full-history trials per level.
+
+MAX_TRIES          = 200
+OPTIMIZER_WORKERS  = int(os.getenv("OPTIMIZER_WORKERS", str(os.cpu_count() or 1)))
+OPTIMIZER_SEARCH   = os.getenv("OPTIMIZER_SEARCH", "grid")
+
+_V4_SPACE = {
+    "lookback_bars": list(range(8, 65, 4)),
+    "atr_sl_mult":   [0.75, 1.0, 1.25, 1.5, 1.75, 2.0, 2.25, 2.5, 2.75, 3.0],
+    "rr_ratio":      [2.0, 2.5, 3.0, 3.5, 4.0, 4.5, 5.0, 5.5, 6.0],
+}
+
+_LEVELS = {
+    "low": {
+        "strategy": "V4GhostStrategy",
+        "name":     "V4 Ghost Protocol — Conservative",
+        "grid": {
+            "lookback_bars": list(range(16, 33, 4)),
+            "atr_sl_mult":   [1.0, 1.5, 2.0],
+            "rr_ratio":      [2.0, 3.0, 4.0],
+            "risk_pct":      [0.005],
+        },
+        "space": {**_V4_SPACE, "risk_pct": [0.005]},
+    },
+    "medium": {
+        "strategy": "V4GhostStrategy",
+        "name":     "V4 Ghost Protocol — Balanced",
+        "grid": {
+            "lookback_bars": list(range(16, 33, 4)),
+            "atr_sl_mult":   [1.0, 1.5, 2.0],
+            "rr_ratio":      [2.0, 3.0, 4.0],
+            "risk_pct":      [0.01],
+        },
+        "space": {**_V4_SPACE, "risk_pct": [0.01]},
+    },
+    "high": {
+        "strategy": "GoldenBreakout",
+        "name":     "Golden Breakout — Fibonacci H1",
+        "grid": {
+            "swing_bars":    [10, 20, 30],
+            "fib_tolerance": [1.0, 1.5, 2.0],
+            "atr_sl_mult":   [1.0, 1.5, 2.0],
+            "rr_ratio":      [2.0, 3.0, 4.0],
+            "risk_pct":      [0.02, 0.03, 0.05],
+        },
+        "space": {
+            "swing_bars":    list(range(5, 61, 5)),
+            "fib_tolerance": [0.5, 1.0, 1.5, 2.0, 2.5, 3.0],
+            "atr_sl_mult":   [0.75, 1.0, 1.25, 1.5, 1.75, 2.0, 2.5, 3.0],
+            "rr_ratio":      [2.0, 2.5, 3.0, 3.5, 4.0, 5.0, 6.0],
+            "risk_pct":      [0.02, 0.03, 0.05],
+        },
+    },
+}
+
+
+def _valid(params: dict) -> bool:
+    return params.get("rr_ratio", 2) >= 2
+
+
+def _combinations(grid: dict, max_tries: int = MAX_TRIES, seed: int = 0) -> list:
+    keys   = list(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+    combos = [c for c in combos if _valid(c)]
+    if len(combos) > max_tries:
+        combos = random.Random(seed).sample(combos, max_tries)
+    return combos
+
+
+def _sample(space: dict, n: int, rng: random.Random, seen: set) -> list:
+    """Up to n distinct valid combinations drawn uniformly, skipping (and adding to) `seen`."""
+    out = []
+    for _ in range(n * 50):
+        if len(out) >= n:
+            break
+        params = {k: rng.choice(v) for k, v in space.items()}
+        key = tuple(params.values())
+        if key in seen or not _valid(params):
+            continue
+        seen.add(key)
+        out.append(params)
+    return out
+
+
+# ─── Search strategies ────────────────────────────────────────────────────────
+# A search proposes trials with ask() → [(params, fraction), ...] and learns
+# from tell(). `fraction` is the share of the history (most recent bars) a
+# trial runs on; only fraction == 1.0 trials can become the level's best.
+# _run_optimize asks every level for a batch, runs them all on the pool,
+# tells the results back, and repeats until every search returns [].
+
+class _Search:
+    def __init__(self, spec: dict, budget: int, seed: int = 0):
+        self.spec   = spec
+        self.budget = budget
+        self.rng    = random.Random(seed)
+        self.best   = None          # (params, metrics) over full-history trials
+        self.total  = budget        # planned trial count, for progress
+
+    def ask(self) -> list:
+        raise NotImplementedError
+
+    def tell(self, params: dict, fraction: float, metrics: dict) -> None:
+        if fraction == 1.0 and (self.best is None
+                                or metrics["final_equity"] > self.best[1]["final_equity"]):
+            self.best = (params, metrics)
+
+
+class GridSearch(_Search):
+    """The level's fixed grid, subsampled to the budget — the original behaviour."""
+
+    def __init__(self, spec, budget, seed=0):
+        super().__init__(spec, budget, seed)
+        self._queue = _combinations(spec["grid"], budget, seed)
+        self.total  = len(self._queue)
+
+    def ask(self):
+        batch, self._queue = [(p, 1.0) for p in self._queue], []
+        return batch
+
+
+class RandomSearch(_Search):
+    """`budget` distinct combinations drawn uniformly from the wide space."""
+
+    def __init__(self, spec, budget, seed=0):
+        super().__init__(spec, budget, seed)
+        self._queue = _sample(spec["space"], budget, self.rng, set())
+        self.total  = len(self._queue)
+
+    def ask(self):
+        batch, self._queue = [(p, 1.0) for p in self._queue], []
+        return batch
+
+
+class TPESearch(_Search):
+    """
+    Tree-structured Parzen estimator over the discrete space. After a random
+    start-up phase, trials are split into the best `gamma` share and the rest;
+    each parameter value gets a smoothed frequency under both, and the next
+    batch is the candidates with the highest good/bad likelihood ratio.
+    """
+
+    gamma       = 0.25
+    n_startup   = 20
+    n_candidates = 64
+
+    def __init__(self, spec, budget, seed=0):
+        super().__init__(spec, budget, seed)
+        self._seen   = set()
+        self._asked  = 0
+        self._trials = []           # (params, score)
+
+    def _batch_size(self) -> int:
+        return max(4, OPTIMIZER_WORKERS)
+
+    def ask(self):
+        n = min(self._batch_size(), self.budget - self._asked)
+        if n <= 0:
+            return []
+        space = self.spec["space"]
+        if len(self._trials) < self.n_startup:
+            batch = _sample(space, n, self.rng, self._seen)
+        else:
+            ranked = sorted(self._trials, key=lambda t: t[1], reverse=True)
+            n_good = max(1, int(len(ranked) * self.gamma))
+            good, bad = ranked[:n_good], ranked[n_good:]
+
+            def density(trials, key, value):
+                hits = sum(1 for p, _ in trials if p[key] == value)
+                return (hits + 1) / (len(trials) + len(space[key]))
+
+            # candidates drawn from the "good" density, ranked by l(x) / g(x)
+            scored = []
+            for _ in range(self.n_candidates * n):
+                params = {}
+                for key, values in space.items():
+                    weights = [density(good, key, v) for v in values]
+                    params[key] = self.rng.choices(values, weights)[0]
+                cand_key = tuple(params.values())
+                if cand_key in self._seen or not _valid(params):
+                    continue
+                ratio = sum(np.log(density(good, k, v)) - np.log(density(bad, k, v))
+                            for k, v in params.items())
+                scored.append((ratio, cand_key, params))
+            batch = []
+            for _, cand_key, params in sorted(scored, key=lambda t: t[0], reverse=True):
+                if len(batch) >= n:
+                    break
+                if cand_key not in self._seen:
+                    self._seen.add(cand_key)
+                    batch.append(params)
+            batch += _sample(space, n - len(batch), self.rng, self._seen)
+        self._asked += n
+        return [(p, 1.0) for p in batch]
+
+    def tell(self, params, fraction, metrics):
+        super().tell(params, fraction, metrics)
+        self._trials.append((params, metrics["return_pct"]))
+
+
+class HalvingSearch(_Search):
+    """
+    Successive halving: many random candidates on the most recent 1/eta² of the
+    history, the best 1/eta promoted to 1/eta of it, and the best of those to
+    the full history. Costs about the same as `budget` full-history trials.
+    """
+
+    eta   = 3
+    rungs = 3
+
+    def __init__(self, spec, budget, seed=0):
+        super().__init__(spec, budget, seed)
+        n0 = int(budget * self.eta ** (self.rungs - 1) / self.rungs)
+        self._candidates = _sample(spec["space"], n0, self.rng, set())
+        self._rung   = 0
+        self._scores = []
+        sizes = [len(self._candidates)]
+        for _ in range(self.rungs - 1):
+            sizes.append(max(1, sizes[-1] // self.eta))
+        self.total = sum(sizes)
+
+    def _fraction(self, rung: int) -> float:
+        return float(self.eta) ** (rung - self.rungs + 1)
+
+    def ask(self):
+        if self._rung >= self.rungs or not self._candidates:
+            return []
+        if self._rung > 0:
+            ranked = sorted(self._scores, key=lambda t: t[1], reverse=True)
+            self._candidates = [p for p, _ in ranked[:max(1, len(self._candidates) // self.eta)]]
+            self._scores = []
+        fraction = self._fraction(self._rung)
+        self._rung += 1
+        return [(p, fraction) for p in self._candidates]
+
+    def tell(self, params, fraction, metrics):
+        super().tell(params, fraction, metrics)
+        self._scores.append((params, metrics["return_pct"]))
+
+
+SEARCHES = {
+    "grid":     GridSearch,
+    "random":   RandomSearch,
+    "tpe":      TPESearch,
+    "halving":  HalvingSearch,
+}
+
+
+# ─── Trial store ──────────────────────────────────────────────────────────────
+# Every evaluated trial lands in SQLite (TRIALS_DB) as soon as it finishes,
+# keyed by a content hash of the history it ran on plus the balance, strategy,
+# params and bar window. Runs look trials up there before evaluating them, so
+# a rerun — or a restart after a crash/redeploy — only computes what's missing.
+# Searches are seeded, so a resumed TPE/halving run asks the same questions
+# and gets its earlier answers back for free.
+
+_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    fingerprint      TEXT    NOT NULL,
+    balance          REAL    NOT NULL,
+    strategy         TEXT    NOT NULL,
+    params           TEXT    NOT NULL,
+    lo               INTEGER NOT NULL,
+    hi               INTEGER NOT NULL,
+    fraction         REAL    NOT NULL,
+    finalize         INTEGER NOT NULL,
+    level            TEXT    NOT NULL,
+    full_history     INTEGER NOT NULL,
+    return_pct       REAL,
+    win_rate         REAL,
+    profit_factor    REAL,
+    max_drawdown_pct REAL,
+    sharpe_ratio     REAL,
+    trades_count     REAL,
+    final_equity     REAL,
+    created_at       TEXT    NOT NULL,
+    PRIMARY KEY (fingerprint, balance, strategy, params, lo, hi, fraction, finalize)
+);
+CREATE INDEX IF NOT EXISTS trials_by_run ON trials (fingerprint, full_history, level);
+"""
+
+
+_store_ready = set()   # TRIALS_DB paths whose schema this process has created
+
+
+def _connect(check_same_thread: bool = True) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(TRIALS_DB), exist_ok=True)
+    conn = sqlite3.connect(TRIALS_DB, timeout=30, check_same_thread=check_same_thread)
+    if TRIALS_DB not in _store_ready:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_STORE_SCHEMA)
+        _store_ready.add(TRIALS_DB)
+    return conn
+
+
+def _history_fingerprint(df, timeframe: str) -> str:
+    """Content hash of the bars a run optimizes on — stable across redeploys, unlike mtimes."""
+    h = hashlib.blake2b(timeframe.encode(), digest_size=16)
+    h.update(np.ascontiguousarray(df.index.asi8).view(np.uint8))
+    for col in ("Open", "High", "Low", "Close"):
+        h.update(np.ascontiguousarray(df[col].to_numpy(dtype="f8")).view(np.uint8))
+    return h.hexdigest()
+
+
+def _trial_key(task: dict) -> tuple:
+    return (task["strategy"], json.dumps(task["params"], sort_keys=True), task["lo"], task["hi"],
+            float(task["fraction"]), int(task["finalize"]))
+
+
+class _TrialStore:
+    """
+    Trials already evaluated on one history/balance, plus write-through for new
+    ones over a single connection held for the run (use as a context manager).
+    """
+
+    def __init__(self, fingerprint: str, balance: float, bars: int):
+        self.fingerprint = fingerprint
+        self.balance     = float(balance)
+        self.bars        = bars
+        self.known: dict = {}
+        self.conn        = None
+        self._lock       = threading.Lock()
+        try:
+            # results may be recorded from the pool's callback thread, not the one that opened it
+            self.conn = _connect(check_same_thread=False)
+            with self.conn:
+                rows = self.conn.execute(
+                    "SELECT strategy, params, lo, hi, fraction, finalize, " + ", ".join(_METRICS) +
+                    " FROM trials WHERE fingerprint = ? AND balance = ?",
+                    (fingerprint, self.balance),
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning("Trial store unavailable (%s) — evaluating everything", e)
+            rows = []
+        for row in rows:
+            self.known[tuple(row[:6])] = dict(zip(_METRICS, (_safe(v) for v in row[6:])))
+
+    def get(self, task: dict) -> dict | None:
+        return self.known.get(_trial_key(task))
+
+    def add(self, task: dict, metrics: dict) -> None:
+        key = _trial_key(task)
+        self.known[key] = metrics
+        full = int(task["lo"] == 0 and task["hi"] == self.bars and task["fraction"] == 1.0)
+        level = task["key"][0] if isinstance(task["key"], tuple) else task["key"]
+        if self.conn is None:
+            return
+        try:
+            with self._lock, self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO trials VALUES (" + ", ".join("?" * 18) + ")",
+                    (self.fingerprint, self.balance, *key, level, full,
+                     *(metrics[k] for k in _METRICS), datetime.utcnow().isoformat()),
+                )
+        except sqlite3.Error as e:
+            logger.warning("Could not store optimizer trial: %s", e)
+
+    def close(self) -> None:
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _top_trials(top: int, metric: str, level: str | None, fingerprint: str | None) -> dict:
+    if metric not in _METRICS:
+        return {"status": "error", "error": f"Unknown metric '{metric}'. Use: {', '.join(_METRICS)}"}
+    if fingerprint is None:
+        last = get_results()
+        fingerprint = last.get("fingerprint")
+        if not fingerprint:
+            return {"status": "no_results", "message": "Run /api/optimize first"}
+
+    sql  = ("SELECT level, strategy, params, balance, " + ", ".join(_METRICS) +
+            " FROM trials WHERE fingerprint = ? AND full_history = 1 AND finalize = 0")
+    args = [fingerprint]
+    if level:
+        sql += " AND level = ?"
+        args.append(level)
+    # max_drawdown_pct is stored as backtesting reports it (negative), so
+    # descending order ranks the shallowest drawdown first like every other metric.
+    sql += f" ORDER BY {metric} DESC LIMIT ?"
+    args.append(max(1, int(top)))
+    try:
+        with closing(_connect()) as conn, conn:
+            rows = conn.execute(sql, args).fetchall()
+    except sqlite3.Error as e:
+        return {"status": "error", "error": str(e)}
+
+    trials = []
+    for lvl, strategy, params, balance, *values in rows:
+        metrics = dict(zip(_METRICS, (_safe(v) for v in values)))
+        trials.append({
+            "risk_level": lvl,
+            "strategy":   strategy,
+            "params":     json.loads(params),
+            "balance":    balance,
+            **metrics,
+            "max_drawdown_pct": abs(metrics["max_drawdown_pct"]),
+            "trades_count":     int(metrics["trades_count"]),
+        })
+    return {"status": "ok", "fingerprint": fingerprint, "metric": metric, "level": level,
+            "trials": trials}
+
+
+# ─── Workers ──────────────────────────────────────────────────────────────────
+# The history is written once as a (5, n) float64 .npy plus its int64
+# timestamps; each worker maps the prices read-only and wraps them in a frame
+# without copying, so every worker reads the same page-cache pages and only
+# small task dicts cross the pipe. Only the UTC index (8 bytes per bar) is
+# rebuilt per worker — pandas cannot wrap a tz-aware index around a memmap.
+#
+# Workers come from a forkserver (spawn where there is none), never from a
+# plain fork of the web worker: that process runs scheduler, job and price
+# threads, and a forked child could inherit a lock one of them held (logging,
+# sqlite) or the scheduler's leader flock.
+# A task runs one parameter set on bars [lo, hi) of that history:
+#   {"key", "strategy", "params", "fraction", "lo", "hi", "finalize", "curve"}
+# fraction < 1 narrows it to the most recent share of [lo, hi).
+
+_MIN_WINDOW_BARS = 500
+_MP_CONTEXT = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+_worker: dict = {}
+
+
+def _init_worker(data_path: str, balance: float) -> None:
+    import pandas as pd
+    from api.backtest_engine import _BT_COLS
+    from api.strategies.indicator_cache import enable_indicator_cache
+
+    enable_indicator_cache()
+    block = np.load(data_path, mmap_mode="r")                                # (5, n) float64, shared
+    ts    = np.load(data_path.replace(".npy", "-ts.npy"))
+    index = pd.DatetimeIndex(pd.to_datetime(ts, unit="ns", utc=True), name="datetime")
+    _worker["df"]      = pd.DataFrame(block.T, index=index, columns=list(_BT_COLS), copy=False)
+    _worker["balance"] = balance
+    _worker["windows"] = {}
+
+
+def _window(lo: int, hi: int):
+    """Frame for bars [lo, hi), memoized for the worker's lifetime."""
+    windows = _worker.setdefault("windows", {})
+    df = windows.get((lo, hi))
+    if df is None:
+        if len(windows) >= 64:
+            windows.clear()
+        df = windows[(lo, hi)] = _worker["df"].iloc[lo:hi]
+    return df
+
+
+def _evaluate(task: dict) -> tuple:
+    """Run one task; returns (task, metrics, curve) — curve only if task["curve"]."""
+    balance = _worker["balance"]
+    lo, hi  = task["lo"], task["hi"]
+    if task["fraction"] < 1.0:
+        lo = max(lo, hi - max(int((hi - lo) * task["fraction"]), _MIN_WINDOW_BARS))
+    df     = _window(lo, hi)
+    params = task["params"]
+    # Indicators (_atr, _ema, _rsi) are memoized per pool worker by indicator_cache,
+    # so trials on the same window only pay for them once per period.
+    if task["strategy"] == "V4GhostStrategy":
+        from api.strategies.v4_ghost import v4_ghost_fast_stats
+        stats = v4_ghost_fast_stats(df, cash=balance, commission=0.0002, margin=1/50,
+                                    finalize_trades=task["finalize"], **params)
+    else:
+        from backtesting import Backtest
+        from api.strategies.golden_breakout import GoldenBreakout
+        bt    = Backtest(df, GoldenBreakout, cash=balance, commission=0.0002,
+                         exclusive_orders=True, margin=1/50, finalize_trades=task["finalize"])
+        stats = bt.run(**params)
+
+    metrics = {k: _safe(stats.get(v)) for k, v in _METRICS.items()}
+    curve = None
+    if task["curve"]:
+        curve = {
+            "equity":  stats["_equity_curve"]["Equity"].to_numpy() / balance,
+            "returns": stats["_trades"]["ReturnPct"].to_numpy(),
+        }
+    return task, metrics, curve
+
+
+def _task(key, strategy: str, params: dict, lo: int, hi: int, fraction: float = 1.0,
+          finalize: bool = False, curve: bool = False) -> dict:
+    return {"key": key, "strategy": strategy, "params": params, "fraction": fraction,
+            "lo": lo, "hi": hi, "finalize": finalize, "curve": curve}
+
+
+class _TrialPool:
+    """
+    Process pool plus the memmapped history it reads, kept alive across the
+    batches of one optimization run. run() falls back to evaluating in-process
+    when there is one worker or the pool can't start / breaks.
+    """
+
+    def __init__(self, df, balance: float, workers: int | None = None, store: _TrialStore | None = None):
+        self.df        = df
+        self.balance   = balance
+        self.workers   = OPTIMIZER_WORKERS if workers is None else workers
+        self.store     = store
+        self.reused    = 0
+        self.data_path = None
+        self.executor  = None
+
+    def __enter__(self):
+        from api.backtest_engine import CACHE_DIR, _BT_COLS
+
+        if self.workers > 1:
+            folder = os.path.join(CACHE_DIR, "optimizer")
+            os.makedirs(folder, exist_ok=True)
+            self.data_path = os.path.join(folder, f"data-{os.getpid()}-{threading.get_ident()}.npy")
+            np.save(self.data_path, self.df[list(_BT_COLS)].to_numpy(dtype="f8").T)
+            np.save(self.data_path.replace(".npy", "-ts.npy"), self.df.index.as_unit("ns").asi8)
+            try:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                    initargs=(self.data_path, self.balance),
+                                                    mp_context=multiprocessing.get_context(_MP_CONTEXT))
+            except (OSError, ValueError) as e:
+                logger.warning("Optimizer process pool failed (%s) — running in-process", e)
+        return self
+
+    def __exit__(self, *exc):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.data_path:
+            for path in (self.data_path, self.data_path.replace(".npy", "-ts.npy")):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        _worker.clear()
+
+    def run(self, tasks: list, on_result) -> None:
+        """Evaluate tasks, calling on_result(task, metrics, curve) as each finishes."""
+        if self.store is not None:
+            user_result = on_result
+            fresh = []
+            for task in tasks:
+                metrics = None if task["curve"] else self.store.get(task)
+                if metrics is None:
+                    fresh.append(task)
+                else:
+                    self.reused += 1
+                    user_result(task, metrics, None)
+            tasks = fresh
+
+            def on_result(task, metrics, curve):
+                self.store.add(task, metrics)
+                user_result(task, metrics, curve)
+
+        # Event-loop trials (Golden Breakout) cost ~100x a vectorized V4 Ghost
+        # trial, so they go first and the pool doesn't end on a straggler.
+        pending = sorted(tasks, key=lambda t: t["strategy"] == "V4GhostStrategy")
+        if self.executor is not None and len(tasks) > 1:
+            try:
+                futures = {self.executor.submit(_evaluate, task): task for task in pending}
+                for fut in as_completed(futures):
+                    task = futures[fut]
+                    try:
+                        result = fut.result()
+                    except BrokenExecutor:
+                        raise
+                    except Exception as e:
+                        logger.warning("Optimizer trial %s failed: %s", task["params"], e)
+                    else:
+                        on_result(*result)
+                    pending.remove(task)
+                return
+            except BrokenExecutor as e:
+                logger.warning("Optimizer process pool failed (%s) — finishing in-process", e)
+                self.executor = None
+
+        if _worker.get("df") is not self.df:
+            _worker.update(df=self.df, balance=self.balance, windows={})
+        for task in pending:
+            try:
+                result = _evaluate(task)
+            except Exception as e:
+                logger.warning("Optimizer trial %s failed: %s", task["params"], e)
+            else:
+                on_result(*result)
+
+
+def _search(pool: _TrialPool, searches: dict, on_trial=None) -> None:
+    """
+    Drive several searches to completion on one pool. `searches` maps a key to
+    (search, strategy, lo, hi); each round asks every search for its next
+    batch, runs them together and tells the results back.
+    """
+    def on_result(task, metrics, _curve):
+        searches[task["key"]][0].tell(task["params"], task["fraction"], metrics)
+        if on_trial:
+            on_trial()
+
+    while True:
+        tasks = [_task(key, strategy, params, lo, hi, fraction)
+                 for key, (search, strategy, lo, hi) in searches.items()
+                 for params, fraction in search.ask()]
+        if not tasks:
+            break
+        pool.run(tasks, on_result)
+
+
+def _load_history(start_date):
+    """_best_df for the optimizer; on failure records the error and returns (None, None)."""
+    from api.backtest_engine import _best_df
+
+    # All levels use M15 or H1 — covers full 2020-2026 range
+    bt_swing, tf_swing = _best_df(start_date, bt=True)
+    if bt_swing is None:
+        _set_state(error="No CSV data found")
+    return bt_swing, tf_swing
+
+
+def _progress(total: int, search: str):
+    """Reset the progress counters; returns the per-trial callback and a counter getter."""
+    done = [0]
+    _set_state(search=search, progress=f"0/{total}", evaluated=0, total=total)
+
+    def tick():
+        done[0] += 1
+        _set_state(flush=done[0] == total, evaluated=done[0], progress=f"{done[0]}/{total}")
+
+    return tick, lambda: done[0]
+
+
+def _save_results(output: dict, errors: list) -> None:
+    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
+    with open(RESULTS_FILE, "w") as f:
+        json.dump(output, f, indent=2)
+
+    _set_state(last_run=datetime.utcnow().isoformat(), error="; ".join(errors) if errors else None)
+
+
+def _run_optimize(balance, start_date, search=None):
+    search = search or OPTIMIZER_SEARCH
+    bt_swing, tf_swing = _load_history(start_date)
+    if bt_swing is None:
+        return
+
+    n = len(bt_swing)
+    searches = {level: (SEARCHES[search](spec, MAX_TRIES), spec["strategy"], 0, n)
+                for level, spec in _LEVELS.items()}
+    total = sum(s.total for s, *_ in searches.values())
+    logger.info("Optimizer (%s) using %s data: %d bars, ~%d trials on %d workers",
+                search, tf_swing, n, total, OPTIMIZER_WORKERS)
+    tick, evaluated = _progress(total, search)
+
+    fingerprint = _history_fingerprint(bt_swing, tf_swing)
+    with _TrialStore(fingerprint, balance, n) as store, _TrialPool(bt_swing, balance, store=store) as pool:
+        _search(pool, searches, tick)
+    logger.info("Optimizer reused %d stored trials", pool.reused)
 
     results = {}
     errors  = []
+    for level, spec in _LEVELS.items():
+        best = searches[level][0].best
+        if best is not None:
+            results[level] = _format_opt(best[1], spec["name"], level, best[0])
+        else:
+            errors.append(f"{level}: no successful trials")
 
-    # All levels use M15 or H1 — covers full 2020-2026 range
-    df_swing, tf_swing = _best_df(start_date)
-    if df_swing is None:
-        with _state_lock:
-            _state["running"] = False
-            _state["error"]   = "No CSV data found"
+    _save_results({
+        "status":     "ok",
+        "mode":       "optimize",
+        "timestamp":  datetime.utcnow().isoformat(),
+        "data_tf":    tf_swing,
+        "start_date": start_date,
+        "search":     search,
+        "fingerprint": fingerprint,
+        "evaluated":  evaluated(),
+        "reused":     pool.reused,
+        "results":    results,
+        "errors":     errors,
+    }, errors)
+
+
+# ─── Walk-forward ─────────────────────────────────────────────────────────────
+# The history is cut into `folds` rolling windows: each fold trains on
+# `train` test-lengths of bars and is scored on the test-length that follows.
+# Every (level, fold) search shares the pool, so train windows optimize in
+# parallel; each fold's winner then runs once on its test window and the
+# test-window equity curves are chained (compounded) into one out-of-sample
+# curve per level.
+
+WALK_FORWARD_FOLDS  = int(os.getenv("WALK_FORWARD_FOLDS", "5"))
+WALK_FORWARD_TRAIN  = int(os.getenv("WALK_FORWARD_TRAIN", "3"))
+_MIN_TEST_BARS      = 100
+_CURVE_POINTS       = 2000     # stitched curve is thinned to this many points in the JSON
+
+
+def _walk_forward_windows(n: int, folds: int, train: int) -> list:
+    """[((train_lo, train_hi), (test_lo, test_hi)), ...]; the last test window runs to n."""
+    step = n // (folds + train)
+    if folds < 1 or train < 1 or step < _MIN_TEST_BARS:
+        return []
+    windows = []
+    for i in range(folds):
+        lo, mid = i * step, (i + train) * step
+        hi = n if i == folds - 1 else mid + step
+        windows.append(((lo, mid), (mid, hi)))
+    return windows
+
+
+def _thin(index, values) -> dict:
+    keep = np.unique(np.r_[np.linspace(0, len(values) - 1, min(len(values), _CURVE_POINTS)).astype(int)])
+    return {
+        "time":   [index[i].isoformat() for i in keep],
+        "equity": [float(values[i]) for i in keep],
+    }
+
+
+def _run_walk_forward(balance, start_date, search=None, folds=None, train=None):
+    search = search or OPTIMIZER_SEARCH
+    folds  = WALK_FORWARD_FOLDS if folds is None else folds
+    train  = WALK_FORWARD_TRAIN if train is None else train
+    bt_swing, tf_swing = _load_history(start_date)
+    if bt_swing is None:
         return
 
-    bt_swing = _prep_for_bt(df_swing)
-    logger.info("Optimizer using %s data: %d bars", tf_swing, len(bt_swing))
+    n       = len(bt_swing)
+    windows = _walk_forward_windows(n, folds, train)
+    if not windows:
+        _set_state(error=f"Not enough history for {folds} folds ({n} bars)")
+        return
 
-    with _state_lock:
-        _state["progress"] = "1/3 — V4 Ghost (Low)"
-    try:
-        bt  = Backtest(bt_swing, V4GhostStrategy, cash=balance, commission=0.0002,
-                       exclusive_orders=True, margin=1/50)
-        opt = bt.optimize(
-            lookback_bars = range(16, 33, 4),
-            atr_sl_mult   = [1.0, 1.5, 2.0],
-            rr_ratio      = [2.0, 3.0, 4.0],
-            risk_pct      = [0.005],
-            maximize      = "Equity Final [$]",
-            constraint    = lambda p: p.rr_ratio >= 2,
-            max_tries     = 200,
-        )
-        best_params = {
-            "lookback_bars": int(opt._strategy.lookback_bars),
-            "atr_sl_mult":   float(opt._strategy.atr_sl_mult),
-            "rr_ratio":      float(opt._strategy.rr_ratio),
-            "risk_pct":      0.005,
-        }
-        results["low"] = _format_opt(opt, "V4 Ghost Protocol — Conservative", "low", best_params)
-    except Exception as e:
-        logger.exception("Low opt failed")
-        errors.append("low: " + str(e))
+    searches = {(level, i): (SEARCHES[search](spec, MAX_TRIES), spec["strategy"], *train_win)
+                for level, spec in _LEVELS.items()
+                for i, (train_win, _) in enumerate(windows)}
+    total = sum(s.total for s, *_ in searches.values()) + len(searches)
+    logger.info("Walk-forward (%s, %d folds) using %s data: %d bars, ~%d trials on %d workers",
+                search, folds, tf_swing, n, total, OPTIMIZER_WORKERS)
+    tick, evaluated = _progress(total, search)
 
-    with _state_lock:
-        _state["progress"] = "2/3 — V4 Ghost (Medium)"
-    try:
-        bt  = Backtest(bt_swing, V4GhostStrategy, cash=balance, commission=0.0002,
-                       exclusive_orders=True, margin=1/50)
-        opt = bt.optimize(
-            lookback_bars = range(16, 33, 4),
-            atr_sl_mult   = [1.0, 1.5, 2.0],
-            rr_ratio      = [2.0, 3.0, 4.0],
-            risk_pct      = [0.01],
-            maximize      = "Equity Final [$]",
-            constraint    = lambda p: p.rr_ratio >= 2,
-            max_tries     = 200,
-        )
-        best_params = {
-            "lookback_bars": int(opt._strategy.lookback_bars),
-            "atr_sl_mult":   float(opt._strategy.atr_sl_mult),
-            "rr_ratio":      float(opt._strategy.rr_ratio),
-            "risk_pct":      0.01,
-        }
-        results["medium"] = _format_opt(opt, "V4 Ghost Protocol — Balanced", "medium", best_params)
-    except Exception as e:
-        logger.exception("Medium opt failed")
-        errors.append("medium: " + str(e))
+    fingerprint = _history_fingerprint(bt_swing, tf_swing)
+    oos = {}
+    with _TrialStore(fingerprint, balance, n) as store, _TrialPool(bt_swing, balance, store=store) as pool:
+        _search(pool, searches, tick)
 
-    with _state_lock:
-        _state["progress"] = "3/3 — Golden Breakout (High)"
-    try:
-        bt  = Backtest(bt_swing, GoldenBreakout, cash=balance, commission=0.0002,
-                       exclusive_orders=True, margin=1/50)
-        opt = bt.optimize(
-            swing_bars    = [10, 20, 30],
-            fib_tolerance = [1.0, 1.5, 2.0],
-            atr_sl_mult   = [1.0, 1.5, 2.0],
-            rr_ratio      = [2.0, 3.0, 4.0],
-            risk_pct      = [0.02, 0.03, 0.05],
-            maximize      = "Equity Final [$]",
-            constraint    = lambda p: p.rr_ratio >= 2,
-            max_tries     = 200,
-        )
-        best_params = {
-            "swing_bars":    int(opt._strategy.swing_bars),
-            "fib_tolerance": float(opt._strategy.fib_tolerance),
-            "atr_sl_mult":   float(opt._strategy.atr_sl_mult),
-            "rr_ratio":      float(opt._strategy.rr_ratio),
-            "risk_pct":      float(opt._strategy.risk_pct),
+        def on_test(task, metrics, curve):
+            oos[task["key"]] = (metrics, curve)
+            tick()
+
+        pool.run([_task(key, strategy, s.best[0], *windows[key[1]][1], finalize=True, curve=True)
+                  for key, (s, strategy, *_) in searches.items() if s.best is not None],
+                 on_test)
+
+    results = {}
+    errors  = []
+    fold_rows = [{
+        "fold":  i,
+        "train": {"start": bt_swing.index[tr[0]].isoformat(), "end": bt_swing.index[tr[1] - 1].isoformat()},
+        "test":  {"start": bt_swing.index[te[0]].isoformat(), "end": bt_swing.index[te[1] - 1].isoformat()},
+        "levels": {},
+    } for i, (tr, te) in enumerate(windows)]
+
+    for level, spec in _LEVELS.items():
+        capital  = float(balance)
+        stitched = []
+        returns  = []
+        for i, (_, (lo, hi)) in enumerate(windows):
+            best = searches[(level, i)][0].best
+            if (level, i) not in oos:
+                errors.append(f"{level} fold {i}: no out-of-sample result")
+                stitched.append(np.full(hi - lo, capital))
+                continue
+            metrics, curve = oos[(level, i)]
+            stitched.append(capital * curve["equity"])
+            capital = float(stitched[-1][-1])
+            returns.append(curve["returns"])
+            fold_rows[i]["levels"][level] = {
+                "best_params": best[0],
+                "in_sample":   {"return_pct": best[1]["return_pct"],
+                                "trades_count": int(best[1]["trades_count"])},
+                "out_of_sample": {"return_pct": metrics["return_pct"],
+                                  "trades_count": int(metrics["trades_count"]),
+                                  "max_drawdown_pct": abs(metrics["max_drawdown_pct"])},
+            }
+
+        equity  = np.concatenate(stitched)
+        trades  = np.concatenate(returns) if returns else np.empty(0)
+        peak    = np.maximum.accumulate(equity)
+        losses  = abs(trades[trades < 0].sum())
+        last    = next((fold_rows[i]["levels"][level]["best_params"]
+                        for i in reversed(range(len(windows))) if level in fold_rows[i]["levels"]), None)
+        test_lo = windows[0][1][0]
+        results[level] = {
+            "strategy":         spec["name"],
+            "risk_level":       level,
+            "best_params":      last,     # latest fold's winner — what would trade next
+            "return_pct":       (capital / balance - 1) * 100,
+            "win_rate":         float((trades > 0).mean() * 100) if len(trades) else 0.0,
+            "profit_factor":    float(trades[trades > 0].sum() / losses) if losses else 0.0,
+            "max_drawdown_pct": float((1 - equity / peak).max() * 100),
+            "trades_count":     int(len(trades)),
+            "final_equity":     capital,
+            "oos_equity":       _thin(bt_swing.index[test_lo:], equity),
         }
-        results["high"] = _format_opt(opt, "Golden Breakout — Fibonacci H1", "high", best_params)
-    except Exception as e:
-        logger.exception("High opt failed")
-        errors.append("high: " + str(e))
 
-    output = {
+    _save_results({
         "status":     "ok",
+        "mode":       "walk_forward",
         "timestamp":  datetime.utcnow().isoformat(),
         "data_tf":    tf_swing,
         "start_date": start_date,
+        "search":     search,
+        "folds":      folds,
+        "train":      train,
+        "fingerprint": fingerprint,
+        "evaluated":  evaluated(),
+        "reused":     pool.reused,
+        "windows":    fold_rows,
         "results":    results,
         "errors":     errors,
-    }
-    os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
-    with open(RESULTS_FILE, "w") as f:
-        json.dump(output, f, indent=2)
+    }, errors)
 
-    with _state_lock:
-        _state["running"]  = False
-        _state["progress"] = "3/3"
-        _state["last_run"] = datetime.utcnow().isoformat()
-        _state["error"]    = "; ".join(errors) if errors else None
 
+def _run_exclusive(target, args: tuple) -> None:
+    """Body of a run that already holds the run lock; always releases it."""
+    try:
+        target(*args)
+    except Exception as e:
+        logger.exception("Optimization failed")
+        _set_state(error=str(e))
+    finally:
+        _set_state(running=False)
+        _release_run()
 
-def run_optimization_async(balance=100_000.0, start_date="2020-01-01"):
-    """Start optimization in background thread. Returns False if already running."""
-    with _state_lock:
-        if _state["running"]:
-            return False
-        _state["running"]  = True
-        _state["progress"] = "0/3"
-        _state["error"]    = None
-
-    t = threading.Thread(target=_run_optimize, args=(balance, start_date), daemon=True)
-    t.start()
+
+def _start(mode: str, search: str | None, target, args: tuple, background: bool) -> bool:
+    search = search or OPTIMIZER_SEARCH
+    if search not in SEARCHES:
+        raise ValueError(f"Unknown search '{search}'. Use: {', '.join(SEARCHES)}")
+    if _acquire_run() is None:
+        return False
+    _set_state(running=True, mode=mode, search=search, progress="0/0", evaluated=0, total=0,
+               started_at=datetime.utcnow().isoformat(), error=None, pid=os.getpid())
+    args = args + (search,)
+    if background:
+        threading.Thread(target=_run_exclusive, args=(target, args), daemon=True).start()
+    else:
+        _run_exclusive(target, args)
     return True
 
 
-def run_full_optimization(balance=100_000.0, start_date="2020-01-01"):
+def run_optimization_async(balance=100_000.0, start_date="2020-01-01", search=None):
+    """
+    Start optimization in background thread. Returns False if one is already
+    running — in this or any other worker process.
+    search is one of SEARCHES ("grid", "random", "tpe", "halving"); default OPTIMIZER_SEARCH.
+    """
+    return _start("optimize", search, _run_optimize, (balance, start_date), background=True)
+
+
+def run_walk_forward_async(balance=100_000.0, start_date="2020-01-01", search=None,
+                           folds=None, train=None):
+    """Start a walk-forward optimization in a background thread. Returns False if one is running."""
+    return _start("walk_forward", search, lambda b, d, s: _run_walk_forward(b, d, s, folds, train),
+                  (balance, start_date), background=True)
+
+
+def run_full_optimization(balance=100_000.0, start_date="2020-01-01", search=None,
+                          walk_forward=False):
     """Synchronous — blocks until complete. Used for CLI testing."""
-    _run_optimize(balance, start_date)
+    if walk_forward:
+        started = _start("walk_forward", search, _run_walk_forward, (balance, start_date), background=False)
+    else:
+        started = _start("optimize", search, _run_optimize, (balance, start_date), background=False)
+    if not started:
+        return {"status": "busy", "message": "Another optimization is already running"}
     return get_results()
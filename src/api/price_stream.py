@@ -0,0 +1,303 @@
+"""
+Price stream — one upstream poller per symbol, fanned out to every client.
+
+/market/price/stream is a Server-Sent Events endpoint. Each symbol that has at
+least one listener in this worker gets a single daemon thread polling MetaAPI
+current-price, so N open tabs cost one upstream request per interval instead
+of N. The thread exits once the last listener disconnects.
+
+The interval is not fixed: it is derived from what is left of the day's
+MARKET budget (see metaapi_client), of which the stream may spend at most
+PRICE_STREAM_BUDGET_SHARE, and never drops below PRICE_POLL_MIN seconds.
+Candles and the scheduler keep the rest. The poller publishes only when the
+quote changes and backs off further while it does not, e.g. on weekends.
+
+Every listener owns a bounded queue (PRICE_STREAM_QUEUE entries). A client
+that reads slower than prices arrive never grows it: when the queue is full
+the oldest quote is dropped, so a slow client skips straight to the latest
+price instead of building a backlog. Streams close after
+PRICE_STREAM_MAX_SECONDS; the dashboard then reconnects with a fresh token.
+
+Each open stream pins one gunicorn thread, so a worker serves at most
+PRICE_STREAM_MAX of them, keeping the remaining threads free for the rest of
+the API. Further clients get a single `event: full` frame telling them to
+poll /market/price instead; quote() answers those polls from the same feed,
+so they cost at most one upstream call per PRICE_POLL_MIN per worker however
+many tabs are refused.
+
+EventSource cannot send an Authorization header, so the stream is opened with
+a short-lived, stream-only token from issue_token() in the query string
+instead of the 30-day access token. It is not a JWT and no other endpoint
+accepts it, so what ends up in access logs is useless within a minute.
+
+Usage (from market_controller.py):
+    fetch_price(account, "XAUUSD")   → {"symbol", "bid", "ask", "time"} | {"error"}
+    latest("XAUUSD")                 → last streamed quote, if fresh
+    quote(account, "XAUUSD")         → fresh quote for a polling client
+    issue_token(user_id)             → "…"  (read back with token_user(token))
+    stream("XAUUSD", account)        → iterable of SSE frames, or None when full
+    refused()                        → the SSE body for a client that must poll
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from api import metaapi_client as metaapi
+
+logger = logging.getLogger(__name__)
+
+MIN_POLL       = float(os.getenv("PRICE_POLL_MIN", "60"))              # seconds between upstream calls, at least
+BUDGET_SHARE   = float(os.getenv("PRICE_STREAM_BUDGET_SHARE", "0.25")) # of the remaining MARKET calls
+QUEUE_SIZE     = int(os.getenv("PRICE_STREAM_QUEUE", "16"))            # quotes buffered per client
+STREAM_MAX_AGE = float(os.getenv("PRICE_STREAM_MAX_SECONDS", "300"))   # then the client reconnects
+MAX_STREAMS    = int(os.getenv("PRICE_STREAM_MAX", "3"))               # open streams per worker
+TOKEN_TTL      = int(os.getenv("PRICE_STREAM_TOKEN_TTL", "60"))        # seconds a stream token opens a stream
+KEEPALIVE      = 15.0                                                  # comment frame on idle streams
+_MAX_BACKOFF   = 900.0
+
+# Plain (region, account_id) — ORM objects must not cross into the poller thread
+AccountRef = namedtuple("AccountRef", "region account_id")
+
+
+# ─── Upstream ─────────────────────────────────────────────────────────────────
+
+def fetch_price(account, symbol: str) -> dict:
+    """Current bid/ask from MetaAPI, falling back to the last 1m candle.  1–2 API calls."""
+    try:
+        resp = metaapi.get(metaapi.account_url(account, f"/symbols/{symbol}/current-price"))
+        if resp.ok:
+            data = resp.json()
+            return {"symbol": symbol, "bid": data.get("bid"), "ask": data.get("ask"), "time": data.get("time")}
+        # Fallback: get price from latest candle
+        candle_url = metaapi.account_url(account, f"/historical-market-data/symbols/{symbol}/timeframes/1m/candles")
+        cr = metaapi.get(candle_url, params={"startTime": datetime.now(timezone.utc).isoformat(), "limit": 1},
+                         timeout=(metaapi.CONNECT_TIMEOUT, 10))
+        if cr.ok:
+            candles = cr.json()
+            if candles:
+                price = candles[0].get("close") or candles[0].get("open")
+                return {"symbol": symbol, "bid": price, "ask": price, "time": candles[0].get("time")}
+        return {"error": resp.text[:200]}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def poll_interval() -> float:
+    """Seconds until the next upstream poll, spreading BUDGET_SHARE of today's MARKET room."""
+    room = metaapi.budget_room(metaapi.MARKET)
+    if room is None:
+        return MIN_POLL
+    if room * BUDGET_SHARE < 1:
+        return _MAX_BACKOFF
+    now      = datetime.now(timezone.utc)
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    left     = 86400 - (now - midnight).total_seconds()
+    return min(max(MIN_POLL, left / (room * BUDGET_SHARE)), _MAX_BACKOFF)
+
+
+# ─── Feeds ────────────────────────────────────────────────────────────────────
+
+class _Feed:
+    """One symbol: its listeners, its last quote and the thread polling it."""
+
+    def __init__(self, symbol: str):
+        self.symbol     = symbol
+        self.listeners: dict[queue.Queue, AccountRef] = {}
+        self.latest     = None
+        self.latest_at  = 0.0
+        self.thread     = None
+        self.lock       = threading.Lock()
+        self.fetch_lock = threading.Lock()   # one upstream call for concurrent pollers
+        self._wake      = threading.Event()
+
+    def subscribe(self, account: AccountRef) -> queue.Queue:
+        q = queue.Queue(maxsize=QUEUE_SIZE)
+        with self.lock:
+            self.listeners[q] = account
+            if self.latest is not None:
+                q.put_nowait(self.latest)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name=f"price-{self.symbol}", daemon=True)
+                self.thread.start()
+        return q
+
+    def unsubscribe(self, q: queue.Queue) -> None:
+        with self.lock:
+            self.listeners.pop(q, None)
+            if not self.listeners:
+                self._wake.set()        # let an idle poller exit now, not after its sleep
+
+    def _publish(self, quote: dict) -> None:
+        with self.lock:
+            self.latest, self.latest_at = quote, time.time()
+            targets = list(self.listeners)
+        for q in targets:
+            while True:
+                try:
+                    q.put_nowait(quote)
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()      # slow client: drop its oldest quote
+                    except queue.Empty:
+                        pass
+
+    def _run(self) -> None:
+        delay, last_error = 0.0, None
+        while True:
+            with self.lock:
+                accounts = list(dict.fromkeys(self.listeners.values()))
+                if not accounts:
+                    self.thread = None
+                    return
+            quote = None
+            for account in accounts:                # first listener's wallet, next one if it fails
+                quote = fetch_price(account, self.symbol)
+                if "error" not in quote:
+                    break
+            base = poll_interval()
+            if "error" in quote:
+                if quote["error"] != last_error:
+                    logger.warning("Price feed %s: %s", self.symbol, quote["error"])
+                last_error = quote["error"]
+                delay = min(max(delay, base) * 2, _MAX_BACKOFF)
+            elif self.latest is None or (quote["bid"], quote["ask"], quote["time"]) != (
+                    self.latest["bid"], self.latest["ask"], self.latest["time"]):
+                self._publish(quote)
+                delay, last_error = base, None
+            else:
+                delay = min(max(delay, base) * 1.5, _MAX_BACKOFF)
+            self._wake.wait(delay)
+            self._wake.clear()
+
+
+_feeds: dict[str, _Feed] = {}
+_feeds_lock = threading.Lock()
+
+
+def _feed(symbol: str) -> _Feed:
+    with _feeds_lock:
+        return _feeds.setdefault(symbol, _Feed(symbol))
+
+
+# ─── Public API ───────────────────────────────────────────────────────────────
+
+_open_streams = 0
+_streams_lock = threading.Lock()
+
+
+def latest(symbol: str, max_age: float | None = None) -> dict | None:
+    """The last quote this worker streamed for `symbol`, if younger than max_age."""
+    with _feeds_lock:
+        feed = _feeds.get(symbol)
+    if feed is None or feed.latest is None:
+        return None
+    max_age = MIN_POLL if max_age is None else max_age
+    return feed.latest if time.time() - feed.latest_at <= max_age else None
+
+
+def quote(account, symbol: str) -> dict:
+    """
+    Quote for /market/price: the streamed one while fresh, else one upstream
+    call shared by every poller of `symbol` in this worker and published to
+    its listeners, so refused stream clients stay live at the feed's cost.
+    """
+    fresh = latest(symbol)
+    if fresh is not None:
+        return fresh
+    feed = _feed(symbol)
+    with feed.fetch_lock:
+        fresh = latest(symbol)
+        if fresh is not None:
+            return fresh
+        result = fetch_price(AccountRef(account.region, account.account_id), symbol)
+        if "error" not in result:
+            feed._publish(result)
+        return result
+
+
+def _serializer() -> URLSafeTimedSerializer:
+    return URLSafeTimedSerializer(current_app.config["JWT_SECRET_KEY"], salt="price-stream")
+
+
+def issue_token(user_id: int) -> str:
+    """A token that opens a price stream for `user_id` within TOKEN_TTL seconds — nothing else."""
+    return _serializer().dumps({"uid": int(user_id)})
+
+
+def token_user(token: str) -> int | None:
+    """The user a stream token was issued to, or None if it is forged or expired."""
+    try:
+        return int(_serializer().loads(token or "", max_age=TOKEN_TTL)["uid"])
+    except (BadSignature, KeyError, TypeError, ValueError):
+        return None
+
+
+class _Stream:
+    """
+    The response body of one stream. Holds a slot out of MAX_STREAMS from
+    creation until the server closes it, even if it is never iterated.
+    """
+
+    def __init__(self, feed: _Feed, ref: AccountRef):
+        self._frames = _frames(feed, ref)
+        self._closed = False
+
+    def __iter__(self):
+        return self._frames
+
+    def close(self) -> None:
+        global _open_streams
+        self._frames.close()
+        with _streams_lock:
+            if not self._closed:
+                self._closed = True
+                _open_streams -= 1
+
+
+def stream(symbol: str, account) -> "_Stream | None":
+    """
+    SSE frames for one client until STREAM_MAX_AGE or disconnect; None when
+    this worker already serves MAX_STREAMS. The account is read here, not in
+    the generator, so no request context or DB session has to outlive the view.
+    """
+    global _open_streams
+    with _streams_lock:
+        if _open_streams >= MAX_STREAMS:
+            return None
+        _open_streams += 1
+    return _Stream(_feed(symbol), AccountRef(account.region, account.account_id))
+
+
+def refused() -> str:
+    """
+    Body sent instead of a stream when this worker is full. EventSource cannot
+    read the body of an error response, so it is a normal stream that carries
+    one `full` event with the polling interval and ends.
+    """
+    return f"retry: {int(STREAM_MAX_AGE * 1000)}\nevent: full\ndata: {json.dumps({'poll': MIN_POLL})}\n\n"
+
+
+def _frames(feed: _Feed, ref: AccountRef):
+    q = feed.subscribe(ref)
+    try:
+        yield "retry: 3000\n\n"
+        deadline = time.time() + STREAM_MAX_AGE
+        while time.time() < deadline:
+            try:
+                quote = q.get(timeout=KEEPALIVE)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: price\ndata: {json.dumps(quote)}\n\n"
+    finally:
+        feed.unsubscribe(q)
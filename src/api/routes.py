@@ -3,10 +3,10 @@ from api.models.db import db
 from api.models import User, Strategy # <-- Importamos Strategy
 from api.utils import generate_sitemap, APIException
 from api.controllers import register_controllers
-# Importamos los motores (Backtest y Optimizer)
-from api.backtest_engine import execute_backtest_by_level
-from api.live_engine import evaluate_live_market
-from api.optimizer_engine import run_optimization_async, get_status, get_results
+# The backtest / optimizer / live engines pull in pandas, backtesting, yfinance
+# and ta — they are imported inside the views that need them so app startup
+# (and every gunicorn worker boot) stays light. See `flask startup-benchmark`.
+from api.job_engine import submit_backtest_job, get_job, cancel_job
 
 api = Blueprint('api', __name__)
 
@@ -31,39 +31,124 @@ def get_all_strategies():
 
 @api.route('/backtest/<string:level>', methods=['GET'])
 def run_unified_backtest(level):
+    from api.backtest_engine import execute_backtest_by_level
+
     try:
         balance_param = request.args.get('balance', default=10000.0, type=float)
         start_param = request.args.get('start', default='2026-01-01', type=str)
-        
-        data = execute_backtest_by_level(level, initial_cash=balance_param, start_date=start_param) 
+        refresh = request.args.get('refresh', default=0, type=int) == 1  # ?refresh=1 bypasses the result cache
+
+        data = execute_backtest_by_level(level, initial_cash=balance_param, start_date=start_param,
+                                         use_cache=not refresh)
         return jsonify(data), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@api.route('/backtest/jobs', methods=['POST'])
+def create_backtest_job():
+    """Queue a backtest in the background. Body or query: level, balance, start."""
+    body    = request.get_json(silent=True) or {}
+    level   = body.get('level', request.args.get('level', type=str))
+    balance = body.get('balance', request.args.get('balance', default=10000.0, type=float))
+    start   = body.get('start', request.args.get('start', default='2026-01-01', type=str))
+
+    try:
+        job = submit_backtest_job(level, balance=float(balance), start_date=str(start))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    if job.get("status") == "error":
+        return jsonify(job), 400
+    return jsonify(job), 202
+
+
+@api.route('/backtest/jobs/<string:job_id>', methods=['GET'])
+def backtest_job_status(job_id):
+    """Poll a backtest job: status, progress (0–1) and the result once done."""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+
+@api.route('/backtest/jobs/<string:job_id>', methods=['DELETE'])
+def cancel_backtest_job(job_id):
+    """Cancel a queued or running backtest job."""
+    job = cancel_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+
 @api.route('/optimize', methods=['POST', 'GET'])
 def start_optimization():
     """Launch full grid-search optimization in background."""
+    from api.optimizer_engine import run_optimization_async
+
     balance   = request.args.get('balance', default=100_000.0, type=float)
     start     = request.args.get('start',   default='2024-01-01', type=str)
-    result    = run_optimization_async(balance=balance, start_date=start)
+    search    = request.args.get('search',  default=None, type=str)
+    try:
+        result = run_optimization_async(balance=balance, start_date=start, search=search)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result), 202
+
+
+@api.route('/optimize/walk-forward', methods=['POST', 'GET'])
+def start_walk_forward():
+    """Launch walk-forward optimization (rolling train/test windows) in background."""
+    from api.optimizer_engine import run_walk_forward_async
+
+    balance   = request.args.get('balance', default=100_000.0, type=float)
+    start     = request.args.get('start',   default='2024-01-01', type=str)
+    search    = request.args.get('search',  default=None, type=str)
+    folds     = request.args.get('folds',   default=None, type=int)
+    train     = request.args.get('train',   default=None, type=int)
+    try:
+        result = run_walk_forward_async(balance=balance, start_date=start, search=search,
+                                        folds=folds, train=train)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify(result), 202
 
 
 @api.route('/optimize/status', methods=['GET'])
 def optimization_status():
     """Check if optimization is running and how far it has progressed."""
+    from api.optimizer_engine import get_status
+
     return jsonify(get_status()), 200
 
 
 @api.route('/optimize/results', methods=['GET'])
 def optimization_results():
-    """Return the ranked results from the last completed optimization run."""
-    return jsonify(get_results()), 200
+    """
+    Return the ranked results from the last completed optimization run.
+    ?top=N[&metric=sharpe_ratio&level=low] ranks stored trials instead.
+    """
+    from api.optimizer_engine import get_results
+
+    top    = request.args.get('top',    default=None, type=int)
+    metric = request.args.get('metric', default='final_equity', type=str)
+    level  = request.args.get('level',  default=None, type=str)
+    result = get_results(top=top, metric=metric, level=level)
+    return jsonify(result), 400 if result.get("status") == "error" and top is not None else 200
+
+
+@api.route('/metaapi/usage', methods=['GET'])
+def metaapi_usage():
+    """Today's MetaAPI call budget: calls used / refused / served from cache, per priority."""
+    from api.metaapi_client import budget_usage
+
+    result = budget_usage()
+    return jsonify(result), 500 if result.get("status") == "error" else 200
 
 
 @api.route('/activate-live-bot', methods=['POST'])
 def activate_live_bot():
+    from api.live_engine import evaluate_live_market
+
     body = request.get_json()
     
     if not body or "strategy_id" not in body:
@@ -3,107 +3,310 @@ Background Scheduler — Auto-trading loop for active bots.
 Runs every 15 minutes and evaluates V4 Ghost PDH/PDL signals for all users
 whose bot is active (UserStrategy.is_active=True).
 
-MetaAPI call budget per run: 2 calls per active user (candles + account-info).
-4 users × 2 calls × 96 runs/day = 768 calls/day — within 2000/day limit.
+MetaAPI call budget per run: 1 account-info call per active user, plus one
+shared M15 candle fetch per tick (yfinance first, MetaAPI only as fallback).
+4 users × 1 call × 96 runs/day = 384 calls/day — within 2000/day limit.
+metaapi_client meters every call against that limit; past 90 % of the day
+balance lookups are refused while orders still go through. A bot is then
+sized from the last balance this process saw for its wallet (at most
+SCHEDULER_BALANCE_MAX_AGE old) or, without one, skipped for the tick
+(status NO_BALANCE) — it never trades on a made-up equity. Likewise, if the
+shared candle fetch fails (and its one retry, SCHEDULER_SNAPSHOT_RETRY
+seconds later, fails too) the whole tick is skipped rather than letting
+every bot download candles on its own.
+
+Exactly one process runs the loop. app.py calls init_scheduler() in every
+gunicorn worker (and in one-off commands such as `flask db upgrade`); each
+one competes for an exclusive flock on LEADER_LOCK and only the holder starts
+the scheduler. The others retry every SCHEDULER_LEADER_RETRY seconds, so a
+new leader takes over if the current one exits. With SCHEDULER_MODE=off the
+web processes never schedule and a dedicated `flask run-scheduler` process
+does — use that when the app runs on more than one host.
 """
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 from apscheduler.schedulers.background import BackgroundScheduler
 
+try:
+    import fcntl
+except ImportError:   # Windows dev boxes — every process then leads on its own
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
+_HERE             = os.path.dirname(os.path.abspath(__file__))
+LEADER_LOCK       = os.path.join(_HERE, "data", ".cache", "scheduler.lock")
+SCHEDULER_MODE    = os.getenv("SCHEDULER_MODE", "auto")                 # auto | off
+LEADER_RETRY      = int(os.getenv("SCHEDULER_LEADER_RETRY", "60"))      # seconds
+BALANCE_MAX_AGE   = float(os.getenv("SCHEDULER_BALANCE_MAX_AGE", "3600"))  # seconds a cached balance may size orders
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "8"))            # wallets evaluated concurrently
+SNAPSHOT_RETRY    = float(os.getenv("SCHEDULER_SNAPSHOT_RETRY", "10"))  # seconds before retrying the candle fetch
+
 scheduler = BackgroundScheduler(daemon=True)
 
+_leader_fd   = None
+_leader_lock = threading.Lock()
+_elector     = None
 
-def init_scheduler(app):
-    """Register bot-signal job and start the scheduler."""
-
-    def run_bot_signals():
-        with app.app_context():
-            from api.models.strategies import UserStrategy
-            from api.models.wallet import MetaApiAccount
-            from api.models.trade import Trade
-            from api.models.db import db
-            from api.trade_engine import evaluate_signal, place_order, check_prop_firm_guard
-            from api.controllers.dashboard_controller import _fetch_wallet_balance
-
-            active_strategies = UserStrategy.query.filter_by(is_active=True).all()
-            if not active_strategies:
-                return
-
-            logger.info("Scheduler: evaluating signals for %d active bot(s)", len(active_strategies))
-
-            for us in active_strategies:
-                try:
-                    # Use the strategy's linked wallet if set, else first connected account
-                    if us.wallet_id and us.wallet:
-                        account = us.wallet
-                    else:
-                        account = MetaApiAccount.query.filter_by(
-                            user_id=us.user_id, status="connected"
-                        ).first()
-                    if not account:
-                        continue
 
-                    # Prop firm daily loss guard
-                    if account.is_prop_firm:
-                        guard = check_prop_firm_guard(account)
-                        if guard["blocked"]:
-                            logger.warning(
-                                "Scheduler: prop firm daily loss limit — user=%d %s",
-                                us.user_id, guard["reason"],
-                            )
-                            continue
-
-                    bal    = _fetch_wallet_balance(account)
-                    equity = bal.get("equity") or bal.get("balance") or 5_000.0
-
-                    signal = evaluate_signal(account, us.strategy.risk_level, equity)
-                    if signal["status"] != "SIGNAL_FOUND":
-                        logger.debug(
-                            "Scheduler: user=%d status=%s", us.user_id, signal["status"]
-                        )
-                        continue
+# ─── Leader election ──────────────────────────────────────────────────────────
+
+def _try_lead() -> bool:
+    """Non-blocking: True once this process holds the scheduler lock (kept until exit)."""
+    global _leader_fd
+    with _leader_lock:
+        if _leader_fd is not None:
+            return True
+        if fcntl is None:
+            _leader_fd = True
+            return True
+        os.makedirs(os.path.dirname(LEADER_LOCK), exist_ok=True)
+        f = open(LEADER_LOCK, "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        _leader_fd = f
+        return True
+
+
+def _start() -> None:
+    if not scheduler.running:
+        scheduler.start()
+        logger.info("Scheduler started in pid %d — evaluating bot signals every 15 min", os.getpid())
+
+
+def _follow() -> None:
+    while not _try_lead():
+        time.sleep(LEADER_RETRY)
+    _start()
+
+
+# ─── Bot-signal job ───────────────────────────────────────────────────────────
+# A tick resolves every active bot's wallet and prop-firm guard on the calling
+# thread (DB work stays on one session), then fans the MetaAPI / market-data
+# calls out over a bounded pool. Bots sharing a wallet run serially in one task
+# so an account never sees two concurrent orders. New Trade rows come back as
+# plain dicts and are committed together at the end of the tick.
 
+def _evaluate_account(account, bots: list, candles) -> list:
+    """Worker: evaluate (and trade) every bot on one wallet. No DB access here."""
+    from api import metaapi_client as metaapi
+    from api.trade_engine import evaluate_signal, place_order
+    from api.controllers.dashboard_controller import _fetch_wallet_balance
+
+    results = []
+    for bot in bots:
+        t0  = time.perf_counter()
+        res = {"user_id": bot["user_id"], "status": "ERROR", "trade": None}
+        try:
+            bal    = _fetch_wallet_balance(account)
+            equity = bal.get("equity") or bal.get("balance")
+            if not equity:
+                # lookup refused (budget) or failed — fall back to the last one we saw
+                last = metaapi.last_balance(account, BALANCE_MAX_AGE)
+                equity = last and (last[1].get("equity") or last[1].get("balance"))
+                if equity:
+                    logger.info("Scheduler: balance lookup failed for wallet=%d — sizing from a %.0fs old one",
+                                account.id, last[0])
+
+            if not equity:
+                res["status"] = "NO_BALANCE"
+                logger.warning("Scheduler: no balance for wallet=%d — skipping user=%d this tick",
+                               account.id, bot["user_id"])
+            else:
+                signal = evaluate_signal(account, bot["risk_level"], equity, candles=candles)
+                res["status"] = signal["status"]
+                if signal["status"] == "SIGNAL_FOUND":
                     meta_resp, meta_err = place_order(account, signal)
                     if not meta_resp:
-                        logger.warning("Scheduler: place_order failed for user=%d: %s", us.user_id, meta_err)
+                        res["status"] = "ORDER_FAILED"
+                        logger.warning("Scheduler: place_order failed for user=%d: %s", bot["user_id"], meta_err)
+                    else:
+                        res["status"] = "TRADE_PLACED"
+                        res["trade"]  = dict(
+                            user_id       = bot["user_id"],
+                            strategy_id   = bot["strategy_id"],
+                            wallet_id     = account.id,
+                            meta_trade_id = str(meta_resp.get("positionId") or meta_resp.get("orderId") or ""),
+                            symbol        = "XAUUSD",
+                            trade_type    = signal["action"],
+                            lot_size      = signal["volume"],
+                            open_price    = signal["entry"],
+                            stop_loss     = signal.get("sl"),
+                            take_profit   = signal.get("tp"),
+                            status        = "open",
+                            opened_at     = datetime.utcnow(),
+                        )
+                        logger.info(
+                            "Scheduler: TRADE_PLACED user=%d action=%s entry=%s",
+                            bot["user_id"], signal["action"], signal["entry"],
+                        )
+        except Exception:
+            res["status"] = "ERROR"
+            logger.exception("Scheduler: error processing user=%d", bot["user_id"])
+            # never crash the tick — the other bots on this wallet still run
+        res["latency"] = time.perf_counter() - t0
+        logger.debug("Scheduler: user=%d status=%s in %.2fs", bot["user_id"], res["status"], res["latency"])
+        results.append(res)
+    return results
+
+
+def _tick_candles(wallets: list):
+    """
+    The tick's shared M15 snapshot, retried once (through another wallet when
+    there is one, in case the MetaAPI fallback is what failed). None means
+    skip the tick — never a per-bot download.
+    """
+    from api.trade_engine import get_m15_snapshot
+
+    for attempt, account in enumerate((wallets[0], wallets[-1])):
+        if attempt:
+            time.sleep(SNAPSHOT_RETRY)
+        candles = get_m15_snapshot(account)
+        if candles is not None:
+            return candles
+    return None
+
+
+def run_bot_signals(app) -> None:
+    """One scheduler tick: evaluate every active bot and record the trades placed."""
+    with app.app_context():
+        from api.models.strategies import UserStrategy
+        from api.models.wallet import MetaApiAccount
+        from api.models.trade import Trade
+        from api.models.db import db
+        from api.trade_engine import check_prop_firm_guard
+
+        started = time.perf_counter()
+        active_strategies = UserStrategy.query.filter_by(is_active=True).all()
+        if not active_strategies:
+            return
+
+        logger.info("Scheduler: evaluating signals for %d active bot(s)", len(active_strategies))
+
+        accounts: dict[int, tuple] = {}                 # wallet id → (account, [bot, ...])
+        for us in active_strategies:
+            try:
+                # Use the strategy's linked wallet if set, else first connected account
+                if us.wallet_id and us.wallet:
+                    account = us.wallet
+                else:
+                    account = MetaApiAccount.query.filter_by(
+                        user_id=us.user_id, status="connected"
+                    ).first()
+                if not account:
+                    continue
+
+                # Prop firm daily loss guard
+                if account.is_prop_firm:
+                    guard = check_prop_firm_guard(account)
+                    if guard["blocked"]:
+                        logger.warning(
+                            "Scheduler: prop firm daily loss limit — user=%d %s",
+                            us.user_id, guard["reason"],
+                        )
                         continue
 
-                    trade = Trade(
-                        user_id       = us.user_id,
-                        strategy_id   = us.strategy_id,
-                        wallet_id     = account.id,
-                        meta_trade_id = str(meta_resp.get("positionId") or meta_resp.get("orderId") or ""),
-                        symbol        = "XAUUSD",
-                        trade_type    = signal["action"],
-                        lot_size      = signal["volume"],
-                        open_price    = signal["entry"],
-                        stop_loss     = signal.get("sl"),
-                        take_profit   = signal.get("tp"),
-                        status        = "open",
-                        opened_at     = datetime.utcnow(),
-                    )
-                    db.session.add(trade)
-                    db.session.commit()
-                    logger.info(
-                        "Scheduler: TRADE_PLACED user=%d action=%s entry=%s",
-                        us.user_id, signal["action"], signal["entry"],
-                    )
-
-                except Exception:
-                    logger.exception("Scheduler: error processing user=%d", us.user_id)
-                    # never crash the loop — continue to next user
+                accounts.setdefault(account.id, (account, []))[1].append({
+                    "user_id":     us.user_id,
+                    "strategy_id": us.strategy_id,
+                    "risk_level":  us.strategy.risk_level,
+                })
+            except Exception:
+                logger.exception("Scheduler: error processing user=%d", us.user_id)
+
+        results = []
+        if accounts:
+            # one candle download per bar, shared by every bot this tick
+            candles = _tick_candles([acc for acc, _ in accounts.values()])
+            if candles is None:
+                logger.warning("Scheduler: no M15 candles — skipping %d bot(s) this tick",
+                               sum(len(bots) for _, bots in accounts.values()))
+            else:
+                workers = max(1, min(SCHEDULER_WORKERS, len(accounts)))
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bot-signal") as pool:
+                    futures = [pool.submit(_evaluate_account, acc, bots, candles)
+                               for acc, bots in accounts.values()]
+                    for future in as_completed(futures):
+                        results.extend(future.result())
 
+        trades = [r["trade"] for r in results if r["trade"]]
+        if trades:
+            try:
+                db.session.add_all([Trade(**t) for t in trades])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logger.exception(
+                    "Scheduler: could not record %d placed trade(s): %s",
+                    len(trades), [t["meta_trade_id"] for t in trades],
+                )
+
+        elapsed = time.perf_counter() - started
+        slowest = max(results, key=lambda r: r["latency"], default=None)
+        logger.info(
+            "Scheduler: tick done in %.2fs — %d bot(s) on %d wallet(s), %d trade(s)%s",
+            elapsed, len(results), len(accounts), len(trades),
+            f", slowest user={slowest['user_id']} {slowest['latency']:.2f}s" if slowest else "",
+        )
+        if elapsed > 15 * 60:
+            logger.warning("Scheduler: tick took %.0fs — longer than the 15 min interval", elapsed)
+
+
+def _register_jobs(app) -> None:
+    """Add the bot-signal job to the (not yet started) scheduler."""
     scheduler.add_job(
         run_bot_signals,
         "interval",
         minutes=15,
+        args=[app],
         id="bot_signals",
         replace_existing=True,
     )
 
-    if not scheduler.running:
-        scheduler.start()
-        logger.info("Scheduler started — evaluating bot signals every 15 min")
+
+# ─── Entry points ─────────────────────────────────────────────────────────────
+
+def init_scheduler(app):
+    """
+    Register the bot-signal job and start the scheduler if this process wins
+    the leader lock; otherwise keep retrying in a daemon thread.
+    """
+    global _elector
+    if SCHEDULER_MODE == "off":
+        logger.info("Scheduler disabled in this process (SCHEDULER_MODE=off)")
+        return
+
+    _register_jobs(app)
+    if _try_lead():
+        _start()
+        return
+    if _elector is None:
+        _elector = threading.Thread(target=_follow, name="scheduler-elector", daemon=True)
+        _elector.start()
+        logger.debug("Scheduler lock held by another process — pid %d standing by", os.getpid())
+
+
+def run_scheduler(app):
+    """
+    Foreground entry point for `flask run-scheduler`: waits for the leader
+    lock, runs the scheduler and blocks until interrupted.
+    """
+    _register_jobs(app)
+    if not _try_lead():
+        logger.info("Waiting for the scheduler lock held by another process…")
+        while not _try_lead():
+            time.sleep(LEADER_RETRY)
+    _start()
+    try:
+        while True:
+            time.sleep(3600)
+    except (KeyboardInterrupt, SystemExit):
+        scheduler.shutdown(wait=False)
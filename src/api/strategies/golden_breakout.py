@@ -22,19 +22,24 @@ import numpy as np
 import pandas as pd
 from backtesting import Strategy
 
+from api.strategies.indicator_cache import shared
+
 
 # ── Indicator helpers (same pattern as v4_ghost.py) ──────────────────────────
 
+@shared
 def _ema(arr: np.ndarray, period: int) -> np.ndarray:
     return pd.Series(arr).ewm(span=period, adjust=False).mean().values
 
 
+@shared
 def _atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
     h, l, c = pd.Series(high), pd.Series(low), pd.Series(close)
     tr = pd.concat([h - l, (h - c.shift()).abs(), (l - c.shift()).abs()], axis=1).max(axis=1)
     return tr.ewm(span=period, adjust=False).mean().values
 
 
+@shared
 def _rsi(close: np.ndarray, period: int = 7) -> np.ndarray:
     s = pd.Series(close)
     delta = s.diff()
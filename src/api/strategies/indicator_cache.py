@@ -0,0 +1,97 @@
+"""
+Process-wide memo for the strategies' indicator helpers (_ema, _atr, _rsi).
+
+Optimizer trials that only move rr_ratio, risk_pct or a stop multiplier call
+the same indicator on the same bars with the same period again and again.
+Decorating a helper with @shared keys each call on (helper name, content
+hash of every input array, remaining args) and hands every trial the same
+read-only result array instead of re-running the pandas ewm pipeline.
+
+The memo is off until enable_indicator_cache() is called, which only the
+optimizer's pool initializer does: elsewhere (the web workers' one-off
+backtests, the scheduler) the inputs change with every start date, so a
+memo would only hold memory. Each optimizer worker has its own cache,
+bounded by INDICATOR_CACHE_MAX_MB of result arrays (least recently used
+are dropped first).
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+INDICATOR_CACHE_MAX_BYTES = int(float(os.getenv("INDICATOR_CACHE_MAX_MB", "64")) * 1024 * 1024)
+
+_cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+_lock    = threading.Lock()
+_stats   = {"hits": 0, "misses": 0}
+_bytes   = 0
+_enabled = False
+
+
+def _identity(value):
+    """Hashable stand-in for an argument: arrays by content, everything else as-is."""
+    if isinstance(value, np.ndarray) or hasattr(value, "to_numpy"):
+        arr = np.ascontiguousarray(np.asarray(value))
+        return (arr.dtype.str, arr.shape, hashlib.blake2b(arr.view(np.uint8), digest_size=16).digest())
+    return value
+
+
+def shared(fn):
+    """Memoize an indicator helper; results are returned read-only."""
+    name = f"{fn.__module__}.{fn.__qualname__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        global _bytes
+        if not _enabled:
+            return fn(*args, **kwargs)
+        key = (name, tuple(_identity(a) for a in args),
+               tuple(sorted((k, _identity(v)) for k, v in kwargs.items())))
+        with _lock:
+            hit = _cache.get(key)
+            if hit is not None:
+                _cache.move_to_end(key)
+                _stats["hits"] += 1
+                return hit
+            _stats["misses"] += 1
+
+        value = np.asarray(fn(*args, **kwargs))
+        value.flags.writeable = False
+        if value.nbytes > INDICATOR_CACHE_MAX_BYTES:
+            return value
+        with _lock:
+            if key not in _cache:
+                _cache[key] = value
+                _bytes += value.nbytes
+            while _bytes > INDICATOR_CACHE_MAX_BYTES:
+                _bytes -= _cache.popitem(last=False)[1].nbytes
+        return value
+
+    wrapper.uncached = fn
+    return wrapper
+
+
+def enable_indicator_cache(enabled: bool = True) -> None:
+    """Switch the memo on for this process (optimizer workers) or off again."""
+    global _enabled
+    _enabled = enabled
+    if not enabled:
+        clear_indicator_cache()
+
+
+def cache_info() -> dict:
+    with _lock:
+        return {**_stats, "enabled": _enabled, "size": len(_cache), "bytes": _bytes}
+
+
+def clear_indicator_cache() -> None:
+    global _bytes
+    with _lock:
+        _cache.clear()
+        _bytes = 0
+        _stats.update(hits=0, misses=0)
@@ -20,11 +20,15 @@ import ta.volatility as tav
 import ta.trend as tat
 from backtesting import Strategy
 
+from api.strategies.indicator_cache import shared
 
+
+@shared
 def _ema(arr: np.ndarray, period: int) -> np.ndarray:
     return pd.Series(arr).ewm(span=period, adjust=False).mean().values
 
 
+@shared
 def _atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
     h, l, c = pd.Series(high), pd.Series(low), pd.Series(close)
     tr = pd.concat([h - l, (h - c.shift()).abs(), (l - c.shift()).abs()], axis=1).max(axis=1)
@@ -105,3 +109,307 @@ class V4GhostStrategy(Strategy):
 
 class LowRiskStrategy(V4GhostStrategy):
     pass
+
+
+# ─── Vectorized fast path ─────────────────────────────────────────────────────
+# Same rules as V4GhostStrategy, simulated without backtesting.py's per-bar
+# Strategy/Broker objects: PDH/PDL come from O(n) rolling extremes, entry
+# signals are boolean arrays, and only bars with an open trade are stepped
+# through one by one — flat stretches jump straight to the next signal.
+# The loop mirrors the broker's fill rules (market entries on the next open,
+# SL checked before TP, gaps fill at the open, relative commission on both
+# legs, margin cancel, finalize_trades) so results match Backtest.run()
+# trade for trade. Numba (in requirements.txt / Pipfile) compiles the loop;
+# without it the loop runs as plain Python over lists — about 2x slower on
+# ten years of M15 bars (0.14 s vs 0.07 s), since it skips straight from one
+# signal to the next while flat.
+
+try:
+    from numba import njit as _njit
+except ImportError:
+    _njit = None
+
+_TRADE_COLS = ("Size", "EntryBar", "ExitBar", "EntryPrice", "ExitPrice", "SL", "TP", "Commission")
+
+
+def _close_trade(trades, nt, pos, entry_bar, exit_bar, entry, exit_px, sl, tp, commission):
+    comm = abs(pos) * exit_px * commission + abs(pos) * entry * commission
+    trades[nt, 0] = pos
+    trades[nt, 1] = entry_bar
+    trades[nt, 2] = exit_bar
+    trades[nt, 3] = entry
+    trades[nt, 4] = exit_px
+    trades[nt, 5] = sl
+    trades[nt, 6] = tp
+    trades[nt, 7] = comm
+    return pos * (exit_px - entry) - abs(pos) * exit_px * commission
+
+
+def _exit_price(is_long, o, h, l, sl, tp):
+    """Fill price if the trade's SL (checked first) or TP triggers in this bar, else 0."""
+    if is_long:
+        if l <= sl:
+            return min(o, sl)
+        if h >= tp:
+            return max(o, tp)
+    else:
+        if h >= sl:
+            return max(o, sl)
+        if l <= tp:
+            return min(o, tp)
+    return 0.0
+
+
+# Loop state carried between _simulate() calls, one float64 slot each
+_S_CASH, _S_POS, _S_ENTRY, _S_SL, _S_TP, _S_ENTRY_BAR, _S_PENDING, _S_P_SL, _S_P_TP, _S_NT, _S_J = range(11)
+_SIM_CHUNK = 4096   # bars per _simulate() call, between progress reports
+
+
+def _simulate(o, h, l, c, sess, nxt, side, sl_dist, tp_dist, risk_pct,
+              commission, leverage, start, stop, finalize, equity, trades, state):
+    """
+    Runs bars state[_S_J]..stop (resuming where the last call left off) and
+    returns out_of_money. Fills equity[start:] and trades[:state[_S_NT]];
+    state[_S_J] >= len(c) once the run is over.
+    """
+    n = len(c)
+    cash      = state[_S_CASH]
+    pos       = int(state[_S_POS])
+    entry     = state[_S_ENTRY]
+    sl        = state[_S_SL]
+    tp        = state[_S_TP]
+    entry_bar = int(state[_S_ENTRY_BAR])
+    pending   = int(state[_S_PENDING])
+    p_sl      = state[_S_P_SL]
+    p_tp      = state[_S_P_TP]
+    nt        = int(state[_S_NT])
+
+    j = int(state[_S_J])
+    while j < stop:
+        # ── broker: fill the pending entry, then SL/TP ──
+        if pending != 0:
+            if abs(pending) * (o[j] + abs(pending) * o[j] * commission / abs(pending)) > max(cash, 0.0) * leverage:
+                pending = 0   # broker cancels for insufficient margin
+            else:
+                pos, entry, sl, tp, entry_bar = pending, o[j], p_sl, p_tp, j
+                cash -= abs(pos) * entry * commission
+                pending = 0
+        if pos != 0:
+            px = _exit_price(pos > 0, o[j], h[j], l[j], sl, tp)
+            if px != 0.0:
+                cash += _close_trade(trades, nt, pos, entry_bar, j, entry, px, sl, tp, commission)
+                nt += 1
+                pos = 0
+
+        eq = cash + (c[j] * pos - pos * entry) if pos != 0 else cash
+        equity[j] = eq
+        if eq <= 0:
+            if pos != 0:
+                _close_trade(trades, nt, pos, entry_bar, j, entry, c[j], sl, tp, commission)
+                nt += 1
+            equity[j:] = 0.0
+            state[_S_NT], state[_S_J] = nt, n
+            return True
+
+        # ── strategy.next() ──
+        if pos != 0:
+            if sess[j] and sl != entry:
+                dist = abs(entry - sl)
+                if pos > 0 and c[j] >= entry + dist and sl < entry:
+                    sl = entry
+                elif pos < 0 and c[j] <= entry - dist and sl > entry:
+                    sl = entry
+            j += 1
+            continue
+
+        s = nxt[j]
+        if s >= n:
+            equity[j + 1:] = cash
+            j = n
+            break
+        if s > j:
+            equity[j + 1:s + 1] = cash
+            j = s
+        d = sl_dist[j]
+        size = max(int(np.rint(cash * risk_pct / d)), 1)
+        if side[j] > 0:
+            pending, p_sl, p_tp = size, c[j] - d, c[j] + tp_dist[j]
+        else:
+            pending, p_sl, p_tp = -size, c[j] + d, c[j] - tp_dist[j]
+        j += 1
+
+    if j < n:
+        state[_S_CASH], state[_S_POS], state[_S_ENTRY], state[_S_SL], state[_S_TP] = cash, pos, entry, sl, tp
+        state[_S_ENTRY_BAR], state[_S_PENDING], state[_S_P_SL], state[_S_P_TP] = entry_bar, pending, p_sl, p_tp
+        state[_S_NT], state[_S_J] = nt, j
+        return False
+
+    state[_S_J] = n
+    if finalize and n > start:
+        # Backtest.run() closes what is still open and replays the last bar's
+        # orders once more: SL/TP, then the close order at that bar's open —
+        # or the fill of an entry signalled on the very last bar.
+        j = n - 1
+        if pos != 0:
+            px = _exit_price(pos > 0, o[j], h[j], l[j], sl, tp)
+            if px == 0.0:
+                px = o[j]
+            cash += _close_trade(trades, nt, pos, entry_bar, j, entry, px, sl, tp, commission)
+            nt += 1
+            pos = 0
+        elif pending != 0 and abs(pending) * (o[j] + abs(pending) * o[j] * commission / abs(pending)) <= max(cash, 0.0) * leverage:
+            pos, entry, sl, tp, entry_bar = pending, o[j], p_sl, p_tp, j
+            cash -= abs(pos) * entry * commission
+            px = _exit_price(pos > 0, o[j], h[j], l[j], sl, tp)
+            if px != 0.0:
+                cash += _close_trade(trades, nt, pos, entry_bar, j, entry, px, sl, tp, commission)
+                nt += 1
+                pos = 0
+        eq = cash + (c[j] * pos - pos * entry) if pos != 0 else cash
+        equity[j] = eq
+        if eq <= 0:
+            if pos != 0:
+                _close_trade(trades, nt, pos, entry_bar, j, entry, c[j], sl, tp, commission)
+                nt += 1
+            equity[j] = 0.0
+            state[_S_NT] = nt
+            return True
+    state[_S_NT] = nt
+    return False
+
+
+if _njit is not None:
+    _close_trade = _njit(cache=True)(_close_trade)
+    _exit_price  = _njit(cache=True)(_exit_price)
+    _simulate    = _njit(cache=True)(_simulate)
+
+
+def v4_ghost_signals(df: pd.DataFrame, lookback_bars: int = 24, atr_period: int = 14,
+                     atr_sl_mult: float = 1.5, rr_ratio: float = 3.0,
+                     session_start: int = 7, session_end: int = 21) -> dict:
+    """
+    Entry signals for every bar at once.
+    `side` is +1 (sweep of PDL → buy), -1 (sweep of PDH → sell) or 0; it is
+    only non-zero on bars where next() would actually place an order if flat.
+    """
+    high  = df["High"].to_numpy(dtype=float)
+    low   = df["Low"].to_numpy(dtype=float)
+    close = df["Close"].to_numpy(dtype=float)
+    n = len(close)
+
+    pdh = pd.Series(high).rolling(lookback_bars).max().shift(1).to_numpy()
+    pdl = pd.Series(low).rolling(lookback_bars).min().shift(1).to_numpy()
+    atr = _atr(high, low, close, atr_period)
+
+    if isinstance(df.index, pd.DatetimeIndex):
+        hour = df.index.hour.to_numpy()
+    else:
+        hour = np.full(n, 12)
+    sess = (hour >= session_start) & (hour < session_end)
+
+    with np.errstate(invalid="ignore"):
+        buy  = (low < pdl) & (close > pdl)
+        sell = ~buy & (high > pdh) & (close < pdh)
+        ok   = sess & (np.arange(n) >= lookback_bars + 1) & (atr > 0)
+    side = np.where(ok & buy, 1, np.where(ok & sell, -1, 0)).astype(np.int8)
+
+    sl_dist = atr * atr_sl_mult
+    return {
+        "sess":    sess,
+        "side":    side,
+        "sl_dist": sl_dist,
+        "tp_dist": sl_dist * rr_ratio,
+        "warmup":  int(np.isnan(atr).argmin()),
+    }
+
+
+def run_v4_ghost_fast(df: pd.DataFrame, cash: float = 100_000.0, commission: float = 0.0,
+                      margin: float = 1.0, finalize_trades: bool = False, progress=None, **params):
+    """
+    Backtest V4GhostStrategy without backtesting.py's event loop.
+
+    `df` is a backtesting.py-ready frame (Open/High/Low/Close columns); cash,
+    commission (relative rate only), margin and finalize_trades mean the same
+    as for Backtest(..., exclusive_orders=True). Unset params fall back to the
+    V4GhostStrategy class defaults. `progress(bars_done, total)`, if given,
+    is called before the signals and every _SIM_CHUNK bars of the simulation;
+    an exception raised from it aborts the run.
+
+    Returns (trades, equity): trades in the layout of stats["_trades"] and the
+    per-bar equity curve, ready for backtesting's compute_stats.
+    """
+    p = {k: params.get(k, getattr(V4GhostStrategy, k)) for k in (
+        "lookback_bars", "atr_period", "atr_sl_mult", "rr_ratio",
+        "risk_pct", "session_start", "session_end")}
+    unknown = set(params) - set(p)
+    if unknown:
+        raise AttributeError(f"V4GhostStrategy has no parameter(s) {sorted(unknown)}")
+
+    n = len(df)
+    if progress is not None:
+        progress(0, n)
+    sig = v4_ghost_signals(
+        df, p["lookback_bars"], p["atr_period"], p["atr_sl_mult"], p["rr_ratio"],
+        p["session_start"], p["session_end"],
+    )
+    side  = sig["side"]
+    start = 1 + sig["warmup"]
+    side[:start] = 0
+
+    hits = np.flatnonzero(side)
+    nxt  = np.append(hits, n)[np.searchsorted(hits, np.arange(n))]
+
+    o = df["Open"].to_numpy(dtype=float)
+    h = df["High"].to_numpy(dtype=float)
+    l = df["Low"].to_numpy(dtype=float)
+    c = df["Close"].to_numpy(dtype=float)
+    arrays = (o, h, l, c, sig["sess"], nxt, side, sig["sl_dist"], sig["tp_dist"])
+    if _njit is None:
+        # list indexing is several times cheaper than ndarray scalar access
+        arrays = tuple(a.tolist() for a in arrays)
+
+    equity = np.full(n, float(cash))
+    trades = np.zeros((len(hits) + 1, len(_TRADE_COLS)))
+    state  = np.zeros(_S_J + 1)
+    state[_S_CASH], state[_S_J] = cash, start
+    while True:
+        stop = n if progress is None else min(int(state[_S_J]) + _SIM_CHUNK, n)
+        _simulate(*arrays, float(p["risk_pct"]), float(commission), 1 / margin,
+                  start, stop, bool(finalize_trades), equity, trades, state)
+        if state[_S_J] >= n:
+            break
+        progress(int(state[_S_J]), n)
+    nt = int(state[_S_NT])
+    if n > start:
+        equity[:start] = equity[start]
+
+    size, entry_bar, exit_bar, entry_px, exit_px, sl, tp, comm = trades[:nt].T
+    size, entry_bar, exit_bar = size.astype(np.int64), entry_bar.astype(np.int64), exit_bar.astype(np.int64)
+    entry_time, exit_time = df.index[entry_bar], df.index[exit_bar]
+    t = pd.DataFrame({
+        "Size":       size,
+        "EntryBar":   entry_bar,
+        "ExitBar":    exit_bar,
+        "EntryPrice": entry_px,
+        "ExitPrice":  exit_px,
+        "SL":         sl,
+        "TP":         tp,
+        "PnL":        size * (exit_px - entry_px) - comm,
+        "Commission": comm,
+        "ReturnPct":  np.sign(size) * (exit_px / entry_px - 1) - comm / (np.abs(size) * entry_px),
+        "EntryTime":  entry_time,
+        "ExitTime":   exit_time,
+        "Duration":   exit_time - entry_time,
+        "Tag":        None,
+    })
+    return t, equity
+
+
+def v4_ghost_fast_stats(df: pd.DataFrame, cash: float = 100_000.0, commission: float = 0.0,
+                        margin: float = 1.0, finalize_trades: bool = False, progress=None,
+                        **params) -> pd.Series:
+    """run_v4_ghost_fast + backtesting's own stats — a drop-in for Backtest(...).run(**params)."""
+    from backtesting._stats import compute_stats
+
+    trades, equity = run_v4_ghost_fast(df, cash, commission, margin, finalize_trades, progress, **params)
+    return compute_stats(trades=trades, equity=equity, ohlc_data=df, strategy_instance=None)
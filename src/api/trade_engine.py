@@ -4,25 +4,30 @@ Trade Engine — V4 Ghost signal evaluation + MetaAPI order placement + trade sy
 Applies PDH/PDL sweep logic directly on live M15 XAUUSD candles from MetaAPI.
 No backtesting.py dependency — pure pandas/numpy matching backtest_engine.py logic.
 
-MetaAPI call budget (2000/day limit):
-  evaluate_signal()    = 2 calls (candles + account-info for equity)
-  place_order()        = 1 call  (only when SIGNAL_FOUND)
+MetaAPI call budget (2000/day limit, enforced by metaapi_client — see
+metaapi_client.budget_usage()):
+  evaluate_signal()    = 0 calls — candles come from get_m15_snapshot(),
+                         downloaded from yfinance once per bar for every bot
+                         (1 "market" call per bar only if yfinance fails)
+  equity for sizing    = ≤ 1 account-info call per wallet per tick; bots on
+                         one wallet share it through account_balance()'s cache
+  place_order()        = 1 call  (only when SIGNAL_FOUND) — "order" priority
   sync_open_trades()   = 2 calls (positions + history-deals)
+  Per scheduler tick: ≤ 1 candle call + ≤ 1 call per wallet + 1 per order.
   All calls are demand-driven (no background polling).
 """
 from __future__ import annotations
 
 import logging
+import threading
 from datetime import datetime, timezone, timedelta
 
 import numpy as np
 import pandas as pd
-import requests as req
 
-logger = logging.getLogger(__name__)
+from api import metaapi_client as metaapi
 
-# Reuse auth headers and base URL from wallet_controller
-from api.controllers.wallet_controller import _metaapi_headers, METAAPI_CLIENT_BASE
+logger = logging.getLogger(__name__)
 
 # Risk params — identical to backtest_engine.py strategy_map
 RISK_PARAMS: dict[str, dict] = {
@@ -56,19 +61,10 @@ def _fetch_m15_candles(account) -> "pd.DataFrame | None":
         logger.warning("yfinance candle fetch failed: %s — falling back to MetaAPI", e)
 
     # ── MetaAPI fallback (requires historical-market-data subscription) ────────
-    base       = METAAPI_CLIENT_BASE.format(region=account.region)
     start_time = datetime.now(timezone.utc).isoformat()
-    url        = (
-        f"{base}/users/current/accounts/{account.account_id}"
-        f"/historical-market-data/symbols/XAUUSD/timeframes/15m/candles"
-    )
+    url        = metaapi.account_url(account, "/historical-market-data/symbols/XAUUSD/timeframes/15m/candles")
     try:
-        resp = req.get(
-            url,
-            headers=_metaapi_headers(),
-            params={"startTime": start_time, "limit": 50},
-            timeout=15,
-        )
+        resp = metaapi.get(url, params={"startTime": start_time, "limit": 50})
     except Exception as e:
         logger.error("MetaAPI candles fetch failed: %s", e)
         return None
@@ -95,6 +91,32 @@ def _fetch_m15_candles(account) -> "pd.DataFrame | None":
     return df if not df.empty else None
 
 
+# ─── Per-bar candle snapshot ─────────────────────────────────────────────────
+# Every bot trades the same XAUUSD M15 series, so the scheduler fetches it once
+# per tick and hands the same (read-only) frame to every bot. The snapshot is
+# kept until the current bar closes; the lock makes concurrent callers wait for
+# the one in-flight download instead of starting their own.
+
+_BAR = timedelta(minutes=15)
+_snapshot: dict = {"df": None, "expires": None}
+_snapshot_lock = threading.Lock()
+
+
+def _next_bar_close(now: datetime) -> datetime:
+    return now.replace(minute=now.minute - now.minute % 15, second=0, microsecond=0) + _BAR
+
+
+def get_m15_snapshot(account) -> "pd.DataFrame | None":
+    """M15 candles shared until the next bar close. `account` is only used for the MetaAPI fallback."""
+    with _snapshot_lock:
+        if _snapshot["df"] is not None and datetime.now(timezone.utc) < _snapshot["expires"]:
+            return _snapshot["df"]
+        df = _fetch_m15_candles(account)
+        if df is not None:
+            _snapshot.update(df=df, expires=_next_bar_close(datetime.now(timezone.utc)))
+        return df
+
+
 # ─── ATR helper ──────────────────────────────────────────────────────────────
 
 def _atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> float:
@@ -107,9 +129,10 @@ def _atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14)
 
 # ─── Signal evaluation ────────────────────────────────────────────────────────
 
-def evaluate_signal(account, risk_level: str, equity: float) -> dict:
+def evaluate_signal(account, risk_level: str, equity: float, candles: "pd.DataFrame | None" = None) -> dict:
     """
     Evaluate V4 Ghost PDH/PDL sweep on current M15 data.
+    Evaluates `candles` when given, else the shared get_m15_snapshot().
 
     Returns:
         {"status": "SIGNAL_FOUND", "action": "BUY"|"SELL", "entry", "sl", "tp", "volume"}
@@ -119,7 +142,7 @@ def evaluate_signal(account, risk_level: str, equity: float) -> dict:
     params   = RISK_PARAMS.get(risk_level, RISK_PARAMS["medium"])
     lookback = params["lookback"]  # 24 bars
 
-    df = _fetch_m15_candles(account)
+    df = candles if candles is not None else get_m15_snapshot(account)
     if df is None:
         return {"status": "ERROR", "msg": "Could not fetch M15 candles from MetaAPI"}
 
@@ -181,8 +204,7 @@ def place_order(account, signal: dict) -> tuple[dict | None, str | None]:
     Place a market order on MetaAPI.  1 API call.
     Returns (response_dict, None) on success, (None, error_str) on failure.
     """
-    base = METAAPI_CLIENT_BASE.format(region=account.region)
-    url  = f"{base}/users/current/accounts/{account.account_id}/trade"
+    url  = metaapi.account_url(account, "/trade")
     body: dict = {
         "actionType": "ORDER_TYPE_BUY" if signal["action"] == "BUY" else "ORDER_TYPE_SELL",
         "symbol":     "XAUUSD",
@@ -194,12 +216,13 @@ def place_order(account, signal: dict) -> tuple[dict | None, str | None]:
     if signal.get("tp"):
         body["takeProfit"] = signal["tp"]
     try:
-        resp = req.post(url, json=body, headers=_metaapi_headers(), timeout=10)
+        resp = metaapi.post(url, json=body)
     except Exception as e:
         logger.error("MetaAPI place_order exception: %s", e)
         return None, str(e)
 
     if resp.ok:
+        metaapi.invalidate_balance(account)   # margin / equity just changed
         return resp.json(), None
 
     error = f"HTTP {resp.status_code}: {resp.text[:300]}"
@@ -215,15 +238,9 @@ def sync_open_trades(account, open_trades: list, db) -> int:
     Closes any DB Trade records that MetaAPI has already closed.
     Returns the number of trades updated.
     """
-    base = METAAPI_CLIENT_BASE.format(region=account.region)
-
     # 1 call — get current open positions
     try:
-        pos_resp = req.get(
-            f"{base}/users/current/accounts/{account.account_id}/positions",
-            headers=_metaapi_headers(),
-            timeout=10,
-        )
+        pos_resp = metaapi.get(metaapi.account_url(account, "/positions"))
         open_meta_ids = set()
         if pos_resp.ok:
             open_meta_ids = {str(p.get("id", "")) for p in pos_resp.json()}
@@ -264,11 +281,7 @@ def sync_open_trades(account, open_trades: list, db) -> int:
     end   = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
     deals_by_pos: dict[str, list] = {}
     try:
-        hist_resp = req.get(
-            f"{base}/users/current/accounts/{account.account_id}/history-deals/time/{start}/{end}",
-            headers=_metaapi_headers(),
-            timeout=10,
-        )
+        hist_resp = metaapi.get(metaapi.account_url(account, f"/history-deals/time/{start}/{end}"))
         if hist_resp.ok:
             for deal in hist_resp.json():
                 pid = str(deal.get("positionId", ""))
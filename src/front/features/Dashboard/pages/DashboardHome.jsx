@@ -10,6 +10,7 @@ import { getWallets } from "../api";
 import useGlobalReducer from "../../../hooks/useGlobalReducer";
 
 const BACKEND = import.meta.env.VITE_BACKEND_URL;
+const STREAM_FULL_RETRY = 5 * 60 * 1000;   // ms before a refused price stream is tried again
 
 const EMPTY_SUMMARY = {
     wallets: [],
@@ -61,6 +62,60 @@ const QuickTradePanel = () => {
             .catch(() => {});
     }, [fetchPrice]);
 
+    // Live price: one shared upstream poller server-side, pushed over SSE.
+    // The stream is opened with a short-lived stream token, never the access
+    // token, and reopened with a new one whenever it drops (server max age,
+    // network). Reconnects slow down to a minute. When the worker has no
+    // stream slot left it sends `event: full`: poll /market/price (served from
+    // the same feed) at the interval it gives and try streaming again later.
+    useEffect(() => {
+        if (!token()) return;
+        let es = null, timer = null, poller = null, stopped = false, delay = 5000;
+
+        const stopPolling = () => { clearInterval(poller); poller = null; };
+        const startPolling = (seconds) => {
+            if (!poller) poller = setInterval(fetchPrice, Math.max(seconds, 5) * 1000);
+        };
+
+        const open = async () => {
+            try {
+                const r = await fetch(`${BACKEND}/api/market/price/stream-token`, {
+                    method: "POST", headers: { Authorization: `Bearer ${token()}` },
+                });
+                if (!r.ok || stopped) throw new Error();
+                const { token: streamToken } = await r.json();
+                es = new EventSource(`${BACKEND}/api/market/price/stream?symbol=XAUUSD&token=${encodeURIComponent(streamToken)}`);
+                es.addEventListener("price", (e) => {
+                    const data = JSON.parse(e.data);
+                    if (data.bid) {
+                        setPrice(data.bid);
+                        setPriceErr(null);
+                    }
+                    stopPolling();
+                    delay = 5000;
+                });
+                es.addEventListener("full", (e) => {
+                    const { poll } = JSON.parse(e.data);
+                    es.close();
+                    fetchPrice();
+                    startPolling(poll);
+                    if (!stopped) timer = setTimeout(open, STREAM_FULL_RETRY);
+                });
+                es.onerror = () => { es.close(); retry(); };
+            } catch {
+                retry();
+            }
+        };
+        const retry = () => {
+            if (stopped) return;
+            timer = setTimeout(open, delay);
+            delay = Math.min(delay * 2, 60000);
+        };
+
+        open();
+        return () => { stopped = true; clearTimeout(timer); stopPolling(); if (es) es.close(); };
+    }, [fetchPrice]);
+
     const placeOrder = async (action) => {
         setLoading(true);
         setResult(null);
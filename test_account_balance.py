@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+import requests
+
+from api import metaapi_client as metaapi
+
+Account = namedtuple("Account", "region account_id")
+ACCOUNT = Account("london", "abc")
+
+
+class FakeAccountInfo:
+    """Stands in for metaapi.get: counts calls, optionally blocks until released."""
+
+    def __init__(self):
+        self.calls   = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.fail    = False
+
+    def __call__(self, url, **kwargs):
+        self.calls += 1
+        self.release.wait(5)
+        resp = requests.Response()
+        resp.status_code = 503 if self.fail else 200
+        resp._content = b'{"balance": %d, "equity": %d, "freeMargin": 1}' % (self.calls, self.calls)
+        return resp
+
+
+@pytest.fixture
+def fetch(monkeypatch):
+    fake = FakeAccountInfo()
+    monkeypatch.setattr(metaapi, "get", fake)
+    metaapi._balances.clear()
+    metaapi._balance_flights.clear()
+    yield fake
+    fake.release.set()
+    metaapi._balances.clear()
+
+
+def age(seconds):
+    fetched_at, data = metaapi._balances[("london", "abc")]
+    metaapi._balances[("london", "abc")] = (fetched_at - seconds, data)
+
+
+def test_concurrent_misses_share_one_request(fetch):
+    fetch.release.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(metaapi.account_balance(ACCOUNT)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    fetch.release.set()
+    for t in threads:
+        t.join()
+
+    assert fetch.calls == 1
+    assert len(results) == 8 and all(r == results[0] for r in results)
+    assert results[0]["balance"] == 1 and results[0]["free_margin"] == 1
+
+
+def test_fresh_answers_come_from_the_cache(fetch):
+    metaapi.account_balance(ACCOUNT)
+    metaapi.account_balance(ACCOUNT)
+    assert fetch.calls == 1
+
+    age(metaapi.BALANCE_TTL)
+    assert metaapi.account_balance(ACCOUNT)["balance"] == 2
+
+
+def test_stale_ok_serves_the_old_balance_while_refreshing(fetch):
+    metaapi.account_balance(ACCOUNT)
+    age(metaapi.BALANCE_TTL + 1)
+    fetch.release.clear()
+
+    assert metaapi.account_balance(ACCOUNT, stale_ok=True)["balance"] == 1    # no wait
+    fetch.release.set()
+    for _ in range(50):
+        if metaapi._balances[("london", "abc")][1]["balance"] == 2:
+            break
+        time.sleep(0.02)
+    assert metaapi.account_balance(ACCOUNT)["balance"] == 2
+    assert fetch.calls == 2
+
+
+def test_failures_are_not_cached(fetch):
+    fetch.fail = True
+    assert metaapi.account_balance(ACCOUNT) is None
+    assert metaapi.account_balance(ACCOUNT) is None
+    assert fetch.calls == 2
+    assert metaapi.last_balance(ACCOUNT, max_age=3600) is None
+
+
+def test_stale_if_error(fetch):
+    metaapi.account_balance(ACCOUNT)
+    age(metaapi.BALANCE_STALE + 1)
+    fetch.fail = True
+    assert metaapi.account_balance(ACCOUNT) is None
+    assert metaapi.account_balance(ACCOUNT, stale_ok=True)["balance"] == 1
+
+
+def test_last_balance_and_invalidate(fetch):
+    metaapi.account_balance(ACCOUNT)
+    age(100)
+    seconds, data = metaapi.last_balance(ACCOUNT, max_age=120)
+    assert 100 <= seconds < 101 and data["balance"] == 1
+    assert metaapi.last_balance(ACCOUNT, max_age=60) is None
+
+    metaapi.invalidate_balance(ACCOUNT)
+    assert metaapi.last_balance(ACCOUNT, max_age=120) is None
+    assert metaapi.account_balance(ACCOUNT)["balance"] == 2
@@ -0,0 +1,178 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from api import candle_store, metaapi_client as metaapi
+
+HOUR  = 3600
+T0    = 1_767_225_600            # 2026-01-01 00:00 UTC — the market's first bar
+KEY   = ("EURUSD", "1h")
+START = T0 + 1000 * HOUR + 1800  # half-way through bar 1000
+
+
+class FakeMarket:
+    """Hourly bars from T0 onwards; records every upstream request as (start_ts, n)."""
+
+    def __init__(self, clock):
+        self.clock    = clock
+        self.requests = []
+        self.error    = None
+
+    def bar(self, ts):
+        p = 1.0 + (ts - T0) // HOUR / 10_000
+        return ts, p, p + 0.001, p - 0.001, p + 0.0005, 10
+
+    def __call__(self, account, key, start_ts, n):
+        self.requests.append((start_ts, n))
+        if self.error:
+            raise self.error
+        last  = min(start_ts, self.clock.now)
+        last  = T0 + int(last - T0) // HOUR * HOUR
+        first = max(T0, last - (n - 1) * HOUR)
+        return [self.bar(ts) for ts in range(first, last + 1, HOUR)]
+
+
+@pytest.fixture
+def market(tmp_path, monkeypatch):
+    clock  = SimpleNamespace(now=START)
+    market = FakeMarket(clock)
+    monkeypatch.setattr(candle_store, "CANDLE_DB", str(tmp_path / "candles.db"))
+    monkeypatch.setattr(candle_store, "time", SimpleNamespace(time=lambda: clock.now))
+    monkeypatch.setattr(candle_store, "_fetch", market)
+    monkeypatch.setenv("METAAPI_TOKEN", "test")
+    candle_store._forming.clear()
+    candle_store._synced.clear()
+    yield market
+    candle_store._drop_conn()
+    candle_store._forming.clear()
+    candle_store._synced.clear()
+
+
+def candles(limit, start_time=None, account=object()):
+    return candle_store.get_candles(account, *KEY, limit=limit, start_time=start_time)
+
+
+def times(result):
+    return [candle_store._parse_time(c["time"]) for c in result["candles"]]
+
+
+def coverage():
+    return candle_store._connect().execute("SELECT lo, hi, complete FROM coverage ORDER BY lo").fetchall()
+
+
+def expect(last_bar, n):
+    return [T0 + (last_bar - i) * HOUR for i in reversed(range(n))]
+
+
+def test_first_request_is_one_fetch_and_keeps_the_forming_bar_in_memory(market):
+    result = candles(100)
+    assert result["source"] == "metaapi"
+    assert times(result) == expect(1000, 100)
+    assert len(market.requests) == 1
+    assert coverage() == [(T0 + 900 * HOUR, T0 + 999 * HOUR, 0)]     # bar 1000 is still forming
+
+
+def test_repeat_within_the_forming_ttl_stays_local(market):
+    candles(100)
+    market.clock.now += candle_store.FORMING_TTL / 2
+    assert times(candles(100)) == expect(1000, 100)
+    assert len(market.requests) == 1
+
+
+def test_head_gap_fetches_only_the_new_bars(market):
+    candles(100)
+    market.clock.now += 10 * HOUR
+    result = candles(100)
+    assert times(result) == expect(1010, 100)
+    assert market.requests[-1][1] == 13                              # 11 since the head + overlap
+    assert coverage() == [(T0 + 900 * HOUR, T0 + 1009 * HOUR, 0)]
+
+
+def test_longer_request_fills_the_tail_once(market):
+    candles(100)
+    result = candles(300)
+    assert times(result) == expect(1000, 300)
+    assert market.requests[-1] == (T0 + 900 * HOUR, 201)             # only bars older than the range
+    assert coverage() == [(T0 + 700 * HOUR, T0 + 999 * HOUR, 0)]
+
+    market.clock.now += candle_store.FORMING_TTL
+    candles(300)
+    assert len(market.requests) == 3                                 # head sync only, no tail fetch
+
+
+def test_historical_windows_merge_when_they_touch(market):
+    candles(50, start_time="2026-01-11T00:00:00Z")                   # bars 191..240
+    candles(50, start_time="2026-01-13T02:00:00Z")                   # bars 241..290
+    assert coverage() == [(T0 + 191 * HOUR, T0 + 290 * HOUR, 0)]
+
+    requests_before = len(market.requests)
+    assert times(candles(80, start_time="2026-01-13T02:00:00Z")) == expect(290, 80)
+    assert len(market.requests) == requests_before                   # served from the store
+
+
+def test_start_of_history_is_remembered(market):
+    market.clock.now = T0 + 50 * HOUR + 1800
+    assert len(candles(100)["candles"]) == 51
+    assert coverage()[0][2] == 1
+
+    market.clock.now += candle_store.FORMING_TTL
+    candles(500)
+    assert market.requests[-1][0] == market.clock.now                # head sync only
+
+
+def test_upstream_errors_serve_the_store(market):
+    candles(100)
+    market.clock.now += HOUR
+    market.error = candle_store.UpstreamError("market closed")
+    result = candles(100)
+    assert result["stale"] and result["description"] == "market closed"
+    assert times(result)[-1] == T0 + 1000 * HOUR
+
+    market.error = metaapi.BudgetExceeded("no room")
+    assert candles(100)["description"] == "no room"
+
+
+def test_without_an_account_nothing_goes_upstream(market):
+    candles(100)
+    result = candles(100, account=None)
+    assert result["source"] == "store" and times(result) == expect(1000, 100)
+    assert len(market.requests) == 1
+    assert candle_store.get_candles(None, "GBPUSD", "1h", limit=10) == {"candles": [], "source": "none"}
+
+
+def test_requests_reuse_the_thread_connection(market):
+    conn = candle_store._connect()
+    candles(5)
+    market.clock.now += HOUR
+    candles(5)
+    assert candle_store._connect() is conn
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(candle_store._connect()))
+    t.start()
+    t.join()
+    assert other[0] is not conn
+
+
+def test_fetch_parses_metaapi_candles(monkeypatch):
+    def get(url, params):
+        assert url.endswith("/historical-market-data/symbols/EURUSD/timeframes/1h/candles")
+        assert params == {"startTime": "2026-01-01T02:00:00.000Z", "limit": candle_store.MAX_FETCH}
+        resp = requests.Response()
+        resp.status_code = 200
+        resp._content = (b'[{"time": "2026-01-01T01:00:00.000Z", "open": 2, "high": 3, "low": 1, "close": 2.5,'
+                         b' "tickVolume": 7},'
+                         b' {"time": "2026-01-01T00:00:00.000Z", "open": 1, "high": 2, "low": 0.5, "close": 2},'
+                         b' {"time": "2026-01-01T01:00:00.000Z", "open": 2, "high": 3, "low": 1, "close": 2.5,'
+                         b' "tickVolume": 7},'
+                         b' {"time": "2026-01-01T02:00:00.000Z", "open": null}]')
+        return resp
+
+    monkeypatch.setattr(metaapi, "get", get)
+    account = SimpleNamespace(region="london", account_id="abc")
+    assert candle_store._fetch(account, KEY, T0 + 2 * HOUR, 5000) == [
+        (T0, 1, 2, 0.5, 2, 0),
+        (T0 + HOUR, 2, 3, 1, 2.5, 7),
+    ]
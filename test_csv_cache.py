@@ -0,0 +1,78 @@
+import json
+import os
+import stat
+
+import pandas as pd
+
+from conftest import write_csv
+
+
+def _m15(engine):
+    return os.path.join(engine.DATA_DIR, "15MinuteData")
+
+
+def _manifest(engine):
+    with open(os.path.join(engine._cache_dir("M15"), engine._MANIFEST)) as f:
+        return json.load(f)
+
+
+def _no_parse(monkeypatch, engine):
+    def fail(path):
+        raise AssertionError(f"re-parsed {os.path.basename(path)}")
+    monkeypatch.setattr(engine, "_parse_single_csv", fail)
+
+
+def test_cached_load_matches_direct_parse(engine):
+    write_csv(_m15(engine), "a.csv", "2024-01-01", 50)
+    write_csv(_m15(engine), "b.csv", "2024-01-02", 50)
+
+    cached = engine.load_csv("M15", start_date=None, workers=1)
+    direct = engine.load_csv("M15", start_date=None, workers=1, use_cache=False)
+    pd.testing.assert_frame_equal(cached, direct, check_freq=False)
+    assert set(_manifest(engine)) == {"a.csv", "b.csv"}
+
+
+def test_unchanged_files_are_not_reparsed(engine, monkeypatch):
+    write_csv(_m15(engine), "a.csv", "2024-01-01", 50)
+    first = engine._load_frames_cached("M15", engine._find_csvs("M15"), workers=1)
+
+    _no_parse(monkeypatch, engine)
+    again = engine._load_frames_cached("M15", engine._find_csvs("M15"), workers=1)
+    pd.testing.assert_frame_equal(first[0], again[0])
+
+
+def test_rewritten_file_is_reparsed(engine, monkeypatch):
+    path = write_csv(_m15(engine), "a.csv", "2024-01-01", 50)
+    write_csv(_m15(engine), "b.csv", "2024-01-02", 50)
+    engine._load_frames_cached("M15", engine._find_csvs("M15"), workers=1)
+
+    write_csv(_m15(engine), "a.csv", "2024-01-01", 60, price=2100.0)
+    os.utime(path, ns=(1, 1))
+    parsed = []
+    real = engine._parse_single_csv
+    monkeypatch.setattr(engine, "_parse_single_csv", lambda p: parsed.append(os.path.basename(p)) or real(p))
+
+    frames = engine._load_frames_cached("M15", engine._find_csvs("M15"), workers=1)
+    assert parsed == ["a.csv"]
+    assert len(frames[0]) == 60 and frames[0]["open"].iloc[0] == 2100.0
+    assert _manifest(engine)["a.csv"]["mtime_ns"] == 1
+
+
+def test_removed_file_is_dropped_from_the_cache(engine):
+    write_csv(_m15(engine), "a.csv", "2024-01-01", 50)
+    gone = write_csv(_m15(engine), "b.csv", "2024-01-02", 50)
+    engine._load_frames_cached("M15", engine._find_csvs("M15"), workers=1)
+
+    os.remove(gone)
+    engine._load_frames_cached("M15", engine._find_csvs("M15"), workers=1)
+    assert set(_manifest(engine)) == {"a.csv"}
+    assert not os.path.exists(os.path.join(engine._cache_dir("M15"), "b.npy"))
+
+
+def test_cache_files_get_the_umask_mode(engine):
+    write_csv(_m15(engine), "a.csv", "2024-01-01", 50)
+    engine.load_csv("M15", start_date=None, workers=1)
+
+    folder = engine._cache_dir("M15")
+    for name in ("a.npy", engine._MANIFEST):
+        assert stat.S_IMODE(os.stat(os.path.join(folder, name)).st_mode) == engine._FILE_MODE
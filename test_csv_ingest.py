@@ -0,0 +1,69 @@
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import write_csv
+
+
+@pytest.fixture
+def folder(engine):
+    folder = os.path.join(engine.DATA_DIR, "15MinuteData")
+    write_csv(folder, "2024-01-01.csv", "2024-01-01", 96)
+    write_csv(folder, "2024-01-02.csv", "2024-01-02", 96)
+    assert engine.ingest_new_files("M15", workers=1)["mode"] == "rebuild"
+    return folder
+
+
+def _assert_series_matches_csvs(engine):
+    series = engine.load_csv("M15", start_date=None, workers=1)
+    direct = engine.load_csv("M15", start_date=None, workers=1, use_cache=False)
+    pd.testing.assert_frame_equal(series, direct, check_freq=False)
+
+
+def test_nothing_new_is_a_noop(engine, folder):
+    report = engine.ingest_new_files("M15", workers=1)
+    assert report["mode"] == "noop" and report["rows"] == 192
+
+
+def test_new_export_is_appended_without_reparsing_the_rest(engine, folder, monkeypatch):
+    write_csv(folder, "2024-01-03.csv", "2024-01-03", 96)
+    parsed = []
+    real = engine._parse_single_csv
+    monkeypatch.setattr(engine, "_parse_single_csv", lambda p: parsed.append(os.path.basename(p)) or real(p))
+
+    report = engine.ingest_new_files("M15", workers=1)
+    assert report["mode"] == "append"
+    assert report["rows_added"] == 96 and report["rows"] == 288
+    assert parsed == ["2024-01-03.csv"]
+    _assert_series_matches_csvs(engine)
+
+
+def test_bars_repeated_at_the_seam_are_dropped(engine, folder):
+    write_csv(folder, "2024-01-03.csv", "2024-01-02 23:00", 10, price=2000.0 + 92 * 0.125)
+    report = engine.ingest_new_files("M15", workers=1)
+    assert report["mode"] == "append" and report["rows_added"] == 6
+    _assert_series_matches_csvs(engine)
+
+
+def test_backfill_forces_a_rebuild(engine, folder):
+    write_csv(folder, "2023-12-31.csv", "2023-12-31", 96)
+    report = engine.ingest_new_files("M15", workers=1)
+    assert report["mode"] == "rebuild" and report["rows"] == 288
+    _assert_series_matches_csvs(engine)
+
+
+def test_rewritten_export_forces_a_rebuild(engine, folder):
+    path = write_csv(folder, "2024-01-02.csv", "2024-01-02", 48)
+    os.utime(path, ns=(1, 1))
+    report = engine.ingest_new_files("M15", workers=1)
+    assert report["mode"] == "rebuild" and report["rows"] == 144
+    _assert_series_matches_csvs(engine)
+
+
+def test_torn_append_is_discarded(engine, folder):
+    with open(os.path.join(engine._cache_dir("M15"), engine._SERIES_BIN), "ab") as f:
+        f.write(b"\0" * 17)                      # a writer died mid-append
+    write_csv(folder, "2024-01-03.csv", "2024-01-03", 96)
+    assert engine.ingest_new_files("M15", workers=1)["mode"] == "append"
+    _assert_series_matches_csvs(engine)
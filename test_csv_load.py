@@ -0,0 +1,50 @@
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import write_csv
+
+
+@pytest.fixture
+def paths(engine):
+    folder = os.path.join(engine.DATA_DIR, "15MinuteData")
+    # Names sort in a different order than the data they hold
+    return [
+        write_csv(folder, "c.csv", "2024-01-01", 40),
+        write_csv(folder, "a.csv", "2024-01-03", 40),
+        write_csv(folder, "b.csv", "2024-01-02", 40),
+    ]
+
+
+@pytest.mark.parametrize("mode", ["thread", "process"])
+def test_parallel_parse_matches_serial(engine, paths, mode):
+    serial   = engine._parse_many(paths, workers=1)
+    parallel = engine._parse_many(paths, workers=3, mode=mode)
+    for s, p in zip(serial, parallel):
+        pd.testing.assert_frame_equal(s, p)
+
+
+def test_merge_orders_runs_by_time(engine, paths):
+    merged = engine._combine(engine._parse_many(sorted(paths), workers=1))
+    assert merged.index.is_monotonic_increasing
+    assert merged.index.is_unique
+    assert len(merged) == 120
+
+
+def test_overlapping_runs_keep_the_earlier_export(engine):
+    folder = os.path.join(engine.DATA_DIR, "15MinuteData")
+    early  = write_csv(folder, "early.csv", "2024-01-01 00:00", 20)
+    late   = write_csv(folder, "late.csv", "2024-01-01 02:00", 20, price=3000.0)
+
+    merged = engine._combine(engine._parse_many([late, early], workers=1))
+    assert merged.index.is_monotonic_increasing and merged.index.is_unique
+    assert len(merged) == 28                                   # 20 + 20 − 12 shared bars
+    assert merged.loc["2024-01-01 02:00", "open"] == 2001.0    # early.csv's bar, though listed last
+
+
+def test_unreadable_file_is_skipped(engine, paths):
+    with open(paths[0], "w") as f:
+        f.write("not,a,dukascopy,file\n")
+    merged = engine.load_csv("M15", start_date=None, workers=3)
+    assert len(merged) == 80
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+
+from api import backtest_engine as engine
+
+ROWS = (
+    b"UTC,Open,High,Low,Close,Volume\n"
+    b"01.01.2026 23:00:00.000 UTC,4323.698,4335.055,4323.198,4330.625,0.2517\n"
+    b"01.01.2026 23:15:00.250 UTC,4330.555,4342.505,4327.865,4339.515,0.2042\n"
+    b"\n"
+    b"29.02.2024 00:00:00 UTC,2000.5,2001.0,1999.0,2000.0,1.0\n"
+    b"31.12.1999 23:59:59.999 UTC,280.0,281.0,279.5,280.5,3.5\n"
+)
+
+
+def test_fast_parser_matches_the_generic_one():
+    fast    = engine._parse_fast(ROWS)
+    generic = engine._parse_generic(ROWS)
+    assert fast is not None
+    assert list(fast.index) == list(generic.index)
+    np.testing.assert_array_equal(fast[["open", "high", "low", "close", "volume"]].to_numpy(dtype="f8"),
+                                  generic[["open", "high", "low", "close", "volume"]].to_numpy(dtype="f8"))
+
+
+def test_calendar_arithmetic():
+    times, ok = engine._parse_dukascopy_times(ROWS)
+    assert ok.all()
+    assert list(pd.to_datetime(times, utc=True)) == [
+        pd.Timestamp("2026-01-01 23:00:00", tz="UTC"),
+        pd.Timestamp("2026-01-01 23:15:00.250", tz="UTC"),
+        pd.Timestamp("2024-02-29 00:00:00", tz="UTC"),
+        pd.Timestamp("1999-12-31 23:59:59.999", tz="UTC"),
+    ]
+
+
+def test_crlf_and_invalid_rows():
+    buf = ROWS.replace(b"\n", b"\r\n") + b"32.13.2026 25:00:00.000 UTC,1,1,1,1,1\r\n"
+    times, ok = engine._parse_dukascopy_times(buf)
+    assert ok.tolist() == [True, True, True, True, False]
+
+    df = engine._parse_fast(buf)
+    assert len(df) == 4
+
+
+def test_other_layouts_fall_back_to_the_generic_parser(tmp_path):
+    path = tmp_path / "padded.csv"
+    path.write_bytes(b"UTC,Open,High,Low,Close,Volume\n"
+                     b" 01.01.2026 23:00:00.000 UTC,1,2,0.5,1.5,10\n"
+                     b" 01.01.2026 23:15:00 UTC,1.5,2,1,1.75,12\n")
+    assert engine._parse_fast(path.read_bytes()) is None
+
+    df = engine._parse_single_csv(str(path))
+    assert list(df.index) == [pd.Timestamp("2026-01-01 23:00", tz="UTC"),
+                              pd.Timestamp("2026-01-01 23:15", tz="UTC")]
+    assert df["close"].tolist() == [1.5, 1.75]
@@ -0,0 +1,54 @@
+import gc
+import os
+import threading
+
+import pandas as pd
+
+from conftest import write_csv
+
+
+def test_live_block_counts_against_the_budget(engine):
+    write_csv(os.path.join(engine.DATA_DIR, "15MinuteData"), "2024-01.csv", "2024-01-01", 1_000)
+    frame = engine.get_frame("M15", start_date=None, bt=True)
+    entry = engine._frames["M15"]
+    compact = entry.data.index.nbytes + entry.data.ticks.nbytes + entry.data.volume.nbytes
+    assert entry.nbytes == compact + 5 * 8 * 1_000
+
+    del frame
+    gc.collect()
+    assert entry.nbytes == compact
+
+
+def test_materialising_a_frame_evicts_older_entries(engine, monkeypatch):
+    write_csv(os.path.join(engine.DATA_DIR, "15MinuteData"), "2024-01.csv", "2024-01-01", 1_000)
+    write_csv(os.path.join(engine.DATA_DIR, "1HourData"), "2024-01.csv", "2024-01-01", 1_000, freq="1h")
+    assert engine.get_frame("H1", start_date=None) is not None
+    gc.collect()
+    monkeypatch.setattr(engine, "FRAME_CACHE_MAX_BYTES", 2 * 28 * 1_000)    # both entries, compact
+
+    frame = engine.get_frame("M15", start_date=None)
+    assert list(engine._frames) == ["M15"] and len(frame) == 1_000
+
+
+def test_dataframe_entries_slice_safely_from_many_threads(engine):
+    index = pd.date_range("2024-01-01", periods=2_000, freq="15s", tz="UTC", name="datetime")
+    df = pd.DataFrame({c: 1.0 for c in ("open", "high", "low", "close", "volume")}, index=index)
+    entry = engine._CachedFrame(df, "fp")
+    assert not isinstance(entry.data, engine.CompactOHLCV)      # sub-minute bars stay a DataFrame
+
+    starts = [str(t) for t in index[::50]]
+    errors = []
+
+    def hammer():
+        try:
+            for start in starts:
+                assert entry.frame(start).index[0] == pd.Timestamp(start)
+        except Exception as e:          # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=hammer) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors and len(entry.slices) <= engine._MAX_SLICES
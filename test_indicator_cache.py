@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from api.strategies import indicator_cache
+from api.strategies.indicator_cache import shared
+
+
+@pytest.fixture
+def memo(monkeypatch):
+    monkeypatch.setattr(indicator_cache, "INDICATOR_CACHE_MAX_BYTES", 3 * 8_000)
+    indicator_cache.enable_indicator_cache()
+    yield indicator_cache
+    indicator_cache.enable_indicator_cache(False)
+
+
+@shared
+def double(arr, period):
+    return np.asarray(arr, dtype=float) * 2
+
+
+def test_off_unless_enabled():
+    indicator_cache.clear_indicator_cache()
+    first = double(np.arange(1_000), 14)
+    assert first.flags.writeable and double(np.arange(1_000), 14) is not first
+    assert indicator_cache.cache_info()["size"] == 0
+
+
+def test_hits_are_shared_and_read_only(memo):
+    first = double(np.arange(1_000), 14)
+    assert double(np.arange(1_000), 14) is first and not first.flags.writeable
+    assert double(np.arange(1_000), 20) is not first
+    assert memo.cache_info()["hits"] == 1
+
+
+def test_bounded_by_bytes(memo):
+    for period in range(5):
+        double(np.arange(1_000), period)                   # 8 kB each
+    info = memo.cache_info()
+    assert info["size"] == 3 and info["bytes"] == 3 * 8_000
+    double(np.arange(10_000), 0)                           # larger than the whole budget
+    assert memo.cache_info()["size"] == 3
@@ -0,0 +1,148 @@
+import os
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+import pytest
+
+from api import backtest_engine, job_engine
+from api.strategies import v4_ghost
+from conftest import write_csv
+
+
+class HeldExecutor:
+    """Accepts jobs but never starts them, so they stay queued."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        self.futures.append(Future())
+        return self.futures[-1]
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_engine, "JOBS_DIR", str(tmp_path / "jobs"))
+    executor = HeldExecutor()
+    monkeypatch.setattr(job_engine, "_get_executor", lambda: executor)
+    job_engine._futures.clear()
+    yield executor
+    job_engine._futures.clear()
+
+
+def record(job_id, **fields):
+    job = job_engine._load(job_id)
+    job.update(fields)
+    job_engine._persist(job)
+
+
+def test_identical_requests_share_one_job(jobs):
+    first = job_engine.submit_backtest_job("low", 10_000, "2024-01-01")
+    again = job_engine.submit_backtest_job("low", "10000.004", "2024-1-1")
+    other = job_engine.submit_backtest_job("low", 20_000, "2024-01-01")
+
+    assert first["status"] == "queued" and "deduplicated" not in first
+    assert again["job_id"] == first["job_id"] and again["deduplicated"]
+    assert other["job_id"] != first["job_id"]
+    assert len(jobs.futures) == 2
+    assert len([n for n in os.listdir(job_engine.JOBS_DIR) if n.endswith(".json")]) == 2
+
+
+def test_job_owned_by_another_worker_is_joined(jobs):
+    first = job_engine.submit_backtest_job("low", 10_000, "2024-01-01")
+    record(first["job_id"], owner_pid=os.getppid())
+    job_engine._futures.clear()                     # as seen from a different process
+
+    assert job_engine.submit_backtest_job("low", 10_000, "2024-01-01")["job_id"] == first["job_id"]
+
+
+def test_job_of_a_dead_worker_is_failed_and_its_slot_freed(jobs):
+    first = job_engine.submit_backtest_job("low", 10_000, "2024-01-01")
+    record(first["job_id"], status="running", owner_pid=2**22 + 1)
+
+    job = job_engine.get_job(first["job_id"])
+    assert job["status"] == "error" and "exited" in job["error"]
+    assert job_engine.submit_backtest_job("low", 10_000, "2024-01-01")["job_id"] != first["job_id"]
+
+
+def test_job_without_a_heartbeat_is_failed(jobs):
+    first = job_engine.submit_backtest_job("low", 10_000, "2024-01-01")
+    record(first["job_id"], status="running", heartbeat=time.time() - job_engine.JOB_STALE_AFTER - 1)
+    assert job_engine.get_job(first["job_id"])["status"] == "error"
+
+    queued = job_engine.submit_backtest_job("low", 20_000, "2024-01-01")
+    record(queued["job_id"], heartbeat=0)           # a long queue is not a stall
+    assert job_engine.get_job(queued["job_id"])["status"] == "queued"
+
+
+def test_cancelling_a_queued_job(jobs):
+    first = job_engine.submit_backtest_job("low", 10_000, "2024-01-01")
+    assert job_engine.cancel_job(first["job_id"])["status"] == "cancelled"
+    assert job_engine.submit_backtest_job("low", 10_000, "2024-01-01")["job_id"] != first["job_id"]
+
+
+def test_cancelling_a_job_running_elsewhere_leaves_a_marker(jobs):
+    first = job_engine.submit_backtest_job("low", 10_000, "2024-01-01")
+    jobs.futures[0].set_running_or_notify_cancel()
+
+    result = job_engine.cancel_job(first["job_id"])
+    assert result["cancel_requested"] and result["status"] == "queued"
+    assert os.path.exists(job_engine._cancel_path(first["job_id"]))
+
+
+def test_run_job_reports_progress_and_honours_the_marker(jobs, monkeypatch):
+    job = job_engine.submit_backtest_job("low", 10_000, "2024-01-01")
+    monkeypatch.setattr(job_engine, "_HEARTBEAT", 0.0)
+    seen = []
+
+    def fake_run(level, initial_cash, start_date, progress):
+        progress(25, 100)
+        seen.append(job_engine._load(job["job_id"]))
+        open(job_engine._cancel_path(job["job_id"]), "w").close()
+        progress(50, 100)
+        return {"status": "ok"}
+
+    monkeypatch.setattr(backtest_engine, "execute_backtest_by_level", fake_run)
+    assert job_engine._run_job(job_engine._load(job["job_id"])) == {"status": "cancelled"}
+    assert seen[0]["status"] == "running" and seen[0]["progress"] == 0.25
+    assert seen[0]["worker_pid"] == os.getpid()
+
+
+def test_running_fast_path_backtest_is_cancelled(jobs, engine, monkeypatch):
+    write_csv(os.path.join(engine.DATA_DIR, "15MinuteData"), "2024-01.csv", "2024-01-01", 2_000)
+    monkeypatch.setattr(job_engine, "_HEARTBEAT", 0.0)
+    monkeypatch.setattr(v4_ghost, "_SIM_CHUNK", 500)
+    job = job_engine.submit_backtest_job("low", 10_000, "2024-01-01")
+    beats = []
+    real = job_engine._persist
+
+    def persist(record):
+        real(record)
+        beats.append(record.get("progress"))
+        if record.get("progress", 0) >= 0.25:           # DELETE lands mid-simulation
+            open(job_engine._cancel_path(job["job_id"]), "w").close()
+
+    monkeypatch.setattr(job_engine, "_persist", persist)
+    assert job_engine._run_job(job_engine._load(job["job_id"])) == {"status": "cancelled"}
+    assert 0.25 <= beats[-1] < 0.5                      # stopped at the next chunk
+
+
+def test_finished_job_records_the_result(jobs, monkeypatch):
+    job = job_engine.submit_backtest_job("low", 10_000, "2024-01-01")
+    monkeypatch.setattr(backtest_engine, "execute_backtest_by_level",
+                        lambda *a, **kw: {"status": "ok", "trades": 3})
+    jobs.futures[0].set_result(job_engine._run_job(job_engine._load(job["job_id"])))
+
+    done = job_engine.get_job(job["job_id"])
+    assert done["status"] == "done" and done["progress"] == 1.0 and done["result"]["trades"] == 3
+    assert datetime.fromisoformat(done["finished_at"]).tzinfo is not None
+    assert not {"key", "heartbeat", "owner_pid"} & set(done)
+
+
+def test_bad_requests(jobs):
+    assert job_engine.submit_backtest_job("extreme")["status"] == "error"
+    with pytest.raises(ValueError):
+        job_engine.submit_backtest_job("low", -1, "2024-01-01")
+    assert job_engine.get_job("../../etc/passwd") is None
+    assert job_engine.cancel_job("0" * 32) is None
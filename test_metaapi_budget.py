@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+import requests
+
+from api import metaapi_client as metaapi
+
+URL = "https://mt-client-api-v1.london.agiliumtrade.ai/users/current/accounts/abc"
+
+
+def response(status=200, body=b"{}"):
+    resp = requests.Response()
+    resp.status_code, resp._content = status, body
+    return resp
+
+
+class FakeSession:
+    def __init__(self):
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        return response(body=b'{"n": %d}' % len(self.calls))
+
+
+@pytest.fixture
+def budget(tmp_path, monkeypatch):
+    """A fresh budget store with a 100-call day and a bucket that never runs dry."""
+    monkeypatch.setattr(metaapi, "BUDGET_DB", str(tmp_path / "budget.db"))
+    monkeypatch.setattr(metaapi, "DAILY_LIMIT", 100)
+    monkeypatch.setattr(metaapi, "BUDGET_BURST", 1_000.0)
+    monkeypatch.setattr(metaapi, "_budget_broken", False)
+    monkeypatch.setenv("METAAPI_TOKEN", "test")
+    metaapi._fallback.clear()
+    session = FakeSession()
+    monkeypatch.setattr(metaapi, "_session", lambda url: session)
+    yield session
+    metaapi._drop_budget_conn()
+    metaapi._fallback.clear()
+
+
+def spend_until_refused(priority, limit=200):
+    n = 0
+    while n < limit and metaapi._spend(priority):
+        n += 1
+    return n
+
+
+def test_priorities_are_refused_in_order(budget):
+    assert spend_until_refused(metaapi.MARKET) == 70
+    assert spend_until_refused(metaapi.ACCOUNT) == 20
+    assert spend_until_refused(metaapi.ORDER) == 10
+    assert not metaapi._spend(metaapi.ORDER)
+
+    usage = metaapi.budget_usage()
+    assert usage["used"] == 100 and usage["remaining"] == 0
+    assert usage["by_priority"]["market"] == {"calls": 70, "denied": 1, "degraded": 0}
+    assert usage["throttled"] == ["market", "account", "order"]
+
+
+def test_budget_room(budget):
+    spend_until_refused(metaapi.MARKET, limit=40)
+    assert metaapi.budget_room(metaapi.MARKET) == 30
+    assert metaapi.budget_room(metaapi.ACCOUNT) == 50
+    assert metaapi.budget_room(metaapi.ORDER) == 60
+
+
+def test_bucket_keeps_a_reserve_for_higher_priorities(budget, monkeypatch):
+    monkeypatch.setattr(metaapi, "BUDGET_BURST", 10.0)
+    monkeypatch.setitem(metaapi._BUCKET_RESERVE, metaapi.MARKET, 4.0)
+    assert spend_until_refused(metaapi.MARKET) == 7         # stops short of the last 4 tokens
+    assert spend_until_refused(metaapi.ACCOUNT) == 3        # may drain the bucket down to 1
+    assert metaapi._spend(metaapi.ORDER)                    # never limited by the bucket
+
+
+def test_refused_get_serves_the_last_good_response(budget):
+    url = URL + "/symbols/XAUUSD/current-price"
+    assert metaapi.get(url).json() == {"n": 1}
+    spend_until_refused(metaapi.MARKET)
+
+    assert metaapi.get(url).json() == {"n": 1}
+    assert len(budget.calls) == 1
+    assert metaapi.budget_usage()["by_priority"]["market"]["degraded"] == 1
+
+
+def test_refused_call_without_a_fallback_raises(budget):
+    spend_until_refused(metaapi.MARKET)
+    with pytest.raises(metaapi.BudgetExceeded):
+        metaapi.get(URL + "/historical-market-data/symbols/XAUUSD/timeframes/1m/candles")
+    assert metaapi.get(URL + "/account-information").ok          # account calls still go through
+    assert budget.calls == [("GET", URL + "/account-information")]
+
+
+def test_candle_requests_are_not_kept_as_fallbacks(budget):
+    url = URL + "/historical-market-data/symbols/XAUUSD/timeframes/15m/candles"
+    assert metaapi.get(url, params={"startTime": "2024-01-01T00:00:00.000Z", "limit": 50}).ok
+    assert not metaapi._fallback
+
+    spend_until_refused(metaapi.MARKET)
+    with pytest.raises(metaapi.BudgetExceeded):
+        metaapi.get(url, params={"startTime": "2024-01-01T00:00:00.000Z", "limit": 50})
+
+
+def test_broken_store_fails_open(budget, monkeypatch, tmp_path):
+    (tmp_path / "file").write_text("")
+    monkeypatch.setattr(metaapi, "BUDGET_DB", str(tmp_path / "file" / "budget.db"))
+    monkeypatch.setattr(metaapi, "DAILY_LIMIT", 0)
+    assert metaapi.get(URL + "/account-information").ok
+    assert metaapi.budget_room(metaapi.MARKET) is None
+
+
+def test_one_connection_per_thread(budget):
+    conns = []
+    conn = metaapi._connect_budget()
+    assert metaapi._connect_budget() is conn
+
+    t = threading.Thread(target=lambda: conns.append(metaapi._connect_budget()))
+    t.start()
+    t.join()
+    assert conns[0] is not conn
@@ -0,0 +1,154 @@
+import json
+import queue
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from api import metaapi_client as metaapi, price_stream
+
+ACCOUNT = SimpleNamespace(region="london", account_id="abc")
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = "test-secret"
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def slots(monkeypatch):
+    monkeypatch.setattr(price_stream, "MAX_STREAMS", 2)
+    monkeypatch.setattr(price_stream, "_open_streams", 0)
+
+
+def test_stream_tokens(app, monkeypatch):
+    token = price_stream.issue_token(7)
+    assert price_stream.token_user(token) == 7
+    assert price_stream.token_user(token[:-2] + "xx") is None
+    assert price_stream.token_user(None) is None
+
+    monkeypatch.setattr(price_stream, "TOKEN_TTL", -1)
+    assert price_stream.token_user(token) is None
+
+
+def test_stream_tokens_are_not_interchangeable_with_other_signatures(app):
+    from itsdangerous import URLSafeTimedSerializer
+
+    forged = URLSafeTimedSerializer("test-secret").dumps({"uid": 7})       # no price-stream salt
+    assert price_stream.token_user(forged) is None
+
+
+def test_streams_are_capped_and_release_their_slot(slots):
+    first  = price_stream.stream("XAUUSD", ACCOUNT)
+    second = price_stream.stream("XAUUSD", ACCOUNT)
+    assert first is not None and second is not None
+    assert price_stream.stream("XAUUSD", ACCOUNT) is None
+
+    first.close()                   # never iterated — the slot still comes back
+    first.close()
+    assert price_stream._open_streams == 1
+    third = price_stream.stream("XAUUSD", ACCOUNT)
+    assert third is not None
+    second.close()
+    third.close()
+    assert price_stream._open_streams == 0
+
+
+def test_slow_client_skips_to_the_latest_quote(monkeypatch):
+    monkeypatch.setattr(price_stream, "QUEUE_SIZE", 3)
+    feed = price_stream._Feed("TEST")
+    q = queue.Queue(maxsize=3)
+    feed.listeners[q] = price_stream.AccountRef("london", "abc")
+
+    for i in range(10):
+        feed._publish({"bid": i})
+    assert [q.get_nowait()["bid"] for _ in range(3)] == [7, 8, 9]
+    assert feed.latest == {"bid": 9}
+
+
+def test_latest_respects_max_age(monkeypatch):
+    feed = price_stream._feed("LATEST")
+    feed.latest, feed.latest_at = {"bid": 1}, time.time() - 30
+    assert price_stream.latest("LATEST", max_age=60) == {"bid": 1}
+    assert price_stream.latest("LATEST", max_age=10) is None
+    assert price_stream.latest("NOTHING") is None
+
+
+def test_poll_interval_follows_the_budget(monkeypatch):
+    monkeypatch.setattr(price_stream, "MIN_POLL", 60.0)
+    monkeypatch.setattr(price_stream, "BUDGET_SHARE", 0.25)
+
+    monkeypatch.setattr(metaapi, "budget_room", lambda priority: None)
+    assert price_stream.poll_interval() == 60.0              # store unreadable — floor
+    monkeypatch.setattr(metaapi, "budget_room", lambda priority: 0)
+    assert price_stream.poll_interval() == price_stream._MAX_BACKOFF
+    monkeypatch.setattr(metaapi, "budget_room", lambda priority: 1_000_000)
+    assert price_stream.poll_interval() == 60.0
+    monkeypatch.setattr(metaapi, "budget_room", lambda priority: 40)
+    assert 60.0 <= price_stream.poll_interval() <= price_stream._MAX_BACKOFF
+
+
+def test_stream_end_to_end(slots, monkeypatch):
+    calls = []
+
+    def fetch_price(account, symbol):
+        calls.append(account)
+        return {"symbol": symbol, "bid": 1.0, "ask": 1.1, "time": "t"}
+
+    monkeypatch.setattr(price_stream, "fetch_price", fetch_price)
+    monkeypatch.setattr(price_stream, "poll_interval", lambda: 0.01)
+    body   = price_stream.stream("E2E", ACCOUNT)
+    frames = iter(body)
+    assert next(frames) == "retry: 3000\n\n"
+    assert next(frames).startswith('event: price\ndata: {"symbol": "E2E"')
+
+    feed = price_stream._feeds["E2E"]
+    thread = feed.thread
+    body.close()
+    thread.join(2)
+    assert not thread.is_alive() and feed.thread is None
+    assert calls[0] == price_stream.AccountRef("london", "abc")
+
+
+def test_refused_stream_still_gets_prices(slots, monkeypatch):
+    calls = []
+
+    def fetch_price(account, symbol):
+        calls.append(account)
+        time.sleep(0.05)
+        return {"symbol": symbol, "bid": 2.0, "ask": 2.1, "time": "t"}
+
+    monkeypatch.setattr(price_stream, "fetch_price", fetch_price)
+    held = [price_stream.stream("FULL", ACCOUNT) for _ in range(2)]
+    assert price_stream.stream("FULL", ACCOUNT) is None
+
+    # The refused client is told to poll, at the feed's interval
+    lines = price_stream.refused().splitlines()
+    assert "event: full" in lines
+    assert json.loads(lines[lines.index("event: full") + 1][len("data: "):]) == {"poll": price_stream.MIN_POLL}
+
+    # ...and every poller in the worker shares one upstream call
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(price_stream.quote(ACCOUNT, "FULL")))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1 and all(r["bid"] == 2.0 for r in results)
+    assert price_stream.quote(ACCOUNT, "FULL")["bid"] == 2.0 and len(calls) == 1
+
+    for body in held:
+        body.close()
+
+
+def test_quote_reuses_the_streamed_price(monkeypatch):
+    monkeypatch.setattr(price_stream, "fetch_price", lambda account, symbol: pytest.fail("went upstream"))
+    feed = price_stream._feed("LIVE")
+    feed._publish({"symbol": "LIVE", "bid": 3.0, "ask": 3.1, "time": "t"})
+    assert price_stream.quote(ACCOUNT, "LIVE")["bid"] == 3.0
@@ -0,0 +1,71 @@
+import os
+import time
+
+import pytest
+
+from conftest import write_csv
+
+
+@pytest.fixture
+def runs(engine, monkeypatch):
+    """Counts the backtests that actually load data (i.e. cache misses)."""
+    write_csv(os.path.join(engine.DATA_DIR, "15MinuteData"), "a.csv", "2024-01-01", 600)
+    calls = []
+    real = engine._best_df
+    monkeypatch.setattr(engine, "_best_df", lambda *a, **kw: calls.append(a) or real(*a, **kw))
+    return calls
+
+
+def test_normalize_run_args():
+    from api.backtest_engine import normalize_run_args
+
+    assert normalize_run_args("10000.001", "2024-1-1") == (10000.0, "2024-01-01")
+    assert normalize_run_args(10_000, "2024-01-01T00:00:00") == (10000.0, "2024-01-01")
+    for cash, start in ((0, "2024-01-01"), (-5, "2024-01-01"), ("nan", "2024-01-01"),
+                        (1e12, "2024-01-01"), (10_000, "someday"), (10_000, "")):
+        with pytest.raises(ValueError):
+            normalize_run_args(cash, start)
+
+
+def test_equivalent_requests_share_one_run(engine, runs):
+    first = engine.execute_backtest_by_level("low", "10000", "2024-01-01")
+    again = engine.execute_backtest_by_level("low", 10_000.004, "2024-1-1")
+    assert first["status"] == "ok"
+    assert again == first and len(runs) == 1
+
+    engine.execute_backtest_by_level("medium", 10_000, "2024-01-01")
+    engine.execute_backtest_by_level("low", 10_000, "2024-01-01", use_cache=False)
+    assert len(runs) == 3
+
+
+def test_new_data_invalidates_results(engine, runs):
+    engine.execute_backtest_by_level("low", 10_000, "2024-01-01")
+    write_csv(os.path.join(engine.DATA_DIR, "15MinuteData"), "b.csv", "2024-01-08", 96)
+    engine.execute_backtest_by_level("low", 10_000, "2024-01-01")
+    assert len(runs) == 2
+
+
+def test_disk_mirror_is_shared_across_processes(engine, runs):
+    first = engine.execute_backtest_by_level("low", 10_000, "2024-01-01")
+    engine.clear_result_cache()          # what another gunicorn worker starts with
+    assert engine.execute_backtest_by_level("low", 10_000, "2024-01-01") == first
+    assert len(runs) == 1
+
+
+def test_disk_mirror_is_bounded(engine, monkeypatch):
+    monkeypatch.setattr(engine, "RESULT_DISK_MAX", 3)
+    for i in range(5):
+        engine._result_cache_put(f"key{i}", {"status": "ok", "i": i})
+        os.utime(engine._result_path(f"key{i}"), (time.time() - 10 + i, time.time() - 10 + i))
+    folder = os.path.dirname(engine._result_path("x"))
+    assert sorted(os.listdir(folder)) == ["key2.json", "key3.json", "key4.json"]
+
+    expired = time.time() - engine.RESULT_CACHE_TTL - 1
+    os.utime(engine._result_path("key4"), (expired, expired))
+    engine._prune_result_dir()
+    assert "key4.json" not in os.listdir(folder)
+
+
+def test_failed_runs_are_not_cached(engine):
+    assert engine.execute_backtest_by_level("low", 10_000, "2024-01-01")["status"] == "error"
+    assert not os.path.isdir(os.path.dirname(engine._result_path("x")))
@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+from api import scheduler, trade_engine
+
+CANDLES = pd.DataFrame({"open": [1.0], "high": [1.0], "low": [1.0], "close": [1.0]})
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    calls = []
+    monkeypatch.setattr(scheduler, "SNAPSHOT_RETRY", 0)
+    monkeypatch.setattr(trade_engine, "_snapshot", {"df": None, "expires": None})
+    monkeypatch.setattr(trade_engine, "_fetch_m15_candles", lambda account: calls.append(account))
+    return calls
+
+
+def test_failed_snapshot_is_retried_once_then_the_tick_skipped(fetches):
+    assert scheduler._tick_candles(["a", "b", "c"]) is None
+    assert fetches == ["a", "c"]
+
+
+def test_retry_that_succeeds_is_shared(fetches, monkeypatch):
+    def flaky(account):
+        fetches.append(account)
+        return CANDLES if len(fetches) > 1 else None
+
+    monkeypatch.setattr(trade_engine, "_fetch_m15_candles", flaky)
+    assert scheduler._tick_candles(["a", "b"]) is CANDLES
+    assert trade_engine.get_m15_snapshot("c") is CANDLES and fetches == ["a", "b"]
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from backtesting import Backtest
+
+from api.strategies import v4_ghost
+from api.strategies.v4_ghost import V4GhostStrategy, v4_ghost_fast_stats
+
+# backtesting.py warns about every margin-cancelled order
+pytestmark = pytest.mark.filterwarnings("ignore::UserWarning")
+
+BROKER = {"cash": 10_000, "commission": 0.0002, "margin": 1 / 50}
+
+PARAMS = [
+    {"atr_sl_mult": 1.5, "rr_ratio": 3.0, "lookback_bars": 24, "risk_pct": 0.005},
+    {"atr_sl_mult": 1.5, "rr_ratio": 3.0, "lookback_bars": 24, "risk_pct": 0.03},
+    {"atr_sl_mult": 1.0, "rr_ratio": 1.5, "lookback_bars": 12, "risk_pct": 0.02, "session_start": 0},
+    {"atr_sl_mult": 0.5, "rr_ratio": 5.0, "lookback_bars": 48, "risk_pct": 0.5},    # orders the broker cancels for margin
+]
+
+TRADE_COLS = ["Size", "EntryBar", "ExitBar", "EntryPrice", "ExitPrice", "SL", "TP", "PnL", "Commission"]
+STATS      = ["Equity Final [$]", "Return [%]", "# Trades", "Win Rate [%]", "Max. Drawdown [%]",
+              "Profit Factor", "Sharpe Ratio"]
+
+
+def reference(df, finalize, **params):
+    bt = Backtest(df, V4GhostStrategy, exclusive_orders=True, finalize_trades=finalize, **BROKER)
+    return bt.run(**params)
+
+
+def assert_same_run(fast, slow):
+    pd.testing.assert_frame_equal(fast["_trades"][TRADE_COLS].reset_index(drop=True),
+                                  slow["_trades"][TRADE_COLS].reset_index(drop=True),
+                                  check_dtype=False, rtol=1e-9)
+    np.testing.assert_allclose(fast["_equity_curve"]["Equity"], slow["_equity_curve"]["Equity"], rtol=1e-9)
+    for key in STATS:
+        np.testing.assert_allclose(fast[key], slow[key], rtol=1e-9, equal_nan=True, err_msg=key)
+
+
+@pytest.mark.parametrize("finalize", [True, False])
+@pytest.mark.parametrize("params", PARAMS)
+def test_fast_path_matches_backtesting(history, params, finalize):
+    fast = v4_ghost_fast_stats(history, finalize_trades=finalize, **BROKER, **params)
+    assert_same_run(fast, reference(history, finalize, **params))
+
+
+def test_unknown_params_are_rejected(history):
+    with pytest.raises(AttributeError):
+        v4_ghost_fast_stats(history, **BROKER, atr=np.ones(len(history)))
+
+
+@pytest.mark.parametrize("params", [PARAMS[0], PARAMS[3]])
+def test_progress_chunks_do_not_change_the_run(history, params, monkeypatch):
+    monkeypatch.setattr(v4_ghost, "_SIM_CHUNK", 97)
+    seen = []
+    fast = v4_ghost_fast_stats(history, finalize_trades=True, progress=lambda i, n: seen.append(i),
+                               **BROKER, **params)
+    assert_same_run(fast, v4_ghost_fast_stats(history, finalize_trades=True, **BROKER, **params))
+    assert seen[0] == 0 and seen == sorted(seen) and len(seen) > len(history) // 97 // 2
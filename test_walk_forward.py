@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from backtesting import Backtest
+
+from api import optimizer_engine as optimizer
+from api.strategies.v4_ghost import V4GhostStrategy
+
+pytestmark = pytest.mark.filterwarnings("ignore::UserWarning")
+
+PARAMS = {"atr_sl_mult": 1.5, "rr_ratio": 3.0, "lookback_bars": 24, "risk_pct": 0.01}
+
+
+def test_windows_tile_the_history():
+    windows = optimizer._walk_forward_windows(10_000, folds=5, train=3)
+    assert len(windows) == 5
+    step = 10_000 // 8
+    for i, ((tr_lo, tr_hi), (te_lo, te_hi)) in enumerate(windows):
+        assert tr_hi == te_lo                         # tested right after it was trained
+        assert tr_hi - tr_lo == 3 * step
+        assert tr_lo == i * step
+        if i:
+            assert te_lo == windows[i - 1][1][1]      # test windows are back to back
+    assert windows[-1][1][1] == 10_000
+
+
+def test_short_history_has_no_windows():
+    assert optimizer._walk_forward_windows(8 * optimizer._MIN_TEST_BARS - 1, folds=5, train=3) == []
+    assert optimizer._walk_forward_windows(10_000, folds=0, train=3) == []
+
+
+@pytest.fixture
+def worker(history):
+    optimizer._worker.update(df=history, balance=10_000, windows={})
+    yield optimizer._worker
+    optimizer._worker.clear()
+
+
+def test_test_window_matches_a_backtest_of_that_slice(history, worker):
+    (_, (lo, hi)), = optimizer._walk_forward_windows(len(history), folds=1, train=3)
+    task = optimizer._task("k", "V4GhostStrategy", PARAMS, lo, hi, finalize=True, curve=True)
+    _, metrics, curve = optimizer._evaluate(task)
+
+    bt = Backtest(history.iloc[lo:hi], V4GhostStrategy, cash=10_000, commission=0.0002,
+                  exclusive_orders=True, margin=1 / 50, finalize_trades=True)
+    stats = bt.run(**PARAMS)
+    assert metrics["trades_count"] == stats["# Trades"]
+    np.testing.assert_allclose(metrics["return_pct"], stats["Return [%]"], rtol=1e-9)
+    np.testing.assert_allclose(curve["equity"], stats["_equity_curve"]["Equity"] / 10_000, rtol=1e-9)
+    np.testing.assert_allclose(curve["returns"], stats["_trades"]["ReturnPct"], rtol=1e-9)